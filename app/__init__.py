@@ -1,29 +1,102 @@
 import os
 from flask import Flask
-from dotenv import load_dotenv
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from jinja2 import FileSystemBytecodeCache
 
-# Cargar variables de entorno
-load_dotenv()
+# Arranque en frío: la fábrica no abre conexiones (el pool conecta con la
+# primera consulta) y las librerías pesadas (reportlab, pypdf, Pillow) se
+# importan recién cuando se usan. `python -m bench.arranque` lo mide.
+
+def _cache_plantillas(app):
+    """Guarda en disco el bytecode de las plantillas compiladas: cada worker o
+    instancia nueva las carga sin volver a compilarlas"""
+    carpeta = app.config.get('JINJA_CACHE_DIR')
+    if not carpeta:
+        return
+    try:
+        os.makedirs(carpeta, exist_ok=True)
+    except OSError as e:
+        print(f"Advertencia: sin caché de plantillas en {carpeta}: {e}")
+        return
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(carpeta)
 
 def create_app():
     app = Flask(__name__)
+    # config.py carga el .env al importarse
+    app.config.from_object('config.Config')
     app.secret_key = os.getenv("SECRET_KEY")
 
     # Guardar URI de PostgreSQL en config
     app.config['POSTGRES_URI'] = os.getenv("POSTGRES_URI")
 
-    # Ejemplo de conexión inicial para probar
-    try:
-        conn = psycopg2.connect(app.config['POSTGRES_URI'], cursor_factory=RealDictCursor)
-        conn.close()
-        print("Conexión a PostgreSQL en Neon exitosa ✅")
-    except Exception as e:
-        print("Error al conectar a PostgreSQL:", e)
+    # Detrás de un proxy, remote_addr sería el del proxy para todos los clientes
+    if app.config['PROXY_SALTOS']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        saltos = app.config['PROXY_SALTOS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=saltos, x_proto=saltos)
+
+    _cache_plantillas(app)
+
+    # Pool de conexiones compartido por todas las peticiones
+    from app import db
+    db.init_app(app)
+
+    # /salud y /salud/lista (la base se comprueba en un hilo aparte)
+    from app import salud
+    salud.init_app(app)
+
+    # Tiempos por ruta, consulta y plantilla; exposición en /metrics
+    from app import metricas
+    metricas.init_app(app)
+
+    # Migraciones del esquema: `flask --app run db upgrade`
+    from app import schema
+    schema.init_app(app)
+
+    # Cachés en memoria (o Redis si CACHE_REDIS_URL está configurado)
+    from app import cache
+    cache.init_app(app)
+
+    # Tareas en segundo plano (refresco de agregados)
+    from app import tareas
+    tareas.init_app(app)
+
+    # Mensajes en vivo: LISTEN/NOTIFY -> clientes SSE
+    from app import eventos
+    eventos.init_app(app)
+
+    # Hashing de contraseñas fuera del hilo de la petición
+    from app import hashing
+    hashing.init_app(app)
+
+    # Lectura de facturas subidas: cola en PostgreSQL y pool de procesos
+    from app import facturas
+    facturas.init_app(app)
+
+    # Lecturas de medidores inteligentes (particiones y agregados)
+    from app import lecturas
+    lecturas.init_app(app)
+
+    # Moderación de la comunidad en segundo plano (lista de términos y reglas)
+    from app import moderacion
+    moderacion.init_app(app)
+
+    # Recursos estáticos con hash (manifest de `flask --app run assets build`)
+    from app import assets
+    assets.init_app(app)
+
+    # Caché HTTP: páginas públicas renderizadas y ETag de las páginas de datos
+    from app import cache_http
+    cache_http.init_app(app)
+
+    # Usuario autenticado disponible como g.usuario
+    from app import auth
+    auth.init_app(app)
 
     # Registrar rutas (Blueprints)
     from app.routes import main
     app.register_blueprint(main)
 
+    from app.api import api
+    app.register_blueprint(api)
+
     return app
@@ -0,0 +1,187 @@
+import re
+from datetime import datetime
+
+import numpy as np
+
+VENTANA = 3          # meses de la media móvil
+UMBRAL_Z = 2.0       # desviaciones estándar para marcar un mes como anómalo
+MIN_PARA_ANOMALIA = 4
+
+MESES = {
+    'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6,
+    'julio': 7, 'agosto': 8, 'septiembre': 9, 'setiembre': 9, 'octubre': 10,
+    'noviembre': 11, 'diciembre': 12,
+}
+_ABREVIADOS = {nombre[:3]: numero for nombre, numero in MESES.items()}
+
+
+def numero_mes(mes, fecha=None):
+    """Mes del año (1-12) a partir del texto libre de ``consumos.mes``.
+
+    Entiende "Marzo", "mar 2024", "2024-03" o "03/2024"; si no se reconoce
+    se usa el mes de ``fecha`` y, en último caso, 0 (sin estacionalidad).
+    """
+    texto = str(mes or '').strip().lower()
+    for palabra in re.findall(r'[a-záéíóú]+', texto):
+        if palabra in MESES:
+            return MESES[palabra]
+        if palabra[:3] in _ABREVIADOS:
+            return _ABREVIADOS[palabra[:3]]
+    numeros = re.findall(r'\d+', texto)
+    if len(numeros) == 2:
+        a, b = (int(n) for n in numeros)
+        candidato = b if a > 12 else a
+        if 1 <= candidato <= 12:
+            return candidato
+    if isinstance(fecha, datetime):
+        return fecha.month
+    return 0
+
+
+def medias_moviles(x, ventana=VENTANA):
+    """Media y desviación estándar móviles (NaN hasta completar la ventana)"""
+    n = len(x)
+    media = np.full(n, np.nan)
+    desv = np.full(n, np.nan)
+    if n < ventana:
+        return media, desv
+    suma = np.cumsum(np.insert(x, 0, 0.0))
+    suma2 = np.cumsum(np.insert(x * x, 0, 0.0))
+    s = suma[ventana:] - suma[:-ventana]
+    s2 = suma2[ventana:] - suma2[:-ventana]
+    media[ventana - 1:] = s / ventana
+    desv[ventana - 1:] = np.sqrt(np.maximum(s2 / ventana - (s / ventana) ** 2, 0.0))
+    return media, desv
+
+
+def anomalias(x, umbral=UMBRAL_Z):
+    """Índices de los meses cuyo consumo se aleja más de ``umbral`` desviaciones
+    de la media de los meses anteriores (media y desviación acumuladas)"""
+    n = len(x)
+    if n < MIN_PARA_ANOMALIA:
+        return []
+    cuenta = np.arange(1, n + 1)
+    media = np.cumsum(x) / cuenta
+    varianza = np.maximum(np.cumsum(x * x) / cuenta - media ** 2, 0.0)
+    # Comparar cada mes i con la historia hasta i-1
+    media_prev = media[:-1]
+    desv_prev = np.sqrt(varianza[:-1] * cuenta[:-1] / np.maximum(cuenta[:-1] - 1, 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(desv_prev > 0, (x[1:] - media_prev) / desv_prev, 0.0)
+    z[:MIN_PARA_ANOMALIA - 2] = 0.0
+    return [int(i) + 1 for i in np.flatnonzero(np.abs(z) > umbral)]
+
+
+def estado_inicial(ventana=VENTANA):
+    return {
+        'n': 0, 'media': 0.0, 'm2': 0.0, 'ventana': [], 'tam_ventana': ventana,
+        'suma_mes': [0.0] * 13, 'conteo_mes': [0] * 13, 'ultimo_mes': 0, 'z_ultimo': 0.0,
+    }
+
+
+def construir_estado(consumos, meses, ventana=VENTANA):
+    """Estado acumulado de toda la historia, calculado de forma vectorizada"""
+    x = np.asarray(consumos, dtype=float)
+    m = np.asarray(meses, dtype=int)
+    estado = estado_inicial(ventana)
+    if len(x) == 0:
+        return estado
+
+    estado['n'] = int(len(x))
+    estado['media'] = float(x.mean())
+    estado['m2'] = float(((x - x.mean()) ** 2).sum())
+    estado['ventana'] = [float(v) for v in x[-ventana:]]
+    estado['suma_mes'] = np.bincount(m, weights=x, minlength=13)[:13].tolist()
+    estado['conteo_mes'] = np.bincount(m, minlength=13)[:13].astype(int).tolist()
+    estado['ultimo_mes'] = int(m[-1])
+    estado['z_ultimo'] = _z(x[-1], x[:-1])
+    return estado
+
+
+def _z(valor, previos):
+    if len(previos) < MIN_PARA_ANOMALIA - 1:
+        return 0.0
+    desv = float(np.std(previos, ddof=1))
+    return float((valor - np.mean(previos)) / desv) if desv > 0 else 0.0
+
+
+def actualizar_estado(estado, consumo, mes):
+    """Camino incremental: incorpora una factura nueva en O(ventana) (Welford)"""
+    estado = dict(estado, ventana=list(estado['ventana']),
+                  suma_mes=list(estado['suma_mes']), conteo_mes=list(estado['conteo_mes']))
+    n = estado['n']
+    if n >= MIN_PARA_ANOMALIA - 1 and n > 1:
+        desv = (estado['m2'] / (n - 1)) ** 0.5
+        estado['z_ultimo'] = (consumo - estado['media']) / desv if desv > 0 else 0.0
+    else:
+        estado['z_ultimo'] = 0.0
+
+    n += 1
+    delta = consumo - estado['media']
+    estado['media'] += delta / n
+    estado['m2'] += delta * (consumo - estado['media'])
+    estado['n'] = n
+
+    estado['ventana'] = (estado['ventana'] + [float(consumo)])[-estado['tam_ventana']:]
+    estado['suma_mes'][mes] += float(consumo)
+    estado['conteo_mes'][mes] += 1
+    estado['ultimo_mes'] = mes
+    return estado
+
+
+def base_estacional(estado):
+    """Consumo promedio por mes del año (None donde no hay datos)"""
+    return [
+        (estado['suma_mes'][m] / estado['conteo_mes'][m]) if estado['conteo_mes'][m] else None
+        for m in range(1, 13)
+    ]
+
+
+def pronostico(estado):
+    """Consumo esperado para el mes siguiente.
+
+    Nivel reciente (media móvil) ajustado por el índice estacional del mes
+    siguiente cuando ya hay historia de ese mes; si no, el nivel reciente.
+    """
+    if estado['n'] == 0:
+        return None
+    nivel = float(np.mean(estado['ventana']))
+    siguiente = (estado['ultimo_mes'] % 12) + 1 if estado['ultimo_mes'] else 0
+    if siguiente and estado['conteo_mes'][siguiente] and estado['media'] > 0:
+        indice = (estado['suma_mes'][siguiente] / estado['conteo_mes'][siguiente]) / estado['media']
+        # Suavizar el índice cuando hay pocos años de datos
+        peso = min(estado['conteo_mes'][siguiente], 3) / 3
+        nivel *= 1 + (indice - 1) * peso
+    return max(nivel, 0.0)
+
+
+def metricas(estado):
+    """Cifras que muestra /reportes, derivadas solo del estado acumulado"""
+    n = estado['n']
+    desv = (estado['m2'] / (n - 1)) ** 0.5 if n > 1 else 0.0
+    ventana = estado['ventana']
+    prono = pronostico(estado)
+    return {
+        'registros': n,
+        'media_historica': round(estado['media'], 2) if n else None,
+        'desviacion': round(desv, 2) if n else None,
+        'media_movil': round(float(np.mean(ventana)), 2) if len(ventana) == estado['tam_ventana'] else None,
+        'z_ultimo': round(estado['z_ultimo'], 2),
+        'anomalia': abs(estado['z_ultimo']) > UMBRAL_Z,
+        'base_estacional': [round(v, 2) if v is not None else None for v in base_estacional(estado)],
+        'pronostico': round(prono, 2) if prono is not None else None,
+    }
+
+
+def analizar(filas):
+    """Análisis completo de la historia del usuario (filas ordenadas por fecha)"""
+    consumos = np.array([float(f['consumo']) for f in filas], dtype=float)
+    meses = [numero_mes(f['mes'], f.get('fecha')) for f in filas]
+    estado = construir_estado(consumos, meses)
+    media_movil, _ = medias_moviles(consumos)
+    return {
+        'estado': estado,
+        'metricas': metricas(estado),
+        'media_movil': [None if np.isnan(v) else round(float(v), 2) for v in media_movil],
+        'anomalias': anomalias(consumos),
+    }
@@ -0,0 +1,206 @@
+import csv
+import hmac
+import json
+
+import psycopg2
+from flask import Blueprint, Response, current_app, g, jsonify, request, stream_with_context, url_for
+
+from app.auth import api_login_required
+from app.comunidad import (CursorInvalido, MENSAJES_POR_PAGINA, buscar_mensajes, listar_mensajes,
+                           publicar_mensaje, validar_texto)
+from app.db import get_conn
+from app.eventos import formato_sse
+from app.facturas import FacturaInvalida, estado_trabajo, recibir_factura
+from app.ingesta import IngestaError, importar, registros_csv, registros_json
+from app import lecturas
+from app.resumen import invalidar_resumen, obtener_resumen
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+
+def _token_importacion_valido():
+    esperado = current_app.config.get('IMPORT_TOKEN')
+    recibido = request.headers.get('X-Import-Token', '')
+    return bool(esperado) and hmac.compare_digest(esperado, recibido)
+
+
+def _registros_de_la_peticion():
+    """Devuelve el iterador de registros según el tipo de contenido enviado"""
+    archivo = request.files.get('archivo')
+    if archivo is not None:
+        if (archivo.filename or '').lower().endswith('.json'):
+            return registros_json(json.load(archivo.stream))
+        return registros_csv(archivo.stream)
+    if request.mimetype in ('text/csv', 'application/csv'):
+        # Se lee directamente del socket: el CSV nunca se carga completo en memoria
+        return registros_csv(request.stream)
+    if request.is_json:
+        return registros_json(request.get_json())
+    raise IngestaError(["Envía un CSV (text/csv o campo 'archivo') o un JSON"])
+
+
+# IMPORTACIÓN MASIVA DE CONSUMOS (CSV o JSON)
+@api.route('/consumos/importar', methods=['POST'])
+def importar_consumos():
+    if _token_importacion_valido():
+        usuario_forzado = None   # importación administrativa: cualquier usuario
+    elif g.get('usuario') is not None:
+        usuario_forzado = g.usuario
+    else:
+        return jsonify(error="Autenticación requerida"), 401
+
+    try:
+        filas, usuarios = importar(get_conn(), _registros_de_la_peticion(), usuario_forzado)
+    except IngestaError as e:
+        return jsonify(error="No se importó ningún registro", detalles=e.errores[:20]), 400
+    except (csv.Error, UnicodeDecodeError, ValueError) as e:
+        return jsonify(error=f"Archivo inválido: {e}"), 400
+    except psycopg2.DataError as e:
+        # Un valor que PostgreSQL no acepta (fuera de rango, por ejemplo): no se guardó nada
+        return jsonify(error="No se importó ningún registro", detalles=[str(e).strip()]), 400
+
+    for usuario_id in usuarios:
+        invalidar_resumen(usuario_id)
+
+    return jsonify(importados=filas, usuarios=len(usuarios))
+
+
+# LECTURAS DE MEDIDORES (CSV o NDJSON en el cuerpo, leído por lotes)
+@api.route('/lecturas', methods=['POST'])
+def importar_lecturas():
+    if _token_importacion_valido():
+        usuario_forzado = None   # integración del operador: cada lectura trae usuario_id
+    elif g.get('usuario') is not None:
+        usuario_forzado = g.usuario
+    else:
+        return jsonify(error="Autenticación requerida"), 401
+
+    if request.mimetype in ('text/csv', 'application/csv'):
+        registros = registros_csv(request.stream)
+    elif request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        registros = lecturas.registros_ndjson(request.stream)
+    else:
+        return jsonify(error="Envía text/csv o application/x-ndjson con medido_en y kwh"), 415
+
+    try:
+        escritas, usuarios, errores = lecturas.importar(get_conn(), registros, usuario_forzado)
+    except (csv.Error, UnicodeDecodeError) as e:
+        return jsonify(error=f"Archivo inválido: {e}"), 400
+    except psycopg2.DataError as e:
+        # Los lotes anteriores ya se guardaron; reenviar el archivo es seguro
+        return jsonify(error="Un lote de lecturas fue rechazado por la base", detalles=[str(e).strip()]), 400
+    if errores and not usuarios:
+        return jsonify(error="No se guardó ninguna lectura", detalles=errores[:20]), 400
+    return jsonify(escritas=escritas, usuarios=len(usuarios), rechazadas=len(errores), detalles=errores[:20])
+
+
+@api.route('/lecturas')
+@api_login_required
+def serie_lecturas():
+    try:
+        desde, hasta = lecturas.rango_de_parametros(request.args)
+    except ValueError as e:
+        return jsonify(error=f"Rango inválido: {e}"), 400
+    return jsonify(lecturas.serie(get_conn(), g.usuario.id, desde, hasta))
+
+
+# SUBIDA DE FACTURAS: 202 con el trabajo; el estado se consulta aparte
+@api.route('/facturas', methods=['POST'])
+@api_login_required
+def subir_factura():
+    try:
+        trabajo = recibir_factura(g.usuario.id)
+    except FacturaInvalida as e:
+        return jsonify(error=str(e)), 400
+    url = url_for('api.estado_factura', trabajo_id=trabajo['id'])
+    return jsonify(id=trabajo['id'], estado=trabajo['estado'], url=url), 202, {'Location': url}
+
+
+@api.route('/facturas/<int:trabajo_id>')
+@api_login_required
+def estado_factura(trabajo_id):
+    trabajo = estado_trabajo(get_conn(), g.usuario.id, trabajo_id)
+    if trabajo is None:
+        return jsonify(error="Trabajo no encontrado"), 404
+    return jsonify(trabajo)
+
+
+# RESUMEN DE CONSUMO DEL USUARIO (mismos datos que /grafico y /reportes)
+@api.route('/resumen')
+@api_login_required
+def resumen_usuario():
+    return jsonify(obtener_resumen(get_conn(), g.usuario.id))
+
+
+# FEED DE LA COMUNIDAD (paginación por cursor)
+@api.route('/comunidad/mensajes')
+@api_login_required
+def mensajes_comunidad():
+    try:
+        pagina = dict(
+            antes=request.args.get('antes'),
+            despues=request.args.get('despues'),
+            limite=int(request.args.get('limite', MENSAJES_POR_PAGINA)),
+        )
+        mensajes = listar_mensajes(get_conn(), **pagina)
+    except (CursorInvalido, ValueError) as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(mensajes=mensajes)
+
+
+# BÚSQUEDA EN LA COMUNIDAD (por relevancia, paginada)
+@api.route('/comunidad/buscar')
+@api_login_required
+def buscar_comunidad():
+    try:
+        pagina = int(request.args.get('pagina', 1))
+        mensajes, hay_mas = buscar_mensajes(
+            get_conn(), request.args.get('q'), pagina,
+            int(request.args.get('limite', MENSAJES_POR_PAGINA)),
+        )
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(mensajes=mensajes, pagina=pagina, siguiente=pagina + 1 if hay_mas else None)
+
+
+@api.route('/comunidad/mensajes', methods=['POST'])
+@api_login_required
+def publicar_mensaje_comunidad():
+    datos = request.get_json(silent=True) or request.form
+    try:
+        texto = validar_texto(datos.get('mensaje'))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(mensaje=publicar_mensaje(get_conn(), g.usuario, texto)), 201
+
+
+# MENSAJES EN VIVO (Server-Sent Events)
+@api.route('/comunidad/stream')
+@api_login_required
+def stream_comunidad():
+    eventos = current_app.extensions['eventos']
+    heartbeat = current_app.config['SSE_HEARTBEAT']
+    sub = eventos.suscribir()
+    if sub is None:
+        # EventSource no reintenta tras un 503: la página sigue por sondeo
+        return jsonify(error="Demasiadas conexiones en vivo, usa el sondeo"), 503, {'Retry-After': '30'}
+
+    def generar():
+        try:
+            yield "retry: 5000\n\n"
+            while not sub.desalojada:
+                mensaje = sub.siguiente(timeout=heartbeat)
+                if mensaje is None:
+                    # Comentario SSE: mantiene viva la conexión a través de proxies
+                    yield ": ping\n\n"
+                    continue
+                yield formato_sse(mensaje, nombre='mensaje', evento_id=mensaje.get('cursor'))
+            yield formato_sse({'motivo': 'cliente lento'}, nombre='desalojado')
+        finally:
+            sub.cerrar()
+
+    return Response(
+        stream_with_context(generar()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
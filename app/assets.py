@@ -0,0 +1,276 @@
+# Recursos estáticos precompilados y con hash en el nombre.
+#
+#   npm ci                              # Tailwind y Chart.js en versiones fijas (package.json)
+#   flask --app run assets build        # genera app/static/dist/ y su manifest.json
+#
+# El build compila un único CSS minificado con las clases que usan las
+# plantillas, copia los JS de node_modules, genera variantes WebP y
+# redimensionadas de las imágenes y guarda cada archivo como nombre.<hash>.ext
+# junto a sus versiones .gz y .br. url_for('static', filename='img/Logo.jpg')
+# resuelve al archivo con hash a través del manifest, así que esos archivos se
+# sirven con caché de un año: un cambio de contenido es un nombre nuevo.
+#
+# Sin build (desarrollo) el manifest no existe y todo se sirve como antes.
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import subprocess
+from io import BytesIO
+
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup
+from markupsafe import Markup
+
+try:
+    import brotli
+except ImportError:  # dependencia opcional del build
+    brotli = None
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Un año: los archivos con hash nunca cambian de contenido
+MAX_AGE_INMUTABLE = 365 * 24 * 3600
+
+CSS_ENTRADA = os.path.join(RAIZ, 'assets', 'app.css')
+CSS_SALIDA = 'css/app.css'
+
+# Nombre lógico -> archivo en node_modules (versiones fijadas en package.json)
+VENDOR = {
+    'vendor/chart.umd.js': 'node_modules/chart.js/dist/chart.umd.js',
+    'vendor/chartjs-plugin-datalabels.min.js':
+        'node_modules/chartjs-plugin-datalabels/dist/chartjs-plugin-datalabels.min.js',
+}
+
+ANCHOS = (80, 160, 320, 640, 1280)
+TAMANOS_ICO = [(16, 16), (32, 32), (48, 48)]
+COMPRIMIBLES = ('.css', '.js', '.svg', '.ico', '.json', '.txt')
+
+
+# --- Build -------------------------------------------------------------------
+
+def _hash(datos):
+    return hashlib.sha256(datos).hexdigest()[:10]
+
+
+def _con_hash(nombre, datos):
+    base, ext = os.path.splitext(nombre)
+    return f"{base}.{_hash(datos)}{ext}"
+
+
+class Build:
+    def __init__(self, static_folder, salida=click.echo):
+        self.static = static_folder
+        self.dist = os.path.join(static_folder, DIST)
+        self.salida = salida
+        self.manifest = {}
+        # Pillow solo hace falta en el build: la aplicación no lo importa al arrancar
+        try:
+            from PIL import Image
+        except ImportError:  # dependencia opcional del build
+            Image = None
+        self.Image = Image
+
+    def escribir(self, nombre, datos):
+        """Guarda ``datos`` como dist/<nombre con hash> y lo registra en el manifest"""
+        destino = _con_hash(nombre, datos)
+        ruta = os.path.join(self.dist, destino)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'wb') as f:
+            f.write(datos)
+        if destino.endswith(COMPRIMIBLES):
+            self._precomprimir(ruta, datos)
+        self.manifest[nombre] = f"{DIST}/{destino}"
+
+    def _precomprimir(self, ruta, datos):
+        variantes = [('.gz', gzip.compress(datos, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variantes.append(('.br', brotli.compress(datos, quality=11)))
+        for ext, comprimido in variantes:
+            if len(comprimido) < len(datos):
+                with open(ruta + ext, 'wb') as f:
+                    f.write(comprimido)
+
+    def css(self):
+        if shutil.which('npx') is None or not os.path.isdir(os.path.join(RAIZ, 'node_modules', 'tailwindcss')):
+            self.salida("Aviso: sin node_modules/tailwindcss (npm ci); las plantillas usarán el CDN")
+            return
+        temporal = os.path.join(self.dist, '_app.css')
+        subprocess.run(
+            ['npx', 'tailwindcss', '-c', 'tailwind.config.js', '-i', CSS_ENTRADA, '-o', temporal, '--minify'],
+            cwd=RAIZ, check=True,
+        )
+        with open(temporal, 'rb') as f:
+            datos = f.read()
+        os.remove(temporal)
+        self.escribir(CSS_SALIDA, datos)
+        self.salida(f"css: {CSS_SALIDA} ({len(datos) // 1024} KB)")
+
+    def vendor(self):
+        for nombre, origen in VENDOR.items():
+            ruta = os.path.join(RAIZ, origen)
+            if not os.path.isfile(ruta):
+                self.salida(f"Aviso: falta {origen} (npm ci); se usará el CDN")
+                continue
+            with open(ruta, 'rb') as f:
+                self.escribir(nombre, f.read())
+            self.salida(f"js: {nombre}")
+
+    def estaticos(self):
+        """Copia con hash de todo lo que ya está en static/ (imágenes optimizadas)"""
+        for carpeta, subcarpetas, archivos in os.walk(self.static):
+            subcarpetas[:] = [d for d in subcarpetas if os.path.join(carpeta, d) != self.dist]
+            for archivo in sorted(archivos):
+                ruta = os.path.join(carpeta, archivo)
+                nombre = os.path.relpath(ruta, self.static).replace(os.sep, '/')
+                ext = os.path.splitext(archivo)[1].lower()
+                if self.Image is not None and ext in ('.jpg', '.jpeg', '.png'):
+                    self.imagen(nombre, ruta)
+                elif self.Image is not None and ext == '.ico':
+                    self.icono(nombre, ruta)
+                else:
+                    with open(ruta, 'rb') as f:
+                        self.escribir(nombre, f.read())
+        if self.Image is None:
+            self.salida("Aviso: Pillow no está instalado; las imágenes se copian sin variantes")
+
+    def imagen(self, nombre, ruta):
+        with open(ruta, 'rb') as f:
+            crudo = f.read()
+        with self.Image.open(ruta) as im:
+            im.load()
+            base, ext = os.path.splitext(nombre)
+            # Recomprimida solo si gana; el original sigue siendo el <img> de respaldo
+            optimizada = _codificar(im, ext.lower().lstrip('.'))
+            self.escribir(nombre, optimizada if optimizada and len(optimizada) < len(crudo) else crudo)
+            ancho_original = im.width
+            for ancho in [a for a in ANCHOS if a < ancho_original] + [ancho_original]:
+                alto = round(im.height * ancho / ancho_original)
+                variante = (im if ancho == ancho_original
+                            else im.resize((ancho, alto), self.Image.LANCZOS))
+                self.escribir(f"{base}-{ancho}.webp", _codificar(variante, 'webp'))
+        self.salida(f"img: {nombre} ({len(crudo) // 1024} KB) + webp")
+
+    def icono(self, nombre, ruta):
+        with self.Image.open(ruta) as im:
+            im.load()
+            buf = BytesIO()
+            im.save(buf, format='ICO', sizes=TAMANOS_ICO)
+        self.escribir(nombre, buf.getvalue())
+        self.salida(f"ico: {nombre} ({os.path.getsize(ruta) // 1024} KB -> {len(buf.getvalue()) // 1024} KB)")
+
+    def ejecutar(self):
+        shutil.rmtree(self.dist, ignore_errors=True)
+        os.makedirs(self.dist)
+        self.css()
+        self.vendor()
+        self.estaticos()
+        with open(os.path.join(self.dist, MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        return self.manifest
+
+
+def _codificar(im, formato):
+    buf = BytesIO()
+    if formato in ('jpg', 'jpeg'):
+        im.convert('RGB').save(buf, format='JPEG', quality=82, optimize=True, progressive=True)
+    elif formato == 'png':
+        im.save(buf, format='PNG', optimize=True)
+    elif formato == 'webp':
+        im.save(buf, format='WEBP', quality=80, method=6)
+    else:
+        return None
+    return buf.getvalue()
+
+
+assets_cli = AppGroup('assets', help="Recursos estáticos precompilados.")
+
+
+@assets_cli.command('build')
+def build_command():
+    """Compila CSS, copia JS y genera imágenes y manifest en static/dist."""
+    manifest = Build(current_app.static_folder).ejecutar()
+    click.echo(f"{len(manifest)} archivos en {DIST}/{MANIFEST}")
+
+
+# --- Aplicación -----------------------------------------------------------
+
+def cargar_manifest(app):
+    ruta = os.path.join(app.static_folder, DIST, MANIFEST)
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _resolver_estaticos(endpoint, values):
+    """url_for('static', filename=...) apunta al archivo con hash si existe"""
+    if endpoint != 'static' or 'filename' not in values:
+        return
+    destino = current_app.extensions['assets'].get(values['filename'])
+    if destino:
+        values['filename'] = destino
+
+
+def servir_estatico(filename):
+    """Vista de /static: los archivos de dist/ son inmutables y pueden ir
+    precomprimidos (brotli o gzip, según Accept-Encoding)"""
+    app = current_app
+    if not filename.startswith(DIST + '/'):
+        return app.send_static_file(filename)
+
+    mimetype = mimetypes.guess_type(filename)[0]
+    respuesta = None
+    for codificacion, ext in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[codificacion] and os.path.isfile(os.path.join(app.static_folder, filename + ext)):
+            respuesta = send_from_directory(app.static_folder, filename + ext, mimetype=mimetype,
+                                            max_age=MAX_AGE_INMUTABLE)
+            respuesta.headers['Content-Encoding'] = codificacion
+            break
+    if respuesta is None:
+        respuesta = send_from_directory(app.static_folder, filename, max_age=MAX_AGE_INMUTABLE)
+    respuesta.vary.add('Accept-Encoding')
+    respuesta.cache_control.public = True
+    respuesta.cache_control.immutable = True
+    return respuesta
+
+
+def asset_compilado(nombre):
+    """True si el build generó ``nombre`` (para elegir entre el bundle y el CDN)"""
+    return nombre in current_app.extensions['assets']
+
+
+def imagen(nombre, alt, clase='', ancho=None):
+    """<picture> con variantes WebP si el build las generó; si no, un <img> simple.
+
+    ``ancho`` es el ancho con que se muestra la imagen (px CSS): el navegador
+    elige la variante según la densidad de la pantalla.
+    """
+    manifest = current_app.extensions['assets']
+    base = os.path.splitext(nombre)[0]
+    variantes = sorted(
+        (int(clave[len(base) + 1:-5]), clave) for clave in manifest
+        if clave.startswith(base + '-') and clave.endswith('.webp') and clave[len(base) + 1:-5].isdigit()
+    )
+    img = Markup('<img src="{}" alt="{}" class="{}" decoding="async" />').format(
+        url_for('static', filename=nombre), alt, clase)
+    if not variantes:
+        return img
+    srcset = ', '.join(f"{url_for('static', filename=clave)} {w}w" for w, clave in variantes)
+    sizes = f"{ancho}px" if ancho else '100vw'
+    return Markup('<picture><source type="image/webp" srcset="{}" sizes="{}" />{}</picture>').format(
+        srcset, sizes, img)
+
+
+def init_app(app):
+    app.extensions['assets'] = cargar_manifest(app)
+    app.url_defaults(_resolver_estaticos)
+    app.view_functions['static'] = servir_estatico
+    app.jinja_env.globals.update(asset_compilado=asset_compilado, imagen=imagen)
+    app.cli.add_command(assets_cli)
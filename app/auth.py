@@ -0,0 +1,182 @@
+import threading
+import time
+from dataclasses import dataclass
+from functools import wraps
+
+from flask import current_app, flash, g, jsonify, redirect, request, session, url_for
+
+from app.cache import TTLCache
+from app.db import get_conn
+from app.hashing import get_servicio
+
+# correo -> id, solo para sesiones creadas antes de guardar usuario_id en la sesión
+_ids_por_correo = TTLCache(maxsize=4096, ttl=600)
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    id: int
+    nombre: str
+    correo: str
+
+
+def start_session(usuario):
+    """Guarda en la sesión los datos del usuario recién autenticado"""
+    session['logged_in'] = True
+    session['usuario_id'] = usuario['id']
+    session['usuario'] = usuario['nombre']
+    session['correo'] = usuario['correo']
+
+
+def end_session():
+    session.pop('logged_in', None)
+    session.pop('usuario_id', None)
+
+
+class LimiteIntentos:
+    """Ventana fija de intentos por clave (IP o correo), en memoria del proceso"""
+
+    def __init__(self, maximo, ventana, maxsize=10000):
+        self.maximo = maximo
+        self.ventana = ventana
+        self._conteos = TTLCache(maxsize=maxsize, ttl=ventana)   # clave -> (inicio, intentos)
+        self._lock = threading.Lock()
+
+    def bloqueado(self, clave):
+        if not self.maximo:
+            return False
+        item = self._conteos.get(clave)
+        return item is not None and item[1] >= self.maximo
+
+    def registrar(self, clave):
+        if not self.maximo:
+            return
+        ahora = time.monotonic()
+        with self._lock:
+            inicio, intentos = self._conteos.get(clave) or (ahora, 0)
+            restante = self.ventana - (ahora - inicio)
+            self._conteos.set(clave, (inicio, intentos + 1), ttl=max(restante, 0.001))
+
+    def reiniciar(self, clave):
+        self._conteos.delete(clave)
+
+
+def _clave_cuenta(correo):
+    return (correo or '').strip().lower()
+
+
+def login_bloqueado(ip, correo):
+    """True si la IP o la cuenta agotaron sus intentos en la ventana actual"""
+    ext = current_app.extensions
+    return ext['limite_ip'].bloqueado(ip) or ext['limite_cuenta'].bloqueado(_clave_cuenta(correo))
+
+
+def registrar_intento(ip, correo=None, exitoso=False):
+    """La IP y la cuenta cuentan solo los intentos fallidos (un login correcto
+    reinicia el de la cuenta); sin correo es un registro y cuenta para la IP"""
+    ext = current_app.extensions
+    if not exitoso:
+        ext['limite_ip'].registrar(ip)
+    if correo is None:
+        return
+    if exitoso:
+        ext['limite_cuenta'].reiniciar(_clave_cuenta(correo))
+    else:
+        ext['limite_cuenta'].registrar(_clave_cuenta(correo))
+
+
+def _rehashear(usuario_id, hash_anterior, contrasena):
+    nuevo = get_servicio().hashear(contrasena)
+    conn = get_conn()
+    cur = conn.cursor()
+    # Solo si nadie cambió la contraseña mientras tanto
+    cur.execute("UPDATE usuarios SET contrasena = %s WHERE id = %s AND contrasena = %s",
+                (nuevo, usuario_id, hash_anterior))
+    conn.commit()
+    cur.close()
+
+
+def programar_rehash(usuario, contrasena):
+    """Tras un login correcto, rehace el hash si se generó con otros parámetros"""
+    if get_servicio().necesita_rehash(usuario['contrasena']):
+        current_app.extensions['tareas'].encolar(
+            ('rehash', usuario['id']), _rehashear, usuario['id'], usuario['contrasena'], contrasena,
+        )
+
+
+def _lookup_user_id(correo):
+    usuario_id = _ids_por_correo.get(correo)
+    if usuario_id is None:
+        cur = get_conn().cursor()
+        cur.execute("SELECT id FROM usuarios WHERE correo = %s", (correo,))
+        row = cur.fetchone()
+        cur.close()
+        if row is None:
+            return None
+        usuario_id = row['id']
+        _ids_por_correo.set(correo, usuario_id)
+    return usuario_id
+
+
+def load_current_user():
+    """Expone el usuario autenticado como ``g.usuario`` (o None)"""
+    g.usuario = None
+    # Los archivos estáticos no necesitan la sesión (y así no llevan Vary: Cookie)
+    if request.endpoint == 'static':
+        return
+    if not session.get('logged_in'):
+        return
+
+    usuario_id = session.get('usuario_id')
+    if usuario_id is None and session.get('correo'):
+        # Sesión antigua sin id: se resuelve una vez y se guarda en la sesión
+        try:
+            usuario_id = _lookup_user_id(session['correo'])
+        except Exception as e:
+            print(f"Error al cargar el usuario de la sesión: {e}")
+            return
+        if usuario_id is None:
+            end_session()
+            return
+        session['usuario_id'] = usuario_id
+
+    g.usuario = CurrentUser(
+        id=usuario_id,
+        nombre=session.get('usuario', 'Usuario'),
+        correo=session.get('correo', ''),
+    )
+
+
+def login_required(view=None, mensaje='Por favor inicia sesión para acceder a esta página.'):
+    """Redirige al login si no hay usuario autenticado.
+
+    Se usa como ``@login_required`` o ``@login_required(mensaje='...')``.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if g.get('usuario') is None:
+                flash(mensaje, 'error')
+                return redirect(url_for('main.login'))
+            return view(*args, **kwargs)
+        return wrapped
+
+    if view is not None:
+        return decorator(view)
+    return decorator
+
+
+def api_login_required(view):
+    """Como login_required, pero responde 401 en JSON para los endpoints de la API"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if g.get('usuario') is None:
+            return jsonify(error="Autenticación requerida"), 401
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def init_app(app):
+    app.extensions['limite_ip'] = LimiteIntentos(app.config['LOGIN_MAX_POR_IP'], app.config['LOGIN_VENTANA'])
+    app.extensions['limite_cuenta'] = LimiteIntentos(app.config['LOGIN_MAX_POR_CUENTA'], app.config['LOGIN_VENTANA'])
+    app.before_request(load_current_user)
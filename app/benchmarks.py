@@ -0,0 +1,139 @@
+import bisect
+import time
+
+from flask import current_app
+
+from app.cache import TTLCache
+from app.db import get_conn
+
+# Los hogares de 6 o más personas comparten grupo
+MAX_PERSONAS = 6
+FRACCIONES = [p / 100 for p in range(1, 100)]   # percentiles 1..99
+
+# Con menos hogares la comparación no es significativa (ni anónima)
+MIN_HOGARES = 5
+
+# Segundos que se espera para agrupar varias facturas del mismo grupo
+DEMORA_REFRESCO = 5.0
+
+REFRESCAR_SQL = """
+    INSERT INTO benchmarks_consumo (estrato, num_personas, hogares, lecturas, percentiles, actualizado)
+    SELECT %(estrato)s, %(personas)s, count(DISTINCT c.usuario_id), count(*),
+           percentile_cont(%(fracciones)s::float8[]) WITHIN GROUP (ORDER BY c.consumo::float8),
+           NOW()
+      FROM consumos c
+      JOIN usuarios u ON u.id = c.usuario_id
+     WHERE u.estrato = %(estrato)s AND LEAST(u.num_personas, %(max_personas)s) = %(personas)s
+    ON CONFLICT (estrato, num_personas) DO UPDATE
+       SET hogares = EXCLUDED.hogares,
+           lecturas = EXCLUDED.lecturas,
+           percentiles = EXCLUDED.percentiles,
+           actualizado = EXCLUDED.actualizado
+"""
+
+GRUPOS_SQL = """
+    SELECT DISTINCT estrato, LEAST(num_personas, %s) AS personas
+      FROM usuarios
+     WHERE estrato IS NOT NULL AND num_personas IS NOT NULL
+"""
+
+# Lecturas recientes en memoria: el agregado cambia poco entre visitas
+_leidos = TTLCache(maxsize=256, ttl=60)
+
+
+def grupo(estrato, num_personas):
+    if estrato is None or num_personas is None:
+        return None
+    return int(estrato), min(int(num_personas), MAX_PERSONAS)
+
+
+def refrescar_grupo(conn, estrato, personas):
+    """Recalcula los percentiles de un solo grupo estrato x personas"""
+    cur = conn.cursor()
+    cur.execute(REFRESCAR_SQL, {
+        'estrato': estrato, 'personas': personas,
+        'fracciones': FRACCIONES, 'max_personas': MAX_PERSONAS,
+    })
+    conn.commit()
+    cur.close()
+    _leidos.delete((estrato, personas))
+
+
+def refrescar_todos(conn):
+    cur = conn.cursor()
+    cur.execute(GRUPOS_SQL, (MAX_PERSONAS,))
+    grupos = [(fila['estrato'], fila['personas']) for fila in cur.fetchall()]
+    cur.close()
+    for estrato, personas in grupos:
+        refrescar_grupo(conn, estrato, personas)
+    return len(grupos)
+
+
+def _refrescar_usuario(usuario_id, encolado_en):
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT u.estrato, u.num_personas,
+               COALESCE(b.actualizado >= to_timestamp(%s)::timestamp, FALSE) AS al_dia
+          FROM usuarios u
+          LEFT JOIN benchmarks_consumo b
+            ON b.estrato = u.estrato AND b.num_personas = LEAST(u.num_personas, %s)
+         WHERE u.id = %s
+    """, (encolado_en, MAX_PERSONAS, usuario_id))
+    fila = cur.fetchone()
+    cur.close()
+    conn.commit()
+    clave = grupo(fila['estrato'], fila['num_personas']) if fila else None
+    if clave is None:
+        return
+    # Otro usuario del mismo grupo ya disparó un refresco posterior a esta escritura
+    if fila['al_dia']:
+        return
+    refrescar_grupo(conn, *clave)
+
+
+def programar_refresco(usuario_id):
+    """Encola el refresco incremental del grupo del usuario tras guardar consumos"""
+    current_app.extensions['tareas'].encolar(
+        ('benchmark', usuario_id), _refrescar_usuario, usuario_id, time.time(),
+        demora=DEMORA_REFRESCO,
+    )
+
+
+def leer_grupo(conn, estrato, personas):
+    """Fila precalculada del grupo (lectura por clave primaria) o None"""
+    clave = (estrato, personas)
+    datos = _leidos.get(clave)
+    if datos is None:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT hogares, percentiles FROM benchmarks_consumo WHERE estrato = %s AND num_personas = %s",
+            clave,
+        )
+        fila = cur.fetchone()
+        cur.close()
+        datos = dict(fila) if fila else {'hogares': 0, 'percentiles': None}
+        _leidos.set(clave, datos)
+    return datos
+
+
+def comparar(conn, estrato, num_personas, consumo):
+    """Ubica el consumo del usuario entre los hogares similares.
+
+    Devuelve {'percentil', 'estrato', 'personas', 'hogares'} o None si no hay
+    suficientes datos del grupo.
+    """
+    clave = grupo(estrato, num_personas)
+    if clave is None or not consumo:
+        return None
+    datos = leer_grupo(conn, *clave)
+    if not datos['percentiles'] or datos['hogares'] < MIN_HOGARES:
+        return None
+    # Los 99 cortes están ordenados: la posición del consumo es su percentil
+    percentil = bisect.bisect_right(datos['percentiles'], float(consumo))
+    return {
+        'percentil': max(1, min(percentil, 99)),
+        'estrato': clave[0],
+        'personas': clave[1],
+        'hogares': datos['hogares'],
+    }
@@ -0,0 +1,175 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Caché en memoria del proceso con expiración (TTL) y desalojo LRU.
+
+    Segura para hilos; pensada para datos pequeños y calientes que se pueden
+    volver a calcular si se pierden.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # clave -> (expira_en, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING or item[0] <= now:
+                if item is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class RedisBackend:
+    """Backend compartido entre workers sobre un cliente compatible con Redis.
+
+    Basta cualquier objeto con ``get``, ``setex`` y ``delete`` (redis-py,
+    fakeredis o un sustituto local en pruebas). El desalojo LRU queda a cargo
+    del servidor (``maxmemory-policy allkeys-lru``).
+    """
+
+    def __init__(self, client, ttl=300.0, prefix='enertech:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, key):
+        return f"{self.prefix}{key}"
+
+    def get(self, key, default=None):
+        raw = self.client.get(self._key(key))
+        if raw is None:
+            return default
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        seconds = max(1, int(self.ttl if ttl is None else ttl))
+        self.client.setex(self._key(key), seconds, json.dumps(value))
+
+    def delete(self, key):
+        self.client.delete(self._key(key))
+
+
+class SummaryCache:
+    """Caché por usuario con contadores de aciertos y fallos.
+
+    Los errores del backend (por ejemplo Redis caído) se tratan como fallos de
+    caché: la página se calcula desde la base de datos y se sigue sirviendo.
+    """
+
+    def __init__(self, backend, namespace):
+        self.backend = backend
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def _count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def get(self, key):
+        try:
+            value = self.backend.get(self._key(key))
+        except Exception as e:
+            print(f"Error al leer la caché {self.namespace}: {e}")
+            self._count('errors')
+            value = None
+        self._count('misses' if value is None else 'hits')
+        return value
+
+    def set(self, key, value):
+        try:
+            self.backend.set(self._key(key), value)
+        except Exception as e:
+            print(f"Error al escribir la caché {self.namespace}: {e}")
+            self._count('errors')
+
+    def delete(self, key):
+        try:
+            self.backend.delete(self._key(key))
+        except Exception as e:
+            print(f"Error al invalidar la caché {self.namespace}: {e}")
+            self._count('errors')
+
+    def stats(self):
+        with self._lock:
+            stats = {'hits': self.hits, 'misses': self.misses, 'errors': self.errors}
+        if isinstance(self.backend, TTLCache):
+            stats.update(size=len(self.backend), evictions=self.backend.evictions)
+        return stats
+
+
+def make_backend(app, maxsize, ttl, client=None):
+    """Backend local (TTLCache) o Redis si se configuró CACHE_REDIS_URL"""
+    if client is None and app.config.get('CACHE_REDIS_URL'):
+        try:
+            import redis
+        except ImportError:
+            print("Advertencia: CACHE_REDIS_URL configurado pero el paquete redis no está instalado")
+        else:
+            client = redis.Redis.from_url(app.config['CACHE_REDIS_URL'])
+    if client is not None:
+        return RedisBackend(client, ttl=ttl)
+    return TTLCache(maxsize=maxsize, ttl=ttl)
+
+
+def init_app(app, redis_client=None):
+    backend = make_backend(
+        app,
+        maxsize=app.config['RESUMEN_CACHE_MAX'],
+        ttl=app.config['RESUMEN_CACHE_TTL'],
+        client=redis_client,
+    )
+    app.extensions['resumen_cache'] = SummaryCache(backend, 'resumen')
@@ -0,0 +1,138 @@
+# Caché HTTP de las páginas.
+#
+# - Páginas públicas (inicio, quiénes somos, registro): el HTML renderizado se
+#   guarda en memoria por (endpoint, sesión iniciada o no) y se responde con
+#   Cache-Control y ETag; no se usa si hay mensajes flash pendientes.
+# - Páginas de datos (/grafico, /reportes): antes de ejecutar la vista se
+#   calcula la versión de los datos del usuario; si coincide con la ETag que
+#   manda el navegador se responde 304 sin consultas pesadas ni plantillas.
+#   /grafico suma la fecha del día: su ventana de 30 días se mueve sola.
+import hashlib
+import os
+from datetime import date, datetime, time, timezone
+from functools import wraps
+
+from flask import current_app, g, make_response, message_flashed, request, session
+
+from app.cache import TTLCache
+from app.db import get_conn
+
+_paginas = TTLCache(maxsize=64, ttl=300)
+
+
+def version_plantillas(app):
+    """Huella de las plantillas y del manifest de estáticos: cambia con cada
+    despliegue que toque el HTML y es igual en todos los workers"""
+    h = hashlib.sha1()
+    carpetas = [os.path.join(app.root_path, app.template_folder)]
+    carpetas.append(os.path.join(app.static_folder, 'dist'))
+    for carpeta in carpetas:
+        for raiz, _, archivos in sorted(os.walk(carpeta)):
+            for archivo in sorted(archivos):
+                if archivo.endswith(('.html', '.json')):
+                    with open(os.path.join(raiz, archivo), 'rb') as f:
+                        h.update(f.read())
+    return h.hexdigest()[:8]
+
+
+def _hay_flashes():
+    return bool(session.get('_flashes'))
+
+
+def _marcar_flash(sender, message, category, **extra):
+    g.hubo_flash = True
+
+
+def pagina_publica(view=None, max_age=None):
+    """Guarda el HTML de una página sin datos del usuario y la sirve con
+    Cache-Control y ETag (304 si el navegador ya la tiene)"""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if request.method != 'GET' or _hay_flashes():
+                return view(*args, **kwargs)
+
+            conectado = bool(session.get('logged_in'))
+            clave = (request.endpoint, conectado)
+            item = _paginas.get(clave)
+            if item is None:
+                html = view(*args, **kwargs)
+                if not isinstance(html, str):
+                    return html
+                item = (html, hashlib.sha1(html.encode('utf-8')).hexdigest()[:20])
+                _paginas.set(clave, item)
+
+            html, etag = item
+            respuesta = make_response(html)
+            respuesta.set_etag(etag)
+            respuesta.cache_control.max_age = max_age or current_app.config['PAGINAS_PUBLICAS_MAX_AGE']
+            # Con sesión la cabecera cambia (enlaces del menú): solo caché del navegador
+            if conectado:
+                respuesta.cache_control.private = True
+            else:
+                respuesta.cache_control.public = True
+            return respuesta.make_conditional(request)
+        return wrapped
+
+    if view is not None:
+        return decorator(view)
+    return decorator
+
+
+def condicional(version, por_dia=False):
+    """Responde 304 si ``version(conn, usuario_id)`` no cambió desde la copia
+    del navegador; si cambió, ejecuta la vista y adjunta ETag y Last-Modified.
+
+    ``version`` devuelve (etag, fecha de última modificación) o None. El etag
+    queda en ``g.version_datos`` para que la vista lea los datos de esa misma
+    versión (p. ej. obtener_resumen) y el cuerpo corresponda al ETag.
+
+    Con ``por_dia`` la ETag incluye la fecha de hoy, para vistas que además
+    dependen del día (ventanas relativas a ``datetime.now()``).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if _hay_flashes():
+                return view(*args, **kwargs)
+            try:
+                datos = version(get_conn(), g.usuario.id)
+            except Exception as e:
+                print(f"Error al calcular la versión de la página: {e}")
+                datos = None
+            if datos is None:
+                return view(*args, **kwargs)
+            g.version_datos = datos[0]
+
+            etag = f"{current_app.extensions['version_plantillas']}-{datos[0]}"
+            modificado = datos[1].replace(tzinfo=timezone.utc, microsecond=0) if datos[1] else None
+            if por_dia:
+                hoy = date.today()
+                etag = f"{etag}-{hoy.isoformat()}"
+                inicio_dia = datetime.combine(hoy, time()).replace(tzinfo=timezone.utc)
+                modificado = max(modificado, inicio_dia) if modificado else inicio_dia
+
+            if request.if_none_match.contains(etag) or (
+                not request.if_none_match and modificado and request.if_modified_since
+                and modificado <= request.if_modified_since
+            ):
+                respuesta = make_response('', 304)
+            else:
+                respuesta = make_response(view(*args, **kwargs))
+                # Una página con error (flash) no debe quedar cacheada
+                if g.get('hubo_flash') or respuesta.status_code != 200:
+                    return respuesta
+
+            respuesta.set_etag(etag)
+            if modificado:
+                respuesta.last_modified = modificado
+            respuesta.cache_control.private = True
+            respuesta.cache_control.no_cache = True   # revalidar siempre: es barato
+            return respuesta
+        return wrapped
+    return decorator
+
+
+def init_app(app):
+    app.extensions['version_plantillas'] = version_plantillas(app)
+    message_flashed.connect(_marcar_flash, app)
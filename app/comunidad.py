@@ -0,0 +1,218 @@
+import base64
+import random
+from datetime import datetime
+
+from flask import current_app
+
+# Colores aleatorios para el avatar
+COLORES_AVATAR = ['#22c55e', '#3b82f6', '#f97316', '#8b5cf6', '#ec4899', '#06b6d4']
+
+# Tips de ahorro de la comunidad (se muestran 3 al azar)
+TIPS_DEL_MES = (
+    "Plancha tu ropa una sola vez a la semana para ahorrar energía",
+    "Desconecta los cargadores cuando no los uses, siguen consumiendo energía",
+    "Usa la luz natural durante el día y ahorra en iluminación artificial",
+    "Lava la ropa con agua fría cuando sea posible para reducir el consumo",
+    "Aprovecha el calor residual: apaga la estufa unos minutos antes de terminar",
+    "Sella bien las ventanas y puertas para evitar pérdidas de temperatura",
+    "Usa ventiladores en lugar de aire acondicionado cuando sea posible",
+    "Descongela regularmente el refrigerador para mejorar su eficiencia",
+    "Agrupa las comidas que requieren cocción para aprovechar el calor del horno",
+    "Instala bombillas LED, consumen hasta 80% menos que las incandescentes",
+    "Usa cortinas gruesas en invierno para mantener el calor dentro",
+    "Limpia regularmente los filtros del aire acondicionado",
+    "Aprovecha el sol para secar la ropa en lugar de usar secadora",
+    "Desconecta los electrodomésticos en standby al final del día",
+    "Usa el microondas en lugar del horno para calentar comidas pequeñas",
+    "Configura tu termostato 2-3 grados más alto en verano",
+    "Cocina con las ollas tapadas para usar menos energía",
+    "Llena completamente la lavadora antes de usarla",
+    "Instala sensores de movimiento para luces en áreas poco usadas",
+    "Usa el modo eco en tus electrodomésticos cuando esté disponible",
+    "Mantén el refrigerador a 3-5°C y el congelador a -18°C",
+    "Revisa y reemplaza los sellos de puertas y ventanas si están dañados",
+    "Usa timers para apagar automáticamente luces y aparatos",
+    "Aprovecha el calor del sol para calentar agua en verano",
+    "Cierra las cortinas en verano para mantener el calor fuera",
+    "Limpia las bobinas del refrigerador para mejorar su eficiencia",
+    "Usa ollas del tamaño adecuado para la estufa que estás usando",
+    "Evita abrir el horno mientras cocinas, pierde mucho calor",
+    "Usa la lavavajillas solo cuando esté llena",
+    "Configura el modo de ahorro de energía en tus dispositivos",
+)
+
+MENSAJES_POR_PAGINA = 20
+MAX_MENSAJES_POR_PAGINA = 100
+MAX_LONGITUD_MENSAJE = 1000
+# La búsqueda pagina por desplazamiento: más allá de esto conviene afinar la consulta
+MAX_PAGINAS_BUSQUEDA = 50
+MIN_LONGITUD_BUSQUEDA = 2
+MAX_LONGITUD_BUSQUEDA = 200
+
+# Solo estos estados se muestran: los pendientes esperan al moderador y los
+# ocultos no salen nunca
+VISIBLE = "moderacion IN ('aprobado', 'marcado')"
+
+# La fecha se guarda en UTC sin zona horaria; se formatea en la hora de Colombia
+# directamente en PostgreSQL ("DD/MM/YYYY HH:MM").
+_COLUMNAS = """
+    id, nombre_usuario, mensaje, color_avatar, icono, fecha, secuencia,
+    to_char((fecha AT TIME ZONE 'UTC') AT TIME ZONE 'America/Bogota', 'DD/MM/YYYY HH24:MI') AS tiempo
+"""
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def codificar_cursor(fecha, mensaje_id, secuencia=None):
+    partes = [fecha.isoformat(), str(mensaje_id)]
+    if secuencia is not None:
+        partes.append(str(secuencia))
+    return base64.urlsafe_b64encode('|'.join(partes).encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Convierte el cursor opaco en (fecha, id, secuencia); los cursores
+    anteriores a la secuencia (o de un mensaje pendiente) la traen en None"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        partes = base64.urlsafe_b64decode(cursor + relleno).decode().split('|')
+        if len(partes) not in (2, 3):
+            raise ValueError(cursor)
+        secuencia = int(partes[2]) if len(partes) == 3 else None
+        return datetime.fromisoformat(partes[0]), int(partes[1]), secuencia
+    except (ValueError, UnicodeDecodeError):
+        raise CursorInvalido("Cursor de paginación inválido")
+
+
+def _a_dict(fila):
+    return {
+        'id': fila['id'],
+        'usuario': fila['nombre_usuario'],
+        'texto': fila['mensaje'],
+        'tiempo': fila['tiempo'],
+        'color_avatar': fila['color_avatar'],
+        'icono': fila['icono'],
+        'secuencia': fila['secuencia'],
+        'cursor': codificar_cursor(fila['fecha'], fila['id'], fila['secuencia']),
+    }
+
+
+def mensajes_por_id(conn, ids):
+    """Los mensajes visibles de ``ids`` en el orden en que se aprobaron (para el SSE)"""
+    if not ids:
+        return []
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT {_COLUMNAS} FROM mensajes_comunidad
+         WHERE id = ANY(%s) AND {VISIBLE}
+         ORDER BY secuencia
+    """, (list(ids),))
+    filas = cur.fetchall()
+    cur.close()
+    return [_a_dict(f) for f in filas]
+
+
+def listar_mensajes(conn, antes=None, despues=None, limite=MENSAJES_POR_PAGINA):
+    """Mensajes del más reciente al más antiguo, paginados por cursor.
+
+    ``antes`` trae los mensajes más antiguos que el cursor (scroll infinito) y
+    ``despues`` los que se hicieron visibles después (sondeo): va por la
+    secuencia del moderador y no por la fecha, porque un mensaje se aprueba un
+    rato después de publicarse. Sin cursores devuelve la primera página.
+    """
+    limite = max(1, min(int(limite), MAX_MENSAJES_POR_PAGINA))
+    cur = conn.cursor()
+    if despues is not None:
+        fecha, mensaje_id, secuencia = decodificar_cursor(despues)
+        # Los más cercanos al cursor primero, para que el siguiente sondeo continúe donde quedó
+        if secuencia is not None:
+            cur.execute(f"""
+                SELECT {_COLUMNAS} FROM mensajes_comunidad
+                 WHERE secuencia > %s AND {VISIBLE}
+                 ORDER BY secuencia ASC
+                 LIMIT %s
+            """, (secuencia, limite))
+        else:
+            cur.execute(f"""
+                SELECT {_COLUMNAS} FROM mensajes_comunidad
+                 WHERE (fecha, id) > (%s, %s) AND {VISIBLE}
+                 ORDER BY fecha ASC, id ASC
+                 LIMIT %s
+            """, (fecha, mensaje_id, limite))
+        filas = list(reversed(cur.fetchall()))
+    elif antes is not None:
+        fecha, mensaje_id, _ = decodificar_cursor(antes)
+        cur.execute(f"""
+            SELECT {_COLUMNAS} FROM mensajes_comunidad
+             WHERE (fecha, id) < (%s, %s) AND {VISIBLE}
+             ORDER BY fecha DESC, id DESC
+             LIMIT %s
+        """, (fecha, mensaje_id, limite))
+        filas = cur.fetchall()
+    else:
+        cur.execute(f"""
+            SELECT {_COLUMNAS} FROM mensajes_comunidad
+             WHERE {VISIBLE}
+             ORDER BY fecha DESC, id DESC
+             LIMIT %s
+        """, (limite,))
+        filas = cur.fetchall()
+    cur.close()
+    return [_a_dict(f) for f in filas]
+
+
+def buscar_mensajes(conn, consulta, pagina=1, limite=MENSAJES_POR_PAGINA):
+    """Búsqueda de texto completo (configuración 'spanish', índice GIN).
+
+    Acepta la sintaxis de un buscador: "frase exacta", -excluir, OR. Devuelve
+    (mensajes ordenados por relevancia y fecha, hay_mas).
+    """
+    consulta = (consulta or '').strip()
+    if len(consulta) < MIN_LONGITUD_BUSQUEDA:
+        raise ValueError(f"Escribe al menos {MIN_LONGITUD_BUSQUEDA} caracteres para buscar")
+    if len(consulta) > MAX_LONGITUD_BUSQUEDA:
+        raise ValueError(f"La búsqueda no puede superar {MAX_LONGITUD_BUSQUEDA} caracteres")
+    pagina = max(1, min(int(pagina), MAX_PAGINAS_BUSQUEDA))
+    limite = max(1, min(int(limite), MAX_MENSAJES_POR_PAGINA))
+
+    cur = conn.cursor()
+    # Una fila de más indica si existe la página siguiente sin contar todo
+    cur.execute(f"""
+        SELECT {_COLUMNAS}, ts_rank_cd(busqueda, q) AS rango
+          FROM mensajes_comunidad, websearch_to_tsquery('spanish', %s) AS q
+         WHERE busqueda @@ q AND {VISIBLE}
+         ORDER BY rango DESC, fecha DESC, id DESC
+         LIMIT %s OFFSET %s
+    """, (consulta, limite + 1, (pagina - 1) * limite))
+    filas = cur.fetchall()
+    cur.close()
+    hay_mas = len(filas) > limite and pagina < MAX_PAGINAS_BUSQUEDA
+    return [_a_dict(f) for f in filas[:limite]], hay_mas
+
+
+def publicar_mensaje(conn, usuario, texto):
+    """Guarda el mensaje como pendiente y lo devuelve con el mismo formato que
+    listar_mensajes. El moderador lo revisa en segundo plano y, si queda
+    visible, lo anuncia a los clientes conectados (NOTIFY)."""
+    cur = conn.cursor()
+    cur.execute(f"""
+        INSERT INTO mensajes_comunidad (usuario_id, nombre_usuario, mensaje, color_avatar, icono)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING {_COLUMNAS}
+    """, (usuario.id, usuario.nombre, texto, random.choice(COLORES_AVATAR), 'person'))
+    mensaje = _a_dict(cur.fetchone())
+    conn.commit()
+    cur.close()
+    current_app.extensions['moderacion'].programar()
+    return mensaje
+
+
+def validar_texto(texto):
+    texto = (texto or '').strip()
+    if not texto:
+        raise ValueError("El mensaje no puede estar vacío")
+    if len(texto) > MAX_LONGITUD_MENSAJE:
+        raise ValueError(f"El mensaje no puede superar {MAX_LONGITUD_MENSAJE} caracteres")
+    return texto
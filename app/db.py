@@ -0,0 +1,216 @@
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+from flask import current_app, g
+
+from app.metricas import CursorInstrumentado
+
+
+class PoolExhaustedError(Exception):
+    """No hubo conexión libre dentro del tiempo de espera configurado"""
+
+
+class ConnectionPool:
+    """Pool de conexiones a PostgreSQL seguro para hilos.
+
+    Las conexiones se abren bajo demanda (nunca al crear el pool), se reutilizan
+    en orden LIFO y se verifican con ``SELECT 1`` si llevan mucho tiempo inactivas.
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=10, timeout=5.0,
+                 health_check_after=30.0, max_idle=300.0, **connect_kwargs):
+        if maxconn < 1 or minconn < 0 or minconn > maxconn:
+            raise ValueError("Tamaño de pool inválido: se requiere 0 <= min <= max y max >= 1")
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.max_idle = max_idle
+        self.connect_kwargs = connect_kwargs
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._idle = []      # [(conexion, ultimo_uso)]
+        self._in_use = set()
+        self._closed = False
+
+        # Métricas acumuladas
+        self.checkouts = 0
+        self.exhausted = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.connections_opened = 0
+        self.connections_discarded = 0
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        with self._lock:
+            self.connections_opened += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self.connections_discarded += 1
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _take_idle(self):
+        """Saca una conexión inactiva utilizable, cerrando las caducadas"""
+        while True:
+            now = time.monotonic()
+            stale = None
+            with self._lock:
+                if not self._idle:
+                    return None
+                # Recortar primero las conexiones más viejas por encima del mínimo
+                if len(self._idle) > self.minconn and now - self._idle[0][1] > self.max_idle:
+                    stale, _ = self._idle.pop(0)
+                else:
+                    conn, last_used = self._idle.pop()
+            if stale is not None:
+                self._discard(stale)
+                continue
+            if conn.closed:
+                self._discard(conn)
+                continue
+            if now - last_used > self.health_check_after and not self._is_healthy(conn):
+                self._discard(conn)
+                continue
+            return conn
+
+    def getconn(self):
+        if self._closed:
+            raise PoolExhaustedError("El pool de conexiones está cerrado")
+
+        start = time.monotonic()
+        acquired = self._slots.acquire(timeout=self.timeout)
+        waited = time.monotonic() - start
+        with self._lock:
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            if not acquired:
+                self.exhausted += 1
+        if not acquired:
+            raise PoolExhaustedError(
+                f"Sin conexiones disponibles tras {self.timeout:.1f}s (máximo {self.maxconn})"
+            )
+
+        try:
+            conn = self._take_idle() or self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use.add(id(conn))
+            self.checkouts += 1
+        return conn
+
+    def putconn(self, conn, close=False):
+        with self._lock:
+            if id(conn) not in self._in_use:
+                raise ValueError("La conexión no pertenece a este pool")
+            self._in_use.discard(id(conn))
+
+        try:
+            if not close and not conn.closed:
+                # Nunca devolver una conexión con una transacción a medias
+                status = conn.get_transaction_status()
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+        except Exception:
+            close = True
+
+        if close or conn.closed or self._closed:
+            self._discard(conn)
+        else:
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        self._slots.release()
+
+    def closeall(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'min': self.minconn,
+                'max': self.maxconn,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'checkouts': self.checkouts,
+                'exhausted': self.exhausted,
+                'wait_seconds_total': round(self.wait_seconds_total, 6),
+                'wait_seconds_max': round(self.wait_seconds_max, 6),
+                'connections_opened': self.connections_opened,
+                'connections_discarded': self.connections_discarded,
+            }
+
+
+def init_app(app):
+    """Crea el pool de la aplicación y registra la devolución de conexiones"""
+    database_url = app.config.get('DATABASE_URL')
+    if not database_url:
+        print("Advertencia: no se encontró DATABASE_URL en la configuración")
+
+    app.extensions['db_pool'] = ConnectionPool(
+        database_url,
+        minconn=app.config['DB_POOL_MIN'],
+        maxconn=app.config['DB_POOL_MAX'],
+        timeout=app.config['DB_POOL_TIMEOUT'],
+        health_check_after=app.config['DB_POOL_HEALTH_CHECK'],
+        max_idle=app.config['DB_POOL_MAX_IDLE'],
+        cursor_factory=CursorInstrumentado,
+    )
+    app.teardown_appcontext(release_conn)
+
+
+def get_pool():
+    return current_app.extensions['db_pool']
+
+
+def get_conn():
+    """Devuelve la conexión prestada para el contexto actual (una por petición)"""
+    if 'db_conn' not in g:
+        pool = get_pool()
+        if not pool.dsn:
+            raise ValueError("No se encontró DATABASE_URL en la configuración")
+        g.db_conn = pool.getconn()
+    return g.db_conn
+
+
+def release_conn(exc=None):
+    """Devuelve la conexión al pool al cerrar el contexto de la aplicación"""
+    conn = g.pop('db_conn', None)
+    if conn is None:
+        return
+    if exc is not None and not conn.closed:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+    get_pool().putconn(conn)
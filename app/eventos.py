@@ -0,0 +1,196 @@
+import json
+import queue
+import select
+import threading
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+CANAL_MENSAJES = 'mensajes_comunidad'
+
+
+class Suscripcion:
+    def __init__(self, hub, maxsize):
+        self.hub = hub
+        self.cola = queue.Queue(maxsize=maxsize)
+        self.desalojada = False
+
+    def siguiente(self, timeout):
+        """Devuelve el siguiente evento o None si no llegó nada en ``timeout``"""
+        try:
+            return self.cola.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def cerrar(self):
+        self.hub.cancelar(self)
+
+
+class Hub:
+    """Pub/sub en memoria del proceso con colas acotadas por cliente.
+
+    Un cliente lento cuya cola se llena se desaloja (en lugar de bloquear al
+    resto o crecer sin límite); el navegador se reconecta por su cuenta.
+    """
+
+    def __init__(self, maxsize=100, max_clientes=None):
+        self.maxsize = maxsize
+        self.max_clientes = max_clientes
+        self._subs = set()
+        self._lock = threading.Lock()
+        self.publicados = 0
+        self.desalojados = 0
+        self.rechazados = 0
+
+    def suscribir(self):
+        """Nueva suscripción, o None si ya hay ``max_clientes`` conectados"""
+        sub = Suscripcion(self, self.maxsize)
+        with self._lock:
+            if self.max_clientes and len(self._subs) >= self.max_clientes:
+                self.rechazados += 1
+                return None
+            self._subs.add(sub)
+        return sub
+
+    def cancelar(self, sub):
+        with self._lock:
+            self._subs.discard(sub)
+
+    def publicar(self, evento):
+        with self._lock:
+            subs = list(self._subs)
+            self.publicados += 1
+        for sub in subs:
+            try:
+                sub.cola.put_nowait(evento)
+            except queue.Full:
+                sub.desalojada = True
+                self.cancelar(sub)
+                with self._lock:
+                    self.desalojados += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'clientes': len(self._subs),
+                'publicados': self.publicados,
+                'desalojados': self.desalojados,
+                'rechazados': self.rechazados,
+            }
+
+
+class Escucha(threading.Thread):
+    """Hilo único por worker que hace LISTEN en PostgreSQL y reparte en el hub.
+
+    Los avisos solo traen ``{"id": ...}`` (el payload de NOTIFY tiene un límite
+    de 8000 bytes); ``cargar(conn, ids)`` lee con la conexión del hilo los
+    eventos completos a publicar. Sin ``cargar`` se publica el aviso tal cual.
+    """
+
+    def __init__(self, dsn, hub, canal=CANAL_MENSAJES, cargar=None):
+        super().__init__(name=f'listen-{canal}', daemon=True)
+        self.dsn = dsn
+        self.hub = hub
+        self.canal = canal
+        self.cargar = cargar
+        self._detener = threading.Event()
+
+    def _publicar(self, conn, avisos):
+        if self.cargar is None:
+            eventos = avisos
+        else:
+            eventos = self.cargar(conn, [a['id'] for a in avisos if isinstance(a, dict) and 'id' in a])
+        for evento in eventos:
+            self.hub.publicar(evento)
+
+    def detener(self):
+        self._detener.set()
+
+    def _escuchar(self):
+        conn = psycopg2.connect(self.dsn, cursor_factory=RealDictCursor)
+        conn.set_session(autocommit=True)
+        try:
+            cur = conn.cursor()
+            cur.execute(f'LISTEN "{self.canal}"')
+            cur.close()
+            while not self._detener.is_set():
+                if select.select([conn], [], [], 5.0) == ([], [], []):
+                    continue
+                conn.poll()
+                avisos = []
+                while conn.notifies:
+                    aviso = conn.notifies.pop(0)
+                    try:
+                        avisos.append(json.loads(aviso.payload))
+                    except ValueError:
+                        print(f"Aviso inválido en el canal {self.canal}: {aviso.payload[:200]}")
+                if avisos:
+                    self._publicar(conn, avisos)
+        finally:
+            conn.close()
+
+    def run(self):
+        espera = 1.0
+        while not self._detener.is_set():
+            inicio = time.monotonic()
+            try:
+                self._escuchar()
+            except Exception as e:
+                print(f"Error en LISTEN {self.canal}, reintentando en {espera:.0f}s: {e}")
+            # Reiniciar el backoff si la conexión duró un buen rato
+            espera = 1.0 if time.monotonic() - inicio > 60 else min(espera * 2, 60.0)
+            self._detener.wait(espera)
+
+
+class Eventos:
+    """Hub de la aplicación con su hilo LISTEN, que se arranca al primer suscriptor"""
+
+    def __init__(self, dsn, maxsize, max_clientes=None, cargar=None):
+        self.dsn = dsn
+        self.hub = Hub(maxsize=maxsize, max_clientes=max_clientes)
+        self.cargar = cargar
+        self._escucha = None
+        self._lock = threading.Lock()
+
+    def suscribir(self):
+        """Suscripción al hub, o None si el worker ya tiene el máximo de clientes"""
+        sub = self.hub.suscribir()
+        if sub is None:
+            return None
+        with self._lock:
+            if self._escucha is None or not self._escucha.is_alive():
+                self._escucha = Escucha(self.dsn, self.hub, cargar=self.cargar)
+                self._escucha.start()
+        return sub
+
+    def stats(self):
+        stats = self.hub.stats()
+        stats['escuchando'] = bool(self._escucha and self._escucha.is_alive())
+        return stats
+
+
+def notificar(cur, evento, canal=CANAL_MENSAJES):
+    """Encola un NOTIFY en la transacción actual: se entrega solo si hay commit.
+
+    El payload no puede pasar de 8000 bytes: mandar solo el id y dejar que
+    Escucha cargue el resto.
+    """
+    cur.execute("SELECT pg_notify(%s, %s)", (canal, json.dumps(evento)))
+
+
+def formato_sse(evento, nombre=None, evento_id=None):
+    lineas = []
+    if nombre:
+        lineas.append(f"event: {nombre}")
+    if evento_id:
+        lineas.append(f"id: {evento_id}")
+    lineas.append(f"data: {json.dumps(evento)}")
+    return "\n".join(lineas) + "\n\n"
+
+
+def init_app(app):
+    from app.comunidad import mensajes_por_id
+
+    app.extensions['eventos'] = Eventos(app.config.get('DATABASE_URL'), app.config['SSE_COLA_MAX'],
+                                        max_clientes=app.config['SSE_MAX_CLIENTES'], cargar=mensajes_por_id)
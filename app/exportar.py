@@ -0,0 +1,302 @@
+# Exportación de la historia completa de consumos con su analítica.
+#
+# - CSV: respuesta en streaming que recorre un cursor con nombre (del lado del
+#   servidor), de a ITERSIZE filas; la memoria no crece con los años de historia.
+# - PDF: se genera en la cola de tareas, fuera del hilo de la petición, y queda
+#   en disco con la versión de los datos en el nombre. Cualquier escritura
+#   (guardar_consumo, importación, factura) cambia la versión y el siguiente
+#   pedido lo regenera.
+import csv
+import glob
+import hashlib
+import importlib.util
+import io
+import os
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from flask import current_app
+
+from app import analitica
+from app.db import get_conn
+from app.resumen import TARIFA_POR_DEFECTO, datos_reporte, iniciar_escritura, nivel_consumo
+
+# reportlab se importa al armar el primer PDF, no al arrancar; sin él solo se exporta CSV
+REPORTLAB = importlib.util.find_spec('reportlab') is not None
+
+ITERSIZE = 2000
+FILAS_POR_BLOQUE = 500
+
+COLUMNAS = ('mes', 'fecha', 'consumo_kwh', 'promedio_kwh', 'diferencia_kwh', 'porcentaje',
+            'nivel', 'costo_cop', 'media_movil_kwh', 'anomalia')
+
+USUARIO_SQL = """
+    SELECT u.nombre, u.apellido, u.estrato, t.valor_kwh
+      FROM usuarios u
+      LEFT JOIN tarifas t ON t.estrato = u.estrato
+     WHERE u.id = %s
+"""
+
+HISTORIA_SQL = """
+    SELECT mes, consumo, promedio, fecha FROM consumos
+     WHERE usuario_id = %s
+     ORDER BY fecha ASC, id ASC
+"""
+
+# Lo que cambia el contenido del PDF (sin los percentiles de comparación)
+VERSION_SQL = """
+    SELECT count(c.id) AS registros, max(c.fecha) AS ultima,
+           sum(c.consumo) AS total, sum(c.promedio) AS total_promedio, max(t.actualizado) AS tarifa
+      FROM usuarios u
+      LEFT JOIN consumos c ON c.usuario_id = u.id
+      LEFT JOIN tarifas t ON t.estrato = u.estrato
+     WHERE u.id = %s
+"""
+
+COLORES_NIVEL = {'verde': '#dcfce7', 'amarillo': '#fef9c3', 'rojo': '#fee2e2'}
+
+# Un texto que empieza así lo toma la hoja de cálculo como fórmula
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def datos_usuario(conn, usuario_id):
+    cur = conn.cursor()
+    cur.execute(USUARIO_SQL, (usuario_id,))
+    usuario = cur.fetchone()
+    cur.close()
+    if usuario is None:
+        return None
+    tarifa = float(usuario['valor_kwh']) if usuario['valor_kwh'] is not None else TARIFA_POR_DEFECTO
+    return dict(usuario, tarifa=tarifa)
+
+
+def filas_exportacion(conn, usuario_id, tarifa):
+    """Itera la historia del usuario con la analítica de cada mes.
+
+    Usa un cursor con nombre: PostgreSQL entrega las filas de a ITERSIZE y la
+    analítica avanza por el camino incremental (media, ventana y z del mes).
+    """
+    cur = conn.cursor(name='exportar_consumos')
+    cur.itersize = ITERSIZE
+    try:
+        cur.execute(HISTORIA_SQL, (usuario_id,))
+        estado = analitica.estado_inicial()
+        for fila in cur:
+            consumo = float(fila['consumo'])
+            promedio = float(fila['promedio'])
+            estado = analitica.actualizar_estado(
+                estado, consumo, analitica.numero_mes(fila['mes'], fila['fecha']))
+            ventana = estado['ventana']
+            diferencia = consumo - promedio
+            nivel, nivel_color, _ = nivel_consumo(consumo, promedio)
+            yield {
+                'mes': str(fila['mes']),
+                'fecha': fila['fecha'].date().isoformat() if fila['fecha'] else '',
+                'consumo_kwh': consumo,
+                'promedio_kwh': promedio,
+                'diferencia_kwh': round(diferencia, 2),
+                'porcentaje': round(consumo / promedio * 100, 1) if promedio > 0 else 0,
+                'nivel': nivel,
+                'nivel_color': nivel_color,
+                'costo_cop': round(abs(diferencia) * tarifa),
+                'media_movil_kwh': (round(sum(ventana) / len(ventana), 2)
+                                    if len(ventana) == estado['tam_ventana'] else ''),
+                'anomalia': abs(estado['z_ultimo']) > analitica.UMBRAL_Z,
+            }
+    finally:
+        cur.close()
+        conn.commit()
+
+
+def _celda_csv(valor):
+    """Valor de una celda del CSV; el texto libre (mes) no se abre como fórmula"""
+    if valor is True:
+        return 'sí'
+    if valor is False:
+        return 'no'
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def csv_consumos(conn, usuario_id):
+    """Genera el CSV por bloques de FILAS_POR_BLOQUE líneas"""
+    usuario = datos_usuario(conn, usuario_id)
+    tarifa = usuario['tarifa'] if usuario else TARIFA_POR_DEFECTO
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write('\ufeff')   # BOM: Excel abre el archivo como UTF-8
+    escritor.writerow(COLUMNAS)
+    for n, fila in enumerate(filas_exportacion(conn, usuario_id, tarifa), start=1):
+        escritor.writerow([_celda_csv(fila[c]) for c in COLUMNAS])
+        if n % FILAS_POR_BLOQUE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+# --- PDF ----------------------------------------------------------------------
+
+def pdf_disponible():
+    return REPORTLAB
+
+
+def carpeta_reportes(app=None):
+    app = app or current_app
+    return app.config.get('REPORTES_DIR') or os.path.join(app.instance_path, 'reportes')
+
+
+def version_historia(conn, usuario_id):
+    cur = conn.cursor()
+    cur.execute(VERSION_SQL, (usuario_id,))
+    fila = cur.fetchone()
+    cur.close()
+    huella = '|'.join(str(fila[k]) for k in ('registros', 'ultima', 'total', 'total_promedio', 'tarifa'))
+    return hashlib.sha1(f"{usuario_id}|{huella}".encode()).hexdigest()[:20]
+
+
+def ruta_pdf(usuario_id, version):
+    return os.path.join(carpeta_reportes(), f"{usuario_id}-{version}.pdf")
+
+
+def _ruta_error(usuario_id, version):
+    return os.path.join(carpeta_reportes(), f"{usuario_id}-{version}.error")
+
+
+def error_pdf(usuario_id, version):
+    """El error de la última generación fallida de ``version``, o None.
+
+    La marca se borra al leerla: la página de espera deja de reintentar y el
+    usuario vuelve a intentarlo con un clic, no en un bucle.
+    """
+    ruta = _ruta_error(usuario_id, version)
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            error = f.read()
+        os.remove(ruta)
+    except FileNotFoundError:
+        return None
+    return error or 'error desconocido'
+
+
+def construir_pdf(usuario, filas):
+    """Documento con el resumen del último mes y la tabla de toda la historia"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    estilos = getSampleStyleSheet()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, title="Reporte de consumo - EnerTech",
+                            leftMargin=1.5 * cm, rightMargin=1.5 * cm, topMargin=1.5 * cm, bottomMargin=1.5 * cm)
+
+    nombre = ' '.join(p for p in (usuario['nombre'], usuario['apellido']) if p)
+    elementos = [
+        Paragraph("EnerTech - Reporte de Consumo Energético", estilos['Title']),
+        Paragraph(f"{escape(nombre)} · Estrato {usuario['estrato'] or '-'} · "
+                  f"Tarifa {usuario['tarifa']:,.1f} COP/kWh", estilos['Normal']),
+        Paragraph(f"Generado el {datetime.now():%Y-%m-%d %H:%M}", estilos['Normal']),
+        Spacer(1, 0.6 * cm),
+    ]
+    if not filas:
+        elementos.append(Paragraph(datos_reporte(None)['reporte_texto'], estilos['Normal']))
+        doc.build(elementos)
+        return buffer.getvalue()
+
+    ultimo = filas[-1]
+    reporte = datos_reporte({'mes': ultimo['mes'], 'consumo': ultimo['consumo_kwh'],
+                             'promedio': ultimo['promedio_kwh']}, usuario['tarifa'])
+    total = sum(f['consumo_kwh'] for f in filas)
+    elementos += [
+        Paragraph(escape(reporte['reporte_texto']), estilos['Normal']),
+        Spacer(1, 0.3 * cm),
+        Paragraph(f"{len(filas)} meses registrados · {total:,.1f} kWh en total · "
+                  f"{sum(f['nivel_color'] == 'rojo' for f in filas)} meses en zona roja · "
+                  f"{sum(f['anomalia'] for f in filas)} meses atípicos", estilos['Normal']),
+        Spacer(1, 0.6 * cm),
+    ]
+
+    encabezado = ['Mes', 'Consumo (kWh)', 'Promedio (kWh)', 'Diferencia', '%', 'Nivel', 'Costo (COP)']
+    datos = [encabezado] + [
+        [f['mes'], f"{f['consumo_kwh']:,.1f}", f"{f['promedio_kwh']:,.1f}", f"{f['diferencia_kwh']:+,.1f}",
+         f"{f['porcentaje']:.0f}", f['nivel'].split(' ')[0] + (' *' if f['anomalia'] else ''),
+         f"{f['costo_cop']:,}"]
+        for f in filas
+    ]
+    estilo = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#019863')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#d1d5db')),
+    ]
+    for i, f in enumerate(filas, start=1):
+        estilo.append(('BACKGROUND', (5, i), (5, i), colors.HexColor(COLORES_NIVEL[f['nivel_color']])))
+    tabla = Table(datos, repeatRows=1)
+    tabla.setStyle(TableStyle(estilo))
+    elementos += [tabla, Spacer(1, 0.3 * cm),
+                  Paragraph("* Mes atípico: se aleja más de dos desviaciones de los meses anteriores.",
+                            estilos['Italic'])]
+    doc.build(elementos)
+    return buffer.getvalue()
+
+
+def _escribir_pdf(usuario_id):
+    """Escribe el PDF y devuelve su ruta.
+
+    La versión y los datos salen de la misma foto (REPEATABLE READ): si hubo una
+    escritura desde que se pidió el reporte, el archivo queda con la versión
+    de lo que realmente contiene, nunca contenido nuevo bajo la clave vieja.
+    """
+    conn = get_conn()
+    iniciar_escritura(conn)
+    ruta = ruta_pdf(usuario_id, version_historia(conn, usuario_id))
+    if os.path.isfile(ruta):
+        conn.commit()
+        return ruta
+    usuario = datos_usuario(conn, usuario_id)
+    if usuario is None:
+        raise ValueError("El usuario no existe")
+    filas = list(filas_exportacion(conn, usuario_id, usuario['tarifa']))
+    contenido = construir_pdf(usuario, filas)
+
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = ruta + '.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(contenido)
+    os.replace(temporal, ruta)
+    return ruta
+
+
+def generar_pdf(usuario_id, version):
+    """Tarea de fondo: escribe el PDF de ``version`` (o de la vigente, si los
+    datos cambiaron desde el pedido) y borra los anteriores.
+
+    Si falla deja una marca con el error (ver error_pdf) y la excepción sigue
+    hacia la cola de tareas, que la registra.
+    """
+    ruta = ruta_pdf(usuario_id, version)
+    if os.path.isfile(ruta):
+        return
+    try:
+        ruta = _escribir_pdf(usuario_id)
+    except Exception as e:
+        os.makedirs(carpeta_reportes(), exist_ok=True)
+        with open(_ruta_error(usuario_id, version), 'w', encoding='utf-8') as f:
+            f.write(str(e)[:500])
+        raise
+    for anterior in glob.glob(os.path.join(carpeta_reportes(), f"{usuario_id}-*.*")):
+        if anterior != ruta and anterior.endswith(('.pdf', '.error')):
+            try:
+                os.remove(anterior)
+            except FileNotFoundError:
+                pass   # otro worker ya lo borró
+
+
+def programar_pdf(usuario_id, version):
+    """Encola la generación; pedidos repetidos de la misma versión se fusionan"""
+    current_app.extensions['tareas'].encolar(('pdf', usuario_id, version), generar_pdf, usuario_id, version)
@@ -0,0 +1,515 @@
+# Facturas subidas (PDF o foto) y su lectura en segundo plano.
+#
+# La petición solo escribe el archivo en disco a medida que llega (por bloques,
+# nunca completo en memoria), crea una fila en trabajos_factura y responde con
+# el id del trabajo. Un despachador por proceso toma los trabajos pendientes con
+# FOR UPDATE SKIP LOCKED (varios workers o máquinas no se pisan), extrae el
+# texto en un pool de procesos acotado y guarda los meses encontrados en
+# consumos. Los errores transitorios se reintentan con espera exponencial; un
+# trabajo que quedó a medias porque su proceso murió se retoma cuando vence
+# bloqueado_hasta.
+#
+# Por defecto la cola la atiende solo el despachador dedicado; con
+# FACTURAS_EN_WEB=1 (desarrollo, un solo proceso) la atiende cada worker web.
+#
+#   flask --app run facturas worker     # despachador dedicado
+import multiprocessing
+import os
+import random
+import re
+import tempfile
+import threading
+import uuid
+from datetime import date, datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import click
+from flask import current_app, request
+from flask.cli import AppGroup
+from psycopg2.extras import Json
+from werkzeug.formparser import FormDataParser
+
+from app.analitica import MESES
+from app.db import get_conn
+
+# Primeros bytes de cada formato aceptado (no se confía en la extensión)
+FIRMAS = {
+    b'%PDF-': 'pdf',
+    b'\x89PNG\r\n\x1a\n': 'png',
+    b'\xff\xd8\xff': 'jpg',
+}
+MAX_PAGINAS = 10
+MAX_MESES = 12
+MAX_KWH = 100000
+ESPERA_MAXIMA = 3600
+
+TOMAR_SQL = """
+    UPDATE trabajos_factura
+       SET estado = 'procesando', intentos = intentos + 1,
+           bloqueado_hasta = NOW() + make_interval(secs => %(plazo)s), actualizado = NOW()
+     WHERE id = (
+           SELECT id FROM trabajos_factura
+            WHERE estado IN ('pendiente', 'procesando') AND disponible_en <= NOW()
+              AND (estado = 'pendiente' OR bloqueado_hasta < NOW())
+            ORDER BY disponible_en
+            LIMIT 1
+              FOR UPDATE SKIP LOCKED)
+    RETURNING id, usuario_id, archivo, tipo, intentos
+"""
+
+# intentos en el WHERE: si el plazo venció y otro proceso retomó el trabajo,
+# el resultado de este intento se descarta
+TERMINAR_SQL = """
+    UPDATE trabajos_factura
+       SET estado = %(estado)s, filas = %(filas)s, error = %(error)s,
+           disponible_en = NOW() + make_interval(secs => %(espera)s),
+           bloqueado_hasta = NULL, actualizado = NOW()
+     WHERE id = %(id)s AND intentos = %(intentos)s AND estado = 'procesando'
+"""
+
+
+class FacturaInvalida(Exception):
+    """El archivo no se puede leer como factura: no se reintenta"""
+
+
+# --- Lectura (proceso hijo) -----------------------------------------------
+
+_NOMBRES_MES = {numero: nombre.capitalize() for nombre, numero in MESES.items() if nombre != 'setiembre'}
+
+# "Enero 150", "ENE/24 150,5 kWh", "mar. 2024: 98" (en la misma línea)
+_PATRON_MES = re.compile(
+    r'\b([a-záéíóú]{3,10})\.?(?:[ \t/-]*((?:19|20)?\d{2})\b)?[ \t:=-]*(\d+(?:[.,]\d+)?)[ \t]*(kwh)?',
+)
+_PATRON_PROMEDIO = re.compile(r'promedio[^\d\n]{0,40}(\d+(?:[.,]\d+)?)')
+
+
+def _mes(palabra):
+    if palabra in MESES:
+        return MESES[palabra]
+    # Abreviado: "ene", "sept"; no "marca" ni "mayor"
+    if len(palabra) <= 4:
+        for nombre, numero in MESES.items():
+            if nombre.startswith(palabra):
+                return numero
+    return None
+
+
+def _anio_probable(numero, referencia):
+    """Año de un mes sin año: el último en que ese mes no pasa de ``referencia``
+    (mes, año), así un historial de 12 meses que cruza el año queda bien"""
+    mes_ref, anio_ref = referencia
+    return anio_ref if numero <= mes_ref else anio_ref - 1
+
+
+def interpretar(texto, hoy=None):
+    """Meses con su consumo en el texto de una factura.
+
+    Devuelve [(mes, año, consumo, promedio)] con el mes como en el formulario
+    ("Enero"). El año es el que trae la factura junto al mes; si no lo trae se
+    deduce del mes más reciente con año de la factura o, si ninguno lo tiene,
+    de ``hoy``. El promedio es el que trae la factura o, si no aparece, la
+    media de los meses leídos.
+    """
+    hoy = hoy or date.today()
+    texto = texto.lower()
+    candidatos = [c for c in _PATRON_MES.findall(texto) if _mes(c[0]) is not None]
+    # Si la factura marca las unidades, las fechas sueltas ("enero 15") no cuentan
+    if any(c[3] for c in candidatos):
+        candidatos = [c for c in candidatos if c[3]]
+
+    leidos = []
+    for palabra, anio, valor, _ in candidatos:
+        consumo = float(valor.replace(',', '.'))
+        if consumo <= MAX_KWH:
+            leidos.append((_mes(palabra), int(anio) + 2000 if len(anio) == 2 else int(anio or 0), consumo))
+    con_anio = [(numero, anio) for numero, anio, _ in leidos if anio]
+    referencia = max(con_anio, key=lambda m: (m[1], m[0])) if con_anio else (hoy.month, hoy.year)
+
+    meses = {}
+    for numero, anio, consumo in leidos:
+        clave = (numero, anio or _anio_probable(numero, referencia))
+        # El historial suele empezar por el mes facturado: gana la primera aparición
+        meses.setdefault(clave, consumo)
+        if len(meses) >= MAX_MESES:
+            break
+    if not meses:
+        return []
+
+    encontrado = _PATRON_PROMEDIO.search(texto)
+    if encontrado:
+        promedio = float(encontrado.group(1).replace(',', '.'))
+    else:
+        promedio = round(sum(meses.values()) / len(meses), 2)
+    return [(_NOMBRES_MES[numero], anio, consumo, promedio) for (numero, anio), consumo in meses.items()]
+
+
+def filas_consumo(filas):
+    """Filas de interpretar -> (mes, consumo, promedio, fecha) para upsert_consumos.
+
+    La fecha es el primer día del mes leído: fija el año de la clave
+    (usuario_id, mes, anio) y ordena el historial en el gráfico.
+    """
+    return [(mes, consumo, promedio, datetime(anio, MESES[mes.lower()], 1))
+            for mes, anio, consumo, promedio in filas]
+
+
+def extraer_texto(ruta, tipo):
+    # Las librerías se importan aquí, ya en el proceso del pool: los workers web
+    # no pagan su carga al arrancar
+    if tipo == 'pdf':
+        try:
+            from pypdf import PdfReader
+            from pypdf.errors import PdfReadError
+        except ImportError:  # sin pypdf no se leen PDF
+            raise FacturaInvalida("El servidor no puede leer PDF (falta pypdf)")
+        try:
+            lector = PdfReader(ruta)
+            return "\n".join(pagina.extract_text() or '' for pagina in lector.pages[:MAX_PAGINAS])
+        except PdfReadError as e:
+            raise FacturaInvalida(f"PDF dañado: {e}")
+    try:
+        import pytesseract
+        from PIL import Image
+    except ImportError:  # OCR opcional: también requiere el binario tesseract
+        raise FacturaInvalida("El servidor no tiene OCR para imágenes; sube la factura en PDF")
+    with Image.open(ruta) as imagen:
+        return pytesseract.image_to_string(imagen, lang='spa')
+
+
+def leer_factura(ruta, tipo):
+    """Texto del archivo -> filas de consumo (se ejecuta en el pool de procesos)"""
+    texto = extraer_texto(ruta, tipo)
+    if not texto.strip():
+        raise FacturaInvalida("La factura no tiene texto legible (¿PDF escaneado?); sube una foto nítida")
+    filas = interpretar(texto)
+    if not filas:
+        raise FacturaInvalida("No se encontraron consumos mensuales en la factura")
+    return filas
+
+
+# --- Subida -----------------------------------------------------------------
+
+def carpeta_facturas(app=None):
+    app = app or current_app
+    return app.config.get('FACTURAS_DIR') or os.path.join(app.instance_path, 'facturas')
+
+
+def _tipo_archivo(f):
+    f.seek(0)
+    inicio = f.read(8)
+    for firma, tipo in FIRMAS.items():
+        if inicio.startswith(firma):
+            return tipo
+    return None
+
+
+def recibir_factura(usuario_id, campo='factura'):
+    """Guarda el archivo del multipart en disco y encola su lectura.
+
+    El parser escribe cada bloque directamente en un archivo de la carpeta de
+    facturas; el límite de tamaño se aplica mientras llega el cuerpo
+    (RequestEntityTooLarge). Devuelve la fila del trabajo creado.
+    """
+    carpeta = carpeta_facturas()
+    os.makedirs(carpeta, exist_ok=True)
+    temporales = []
+
+    def destino(total_content_length, content_type, filename, content_length=None):
+        f = tempfile.NamedTemporaryFile(dir=carpeta, prefix='subida-', suffix='.part', delete=False)
+        temporales.append(f)
+        return f
+
+    # Se aplica al leer request.stream, también sin Content-Length (chunked)
+    request.max_content_length = current_app.config['FACTURAS_MAX_MB'] * 1024 * 1024
+    parser = FormDataParser(stream_factory=destino, max_form_memory_size=64 * 1024, max_form_parts=20)
+    try:
+        _, _, archivos = parser.parse(request.stream, request.mimetype, request.content_length,
+                                      request.mimetype_params)
+        archivo = archivos.get(campo)
+        if archivo is None or not archivo.filename:
+            raise FacturaInvalida("Selecciona el archivo de la factura")
+        tipo = _tipo_archivo(archivo.stream)
+        if tipo is None:
+            raise FacturaInvalida("Formato no soportado: sube un PDF, PNG o JPG")
+        tamano = archivo.stream.seek(0, os.SEEK_END)
+        nombre = f"{uuid.uuid4().hex}.{tipo}"
+        archivo.stream.close()
+        os.replace(archivo.stream.name, os.path.join(carpeta, nombre))
+    finally:
+        for f in temporales:
+            f.close()
+            if os.path.exists(f.name):
+                os.remove(f.name)
+
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO trabajos_factura (usuario_id, archivo, nombre_original, tipo, tamano)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING id, estado, creado
+        """, (usuario_id, nombre, archivo.filename[:255], tipo, tamano))
+        trabajo = cur.fetchone()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        os.remove(os.path.join(carpeta, nombre))
+        raise
+    finally:
+        cur.close()
+
+    current_app.extensions['facturas'].avisar()
+    return trabajo
+
+
+def estado_trabajo(conn, usuario_id, trabajo_id):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT id, estado, intentos, nombre_original, filas, error, creado, actualizado,
+               CASE WHEN estado = 'pendiente' THEN disponible_en END AS reintento_en
+          FROM trabajos_factura
+         WHERE id = %s AND usuario_id = %s
+    """, (trabajo_id, usuario_id))
+    fila = cur.fetchone()
+    cur.close()
+    conn.commit()
+    return fila
+
+
+# --- Despachador --------------------------------------------------------------
+
+class Despachador:
+    """Toma trabajos de la tabla y los procesa con concurrencia acotada.
+
+    ``procesos`` es a la vez el tamaño del pool y el máximo de trabajos en
+    curso por proceso web; con 0 se leen en el hilo del despachador
+    (desarrollo). El pool usa "spawn", como el de hashing.
+    """
+
+    def __init__(self, app, procesos=1, intentos=4, reintento=30.0, plazo=300.0, espera=5.0, en_web=True):
+        self.app = app
+        self.en_web = en_web
+        self.procesos = procesos
+        self.intentos = intentos
+        self.reintento = reintento
+        self.plazo = plazo
+        self.espera = espera
+        self._cupos = threading.BoundedSemaphore(max(procesos, 1))
+        self._despertar = threading.Event()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._hilo = None
+        self.en_curso = 0
+        self.tomados = 0
+        self.completados = 0
+        self.reintentos = 0
+        self.fallidos = 0
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            return self._executor
+
+    def iniciar(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name='facturas', daemon=True)
+                self._hilo.start()
+        return self._hilo
+
+    def avisar(self):
+        """Hay un trabajo nuevo: no esperar al siguiente sondeo"""
+        if self.en_web:
+            self.iniciar()
+            self._despertar.set()
+
+    def _tomar(self):
+        with self.app.app_context():
+            conn = get_conn()
+            cur = conn.cursor()
+            try:
+                cur.execute(TOMAR_SQL, {'plazo': self.plazo})
+                trabajo = cur.fetchone()
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+        return trabajo
+
+    def _bucle(self):
+        while True:
+            self._cupos.acquire()
+            try:
+                trabajo = self._tomar()
+            except Exception as e:
+                print(f"Error al tomar trabajos de facturas: {e}")
+                trabajo = None
+            if trabajo is None:
+                self._cupos.release()
+                self._despertar.wait(self.espera)
+                self._despertar.clear()
+                continue
+
+            with self._lock:
+                self.tomados += 1
+                self.en_curso += 1
+            ruta = os.path.join(carpeta_facturas(self.app), trabajo['archivo'])
+            if not self.procesos:
+                self._ejecutar_en_hilo(trabajo, ruta)
+                continue
+            try:
+                futuro = self._pool().submit(leer_factura, ruta, trabajo['tipo'])
+            except Exception as e:
+                self._terminar(trabajo, error=e)
+                continue
+            futuro.add_done_callback(lambda f, t=trabajo: self._al_terminar(t, f))
+
+    def _ejecutar_en_hilo(self, trabajo, ruta):
+        try:
+            filas = leer_factura(ruta, trabajo['tipo'])
+        except Exception as e:
+            self._terminar(trabajo, error=e)
+        else:
+            self._terminar(trabajo, filas=filas)
+
+    def _al_terminar(self, trabajo, futuro):
+        try:
+            filas = futuro.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                # Un hijo murió (memoria, archivo patológico): el próximo trabajo crea otro pool
+                self.cerrar()
+            self._terminar(trabajo, error=e)
+        else:
+            self._terminar(trabajo, filas=filas)
+
+    def _terminar(self, trabajo, filas=None, error=None):
+        try:
+            with self.app.app_context():
+                if error is None:
+                    self._guardar(trabajo, filas)
+                else:
+                    self._fallo(trabajo, error)
+        except Exception as e:
+            # El plazo vencerá y otro intento lo retomará
+            print(f"Error al cerrar el trabajo de factura {trabajo['id']}: {e}")
+        finally:
+            with self._lock:
+                self.en_curso -= 1
+            self._cupos.release()
+            self._despertar.set()
+
+    def _guardar(self, trabajo, filas):
+        from app.benchmarks import programar_refresco
+        from app.ingesta import upsert_consumos
+        from app.resumen import invalidar_resumen
+
+        conn = get_conn()
+        cur = conn.cursor()
+        try:
+            cur.execute(TERMINAR_SQL, {'estado': 'listo', 'filas': Json(filas), 'error': None, 'espera': 0,
+                                       'id': trabajo['id'], 'intentos': trabajo['intentos']})
+            if cur.rowcount != 1:
+                conn.rollback()
+                return
+            # Mismo upsert que el formulario, en la misma transacción que el estado
+            upsert_consumos(cur, trabajo['usuario_id'], filas_consumo(filas))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+        with self._lock:
+            self.completados += 1
+        # Los meses de una factura pueden ser de años anteriores: el write-through
+        # solo sabe agregarlos al final, así que se recalcula en la próxima visita
+        invalidar_resumen(trabajo['usuario_id'])
+        programar_refresco(trabajo['usuario_id'])
+
+    def _fallo(self, trabajo, error):
+        definitivo = isinstance(error, FacturaInvalida) or trabajo['intentos'] >= self.intentos
+        if definitivo:
+            estado, espera = 'error', 0
+            with self._lock:
+                self.fallidos += 1
+        else:
+            # 30 s, 60 s, 120 s... con un poco de azar para no sincronizar reintentos
+            espera = min(self.reintento * 2 ** (trabajo['intentos'] - 1), ESPERA_MAXIMA)
+            espera *= random.uniform(1.0, 1.25)
+            estado = 'pendiente'
+            with self._lock:
+                self.reintentos += 1
+        if not isinstance(error, FacturaInvalida):
+            print(f"Error al leer la factura {trabajo['id']} (intento {trabajo['intentos']}): {error}")
+
+        conn = get_conn()
+        cur = conn.cursor()
+        try:
+            cur.execute(TERMINAR_SQL, {'estado': estado, 'filas': None, 'error': str(error)[:500],
+                                       'espera': espera, 'id': trabajo['id'], 'intentos': trabajo['intentos']})
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'procesos': self.procesos,
+                'en_curso': self.en_curso,
+                'tomados': self.tomados,
+                'completados': self.completados,
+                'reintentos': self.reintentos,
+                'fallidos': self.fallidos,
+            }
+
+    def cerrar(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+facturas_cli = AppGroup('facturas', help="Lectura de facturas subidas.")
+
+
+@facturas_cli.command('worker')
+def worker_command():
+    """Procesa la cola de facturas en primer plano (Ctrl+C para salir)."""
+    despachador = current_app.extensions['facturas']
+    click.echo(f"Procesando facturas con {despachador.procesos} procesos...")
+    try:
+        despachador.iniciar().join()
+    except KeyboardInterrupt:
+        despachador.cerrar()
+
+
+def _iniciar_en_web():
+    current_app.extensions['facturas'].iniciar()
+
+
+def init_app(app):
+    app.extensions['facturas'] = Despachador(
+        app,
+        procesos=app.config['FACTURAS_PROCESOS'],
+        intentos=app.config['FACTURAS_INTENTOS'],
+        reintento=app.config['FACTURAS_REINTENTO'],
+        plazo=app.config['FACTURAS_PLAZO'],
+        espera=app.config['FACTURAS_ESPERA'],
+        en_web=app.config['FACTURAS_EN_WEB'],
+    )
+    # Solo con FACTURAS_EN_WEB: cada proceso web arranca su despachador y retoma
+    # también los trabajos pendientes de antes de un reinicio
+    if app.config['FACTURAS_EN_WEB']:
+        app.before_request(_iniciar_en_web)
+    app.cli.add_command(facturas_cli)
@@ -0,0 +1,148 @@
+# Hashing de contraseñas fuera del hilo de la petición.
+#
+# scrypt/pbkdf2 son lentos a propósito: hechos en línea, una ráfaga de logins
+# ocupa la CPU del worker y frena todas las demás rutas. Aquí se delegan a un
+# pool de procesos acotado; el hilo de la petición solo espera el resultado y
+# si hay demasiados pendientes se rechaza de inmediato (ServicioSaturado) en
+# lugar de encolar trabajo sin límite.
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturoVencido
+
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+
+class ServicioSaturado(Exception):
+    """Hay demasiados hashes pendientes o el cálculo no terminó a tiempo"""
+
+
+def metodo_canonico(metodo):
+    """Forma completa del método de werkzeug ("scrypt" -> "scrypt:32768:8:1"),
+    la misma que queda guardada al inicio de cada hash"""
+    nombre, *args = metodo.split(':')
+    if nombre == 'scrypt':
+        n, r, p = map(int, args) if args else (32768, 8, 1)
+        return f"scrypt:{n}:{r}:{p}"
+    if nombre == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iteraciones = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iteraciones}"
+    raise ValueError(f"Método de hash no soportado: {metodo!r}")
+
+
+# Funciones del proceso hijo (deben poder importarse por nombre)
+
+def _hashear(contrasena, metodo):
+    return generate_password_hash(contrasena, method=metodo)
+
+
+def _verificar(hash_guardado, contrasena):
+    return check_password_hash(hash_guardado, contrasena)
+
+
+class ServicioHash:
+    """Pool de procesos acotado para generar y verificar hashes.
+
+    ``procesos=0`` calcula en el mismo hilo (desarrollo). Los procesos se crean
+    la primera vez que se usan, después del fork de gunicorn, con el contexto
+    "spawn" para no heredar hilos ni conexiones del worker.
+    """
+
+    def __init__(self, metodo='scrypt', procesos=1, max_pendientes=16, timeout=10.0):
+        self.metodo = metodo_canonico(metodo)
+        self.procesos = procesos
+        self.timeout = timeout
+        self._cupos = threading.BoundedSemaphore(max_pendientes)
+        self.max_pendientes = max_pendientes
+        self._executor = None
+        self._lock = threading.Lock()
+        self.hashes = 0
+        self.verificaciones = 0
+        self.rechazadas = 0
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            return self._executor
+
+    def _ejecutar(self, funcion, *args):
+        if not self.procesos:
+            return funcion(*args)
+        # Casi sin espera: la cola llena significa que la CPU ya está saturada
+        if not self._cupos.acquire(timeout=0.05):
+            with self._lock:
+                self.rechazadas += 1
+            raise ServicioSaturado("Demasiadas contraseñas en cola")
+        try:
+            futuro = self._pool().submit(funcion, *args)
+        except Exception:
+            self._cupos.release()
+            raise
+        futuro.add_done_callback(lambda _: self._cupos.release())
+        try:
+            return futuro.result(self.timeout)
+        except FuturoVencido:
+            futuro.cancel()
+            with self._lock:
+                self.rechazadas += 1
+            raise ServicioSaturado("El hash de la contraseña tardó demasiado") from None
+
+    def hashear(self, contrasena):
+        with self._lock:
+            self.hashes += 1
+        return self._ejecutar(_hashear, contrasena, self.metodo)
+
+    def verificar(self, hash_guardado, contrasena):
+        if not hash_guardado or contrasena is None:
+            return False
+        with self._lock:
+            self.verificaciones += 1
+        return self._ejecutar(_verificar, hash_guardado, contrasena)
+
+    def necesita_rehash(self, hash_guardado):
+        """True si el hash se generó con otros parámetros que los configurados"""
+        return hash_guardado.split('$', 1)[0] != self.metodo
+
+    def stats(self):
+        with self._lock:
+            return {
+                'metodo': self.metodo,
+                'procesos': self.procesos,
+                'max_pendientes': self.max_pendientes,
+                'hashes': self.hashes,
+                'verificaciones': self.verificaciones,
+                'rechazadas': self.rechazadas,
+            }
+
+    def cerrar(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def get_servicio():
+    return current_app.extensions['hashing']
+
+
+def hashear(contrasena):
+    return get_servicio().hashear(contrasena)
+
+
+def verificar(hash_guardado, contrasena):
+    return get_servicio().verificar(hash_guardado, contrasena)
+
+
+def init_app(app):
+    app.extensions['hashing'] = ServicioHash(
+        app.config['HASH_METODO'],
+        procesos=app.config['HASH_PROCESOS'],
+        max_pendientes=app.config['HASH_MAX_PENDIENTES'],
+        timeout=app.config['HASH_TIMEOUT'],
+    )
@@ -0,0 +1,284 @@
+import csv
+import io
+import math
+from datetime import datetime
+
+from psycopg2.extras import execute_values
+
+# Registros como máximo en el mensaje de error devuelto al cliente
+MAX_ERRORES_REPORTADOS = 20
+
+# xmax = 0 solo en filas recién insertadas (no en las actualizadas por el conflicto)
+UPSERT_SQL = """
+    INSERT INTO consumos (usuario_id, mes, consumo, promedio, fecha)
+    VALUES %s
+    ON CONFLICT (usuario_id, mes, anio) DO UPDATE
+       SET consumo = EXCLUDED.consumo,
+           promedio = EXCLUDED.promedio,
+           fecha = EXCLUDED.fecha
+    RETURNING (xmax = 0) AS insertado
+"""
+
+STAGING_SQL = """
+    CREATE TEMP TABLE consumos_importados (
+        linea INTEGER NOT NULL,
+        usuario_id INTEGER,
+        correo VARCHAR(255),
+        mes VARCHAR(50) NOT NULL,
+        consumo NUMERIC NOT NULL,
+        promedio NUMERIC NOT NULL,
+        fecha TIMESTAMP
+    ) ON COMMIT DROP
+"""
+
+# Resuelve los registros que solo traen correo
+RESOLVER_SQL = """
+    UPDATE consumos_importados s SET usuario_id = u.id
+      FROM usuarios u
+     WHERE s.usuario_id IS NULL AND u.correo = s.correo
+"""
+
+HUERFANOS_SQL = """
+    SELECT s.linea FROM consumos_importados s
+     WHERE s.usuario_id IS NULL
+        OR NOT EXISTS (SELECT 1 FROM usuarios u WHERE u.id = s.usuario_id)
+     ORDER BY s.linea
+     LIMIT %s
+"""
+
+# Si un mismo (usuario, mes, año) aparece varias veces gana la última línea;
+# el año es el de la fecha, como la columna anio de consumos
+MERGE_SQL = """
+    INSERT INTO consumos (usuario_id, mes, consumo, promedio, fecha)
+    SELECT DISTINCT ON (usuario_id, mes, EXTRACT(YEAR FROM COALESCE(fecha, NOW())))
+           usuario_id, mes, consumo, promedio, COALESCE(fecha, NOW())
+      FROM consumos_importados
+     ORDER BY usuario_id, mes, EXTRACT(YEAR FROM COALESCE(fecha, NOW())), linea DESC
+    ON CONFLICT (usuario_id, mes, anio) DO UPDATE
+       SET consumo = EXCLUDED.consumo,
+           promedio = EXCLUDED.promedio,
+           fecha = EXCLUDED.fecha
+    RETURNING usuario_id
+"""
+
+
+class IngestaError(Exception):
+    """Datos inválidos: no se guardó nada"""
+
+    def __init__(self, errores):
+        super().__init__("; ".join(errores[:MAX_ERRORES_REPORTADOS]))
+        self.errores = errores
+
+
+def _numero(valor, campo, donde):
+    try:
+        numero = float(str(valor).strip().replace(',', '.'))
+    except (TypeError, ValueError):
+        raise ValueError(f"{donde}: el {campo} '{valor}' no es un número válido")
+    # float() acepta 'nan' e 'inf', que NUMERIC guarda y luego contaminan sumas y percentiles
+    if not math.isfinite(numero):
+        raise ValueError(f"{donde}: el {campo} '{valor}' no es un número válido")
+    if numero < 0:
+        raise ValueError(f"{donde}: el {campo} no puede ser negativo")
+    return numero
+
+
+def parse_formulario(form, meses=3):
+    """Lee los meses del formulario de anexar_factura.
+
+    Devuelve [(mes, consumo, promedio)] o lanza IngestaError con todos los
+    problemas encontrados, para que no se guarde nada a medias.
+    """
+    filas, errores = {}, []
+    for i in range(1, meses + 1):
+        mes = form.get(f'mes_{i}', '').strip()
+        consumo_val = form.get(f'consumo_{i}', '').strip()
+        promedio_val = form.get(f'promedio_{i}', '').strip()
+
+        if not (mes or consumo_val or promedio_val):
+            continue
+        if not (mes and consumo_val and promedio_val):
+            errores.append(f"Mes {i}: completa mes, consumo y promedio")
+            continue
+        try:
+            consumo = _numero(consumo_val, 'consumo', f"Mes {i}")
+            promedio = _numero(promedio_val, 'promedio', f"Mes {i}")
+        except ValueError as e:
+            errores.append(str(e))
+            continue
+        filas[mes] = (mes, consumo, promedio)
+
+    if errores:
+        raise IngestaError(errores)
+    return list(filas.values())
+
+
+def upsert_consumos(cur, usuario_id, filas):
+    """Inserta o actualiza los meses del usuario en un solo INSERT multi-fila.
+
+    ``filas`` son (mes, consumo, promedio) o (mes, consumo, promedio, fecha);
+    sin fecha se usa NOW(), es decir, el mes del año en curso. Devuelve True
+    si todos los meses eran nuevos (ninguno reemplazó a otro).
+    """
+    if not filas:
+        return True
+    resultado = execute_values(
+        cur, UPSERT_SQL,
+        [(usuario_id, *fila[:3], fila[3] if len(fila) > 3 else None) for fila in filas],
+        template="(%s, %s, %s, %s, COALESCE(%s::timestamp, NOW()))",
+        fetch=True,
+    )
+    return all(fila['insertado'] for fila in resultado)
+
+
+# --- Importación masiva ---------------------------------------------------
+
+def registros_csv(stream):
+    """Itera las filas de un CSV con encabezado (columnas como en registros_json)"""
+    texto = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    lector = csv.DictReader(texto)
+    for fila in lector:
+        yield {(k or '').strip().lower(): v for k, v in fila.items()}
+
+
+def registros_json(datos):
+    """Acepta una lista de objetos o {"consumos": [...]}.
+
+    Cada registro trae mes, consumo, promedio y opcionalmente fecha (ISO 8601)
+    y el usuario (usuario_id o correo).
+    """
+    if isinstance(datos, dict):
+        datos = datos.get('consumos')
+    if not isinstance(datos, list):
+        raise IngestaError(["El JSON debe ser una lista de registros o {\"consumos\": [...]}"])
+    for registro in datos:
+        yield {str(k).lower(): v for k, v in registro.items()} if isinstance(registro, dict) else {}
+
+
+def _copy_text(valor):
+    if valor is None or valor == '':
+        return r'\N'
+    texto = str(valor)
+    return (texto.replace('\\', '\\\\').replace('\t', '\\t')
+                 .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+class _CopySource:
+    """Objeto tipo archivo que genera las líneas de COPY bajo demanda.
+
+    psycopg2 convierte cualquier excepción de read() en un error de COPY; aquí
+    se guarda la original en ``error`` y se corta el flujo, para que quien
+    llama la relance con su tipo (IngestaError, csv.Error...) tras copy_expert.
+    """
+
+    def __init__(self, lineas):
+        self._lineas = lineas
+        self._buffer = ''
+        self.error = None
+
+    def read(self, size=-1):
+        while self.error is None and (size < 0 or len(self._buffer) < size):
+            try:
+                self._buffer += next(self._lineas)
+            except StopIteration:
+                break
+            except Exception as e:
+                self.error = e
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+def _registros_numerados(registros):
+    """Numera los registros; un archivo ilegible se informa con el número del registro"""
+    registros = iter(registros)
+    linea = 0
+    while True:
+        linea += 1
+        try:
+            registro = next(registros)
+        except StopIteration:
+            return
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise IngestaError([f"Archivo ilegible cerca del registro {linea}: {e}"])
+        yield linea, registro
+
+
+def _validar(registros, usuario_forzado, errores):
+    """Normaliza los registros y genera líneas COPY; acumula errores sin cortar el flujo"""
+    for linea, registro in _registros_numerados(registros):
+        donde = f"Registro {linea}"
+        try:
+            mes = str(registro.get('mes') or '').strip()
+            if not mes:
+                raise ValueError(f"{donde}: falta el mes")
+            if len(mes) > 50:
+                raise ValueError(f"{donde}: el mes es demasiado largo")
+            consumo = _numero(registro.get('consumo'), 'consumo', donde)
+            promedio = _numero(registro.get('promedio'), 'promedio', donde)
+
+            fecha = registro.get('fecha') or None
+            if fecha is not None:
+                try:
+                    fecha = datetime.fromisoformat(str(fecha).strip()).isoformat()
+                except ValueError:
+                    raise ValueError(f"{donde}: la fecha '{fecha}' no está en formato ISO 8601")
+
+            usuario_id = registro.get('usuario_id') or None
+            correo = (registro.get('correo') or '').strip() or None
+            if usuario_id is not None:
+                try:
+                    usuario_id = int(usuario_id)
+                except (TypeError, ValueError):
+                    raise ValueError(f"{donde}: usuario_id inválido")
+            if usuario_forzado is not None:
+                if (usuario_id is not None and usuario_id != usuario_forzado.id) or \
+                        (correo is not None and correo != usuario_forzado.correo):
+                    raise ValueError(f"{donde}: no puedes importar consumos de otro usuario")
+                usuario_id, correo = usuario_forzado.id, None
+            elif usuario_id is None and correo is None:
+                raise ValueError(f"{donde}: indica usuario_id o correo")
+        except ValueError as e:
+            errores.append(str(e))
+            continue
+
+        yield "\t".join(_copy_text(v) for v in (linea, usuario_id, correo, mes, consumo, promedio, fecha)) + "\n"
+
+
+def importar(conn, registros, usuario_forzado=None):
+    """Carga los registros con COPY a una tabla temporal y hace upsert en consumos.
+
+    Todo o nada: si algún registro es inválido o apunta a un usuario inexistente
+    se hace rollback y se lanza IngestaError. Devuelve (filas, ids_de_usuarios).
+    """
+    errores = []
+    cur = conn.cursor()
+    try:
+        cur.execute(STAGING_SQL)
+        fuente = _CopySource(_validar(registros, usuario_forzado, errores))
+        cur.copy_expert(
+            "COPY consumos_importados (linea, usuario_id, correo, mes, consumo, promedio, fecha) FROM STDIN",
+            fuente,
+        )
+        if fuente.error is not None:
+            raise fuente.error
+        if errores:
+            raise IngestaError(errores)
+
+        cur.execute(RESOLVER_SQL)
+        cur.execute(HUERFANOS_SQL, (MAX_ERRORES_REPORTADOS,))
+        huerfanos = [f"Registro {row['linea']}: el usuario no existe" for row in cur.fetchall()]
+        if huerfanos:
+            raise IngestaError(huerfanos)
+
+        cur.execute(MERGE_SQL)
+        afectados = [row['usuario_id'] for row in cur.fetchall()]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    return len(afectados), set(afectados)
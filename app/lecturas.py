@@ -0,0 +1,324 @@
+# Lecturas de medidores inteligentes (intervalos de 15 minutos).
+#
+# Se guardan en ``lecturas``, particionada por mes, y al importar se actualizan
+# en la misma sentencia los agregados por día y por mes con la diferencia de lo
+# escrito (una lectura repetida o corregida no se cuenta dos veces). Las
+# gráficas eligen la granularidad según el rango pedido: solo los rangos de
+# pocos días leen lecturas crudas.
+#
+#   POST /api/lecturas                             # CSV o NDJSON: medido_en,kwh
+#   flask --app run lecturas particiones --meses 3 # crear particiones por adelantado
+import io
+import itertools
+import json
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from psycopg2 import sql
+
+from app.db import get_conn
+from app.ingesta import _CopySource, _copy_text, _numero
+
+MIN_FECHA = datetime(2000, 1, 1)
+# Límites de las columnas (kwh NUMERIC(12, 4), usuario_id INTEGER): se validan
+# por línea, porque un valor fuera de rango haría fallar todo el lote en COPY
+MAX_KWH = 10 ** 8
+MAX_USUARIO_ID = 2 ** 31 - 1
+
+# Granularidad según el largo del rango: (máximo de días, nombre)
+GRANULARIDADES = ((3, '15min'), (120, 'dia'), (None, 'mes'))
+
+ENTRANTES_SQL = """
+    CREATE TEMP TABLE lecturas_entrantes (
+        linea INTEGER NOT NULL,
+        usuario_id INTEGER NOT NULL,
+        medido_en TIMESTAMP NOT NULL,
+        kwh NUMERIC(12, 4) NOT NULL
+    ) ON COMMIT DROP
+"""
+
+HUERFANAS_SQL = """
+    DELETE FROM lecturas_entrantes e
+     WHERE NOT EXISTS (SELECT 1 FROM usuarios u WHERE u.id = e.usuario_id)
+    RETURNING linea
+"""
+
+# Un importador a la vez por usuario: la diferencia con la lectura anterior se
+# calcula sobre la foto de la sentencia y dos importaciones simultáneas del
+# mismo intervalo la sumarían dos veces
+BLOQUEO_SQL = """
+    SELECT pg_advisory_xact_lock(hashtext('lecturas'), usuario_id)
+      FROM (SELECT DISTINCT usuario_id FROM lecturas_entrantes ORDER BY usuario_id) u
+"""
+
+MESES_SQL = "SELECT DISTINCT date_trunc('month', medido_en)::date AS mes FROM lecturas_entrantes"
+
+# Todos los CTE ven la misma foto: ``anteriores`` tiene los valores previos a
+# la escritura y los agregados suben o bajan solo en la diferencia
+MERGE_SQL = """
+    WITH entrantes AS (
+        SELECT DISTINCT ON (usuario_id, medido_en) usuario_id, medido_en, kwh
+          FROM lecturas_entrantes
+         ORDER BY usuario_id, medido_en, linea DESC
+    ), anteriores AS (
+        SELECT l.usuario_id, l.medido_en, l.kwh
+          FROM lecturas l JOIN entrantes e USING (usuario_id, medido_en)
+    ), escritas AS (
+        INSERT INTO lecturas (usuario_id, medido_en, kwh)
+        SELECT usuario_id, medido_en, kwh FROM entrantes
+        ON CONFLICT (usuario_id, medido_en) DO UPDATE SET kwh = EXCLUDED.kwh
+         WHERE lecturas.kwh IS DISTINCT FROM EXCLUDED.kwh
+        RETURNING usuario_id, medido_en, kwh
+    ), deltas AS (
+        SELECT w.usuario_id, w.medido_en::date AS dia, count(*) AS escritas,
+               sum(w.kwh - COALESCE(a.kwh, 0)) AS kwh,
+               count(*) FILTER (WHERE a.kwh IS NULL) AS nuevas
+          FROM escritas w
+          LEFT JOIN anteriores a USING (usuario_id, medido_en)
+         GROUP BY w.usuario_id, w.medido_en::date
+    ), diarias AS (
+        INSERT INTO lecturas_diarias AS d (usuario_id, dia, kwh, lecturas)
+        SELECT usuario_id, dia, kwh, nuevas FROM deltas
+        ON CONFLICT (usuario_id, dia) DO UPDATE
+           SET kwh = d.kwh + EXCLUDED.kwh, lecturas = d.lecturas + EXCLUDED.lecturas
+    ), mensuales AS (
+        INSERT INTO lecturas_mensuales AS m (usuario_id, mes, kwh, lecturas)
+        SELECT usuario_id, date_trunc('month', dia)::date, sum(kwh), sum(nuevas)
+          FROM deltas
+         GROUP BY usuario_id, date_trunc('month', dia)
+        ON CONFLICT (usuario_id, mes) DO UPDATE
+           SET kwh = m.kwh + EXCLUDED.kwh, lecturas = m.lecturas + EXCLUDED.lecturas, actualizado = NOW()
+    )
+    SELECT usuario_id, sum(escritas)::int AS escritas FROM deltas GROUP BY usuario_id
+"""
+
+SERIE_SQL = {
+    '15min': """
+        SELECT medido_en AS t, kwh FROM lecturas
+         WHERE usuario_id = %(usuario_id)s AND medido_en >= %(desde)s AND medido_en < %(hasta)s
+         ORDER BY medido_en
+    """,
+    'dia': """
+        SELECT dia AS t, kwh FROM lecturas_diarias
+         WHERE usuario_id = %(usuario_id)s AND dia >= %(desde)s::date AND dia < %(hasta)s
+         ORDER BY dia
+    """,
+    'mes': """
+        SELECT mes AS t, kwh FROM lecturas_mensuales
+         WHERE usuario_id = %(usuario_id)s AND mes >= date_trunc('month', %(desde)s)::date AND mes < %(hasta)s
+         ORDER BY mes
+    """,
+}
+
+FORMATOS = {'15min': '%Y-%m-%d %H:%M', 'dia': '%Y-%m-%d', 'mes': '%Y-%m'}
+
+# Particiones que este proceso ya sabe que existen (evita consultar el catálogo en cada lote)
+_particiones = set()
+
+
+# --- Entrada --------------------------------------------------------------------
+
+def registros_ndjson(stream):
+    """Un objeto JSON por línea, leído del socket a medida que llega"""
+    for linea in io.TextIOWrapper(stream, encoding='utf-8'):
+        if not linea.strip():
+            continue
+        try:
+            registro = json.loads(linea)
+        except ValueError:
+            registro = {'_error': "JSON inválido"}
+        yield {str(k).lower(): v for k, v in registro.items()} if isinstance(registro, dict) else {}
+
+
+def _instante(valor, zona, donde):
+    try:
+        instante = datetime.fromisoformat(str(valor or '').strip())
+    except ValueError:
+        raise ValueError(f"{donde}: medido_en '{valor}' no está en formato ISO 8601")
+    # Con zona horaria se pasa a la hora local del servicio
+    if instante.tzinfo is not None:
+        instante = instante.astimezone(zona).replace(tzinfo=None)
+    if not MIN_FECHA <= instante <= datetime.now() + timedelta(days=1):
+        raise ValueError(f"{donde}: medido_en {instante.isoformat()} fuera de rango")
+    return instante
+
+
+def _validar(registros, usuario_forzado, zona, errores):
+    """Líneas COPY de las lecturas válidas; las inválidas se anotan y se saltan"""
+    for linea, registro in enumerate(registros, start=1):
+        donde = f"Lectura {linea}"
+        try:
+            if '_error' in registro:
+                raise ValueError(f"{donde}: {registro['_error']}")
+            medido_en = _instante(registro.get('medido_en'), zona, donde)
+            kwh = _numero(registro.get('kwh'), 'kwh', donde)
+            if round(kwh, 4) >= MAX_KWH:
+                raise ValueError(f"{donde}: el kwh debe ser menor que {MAX_KWH}")
+            if usuario_forzado is not None:
+                if registro.get('usuario_id') not in (None, '', usuario_forzado.id, str(usuario_forzado.id)):
+                    raise ValueError(f"{donde}: no puedes importar lecturas de otro usuario")
+                usuario_id = usuario_forzado.id
+            else:
+                try:
+                    usuario_id = int(registro.get('usuario_id'))
+                except (TypeError, ValueError):
+                    raise ValueError(f"{donde}: usuario_id inválido")
+                if not 0 < usuario_id <= MAX_USUARIO_ID:
+                    raise ValueError(f"{donde}: usuario_id inválido")
+        except ValueError as e:
+            errores.append(str(e))
+            continue
+        yield "\t".join(_copy_text(v) for v in (linea, usuario_id, medido_en.isoformat(), kwh)) + "\n"
+
+
+def _siguiente_mes(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def nombre_particion(mes):
+    return f"lecturas_{mes:%Y_%m}"
+
+
+def asegurar_particiones(cur, meses):
+    """Crea las particiones mensuales que falten; devuelve las que verificó"""
+    verificadas = set()
+    for mes in sorted(set(meses) - _particiones):
+        nombre = nombre_particion(mes)
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL AS existe", (nombre,))
+        if not cur.fetchone()['existe']:
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('lecturas_particiones'))")
+            cur.execute(
+                sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF lecturas FOR VALUES FROM (%s) TO (%s)")
+                .format(sql.Identifier(nombre)),
+                (mes, _siguiente_mes(mes)),
+            )
+        verificadas.add(mes)
+    return verificadas
+
+
+def _importar_lote(conn, lineas):
+    cur = conn.cursor()
+    try:
+        cur.execute(ENTRANTES_SQL)
+        cur.copy_expert("COPY lecturas_entrantes (linea, usuario_id, medido_en, kwh) FROM STDIN",
+                        _CopySource(iter(lineas)))
+        cur.execute(HUERFANAS_SQL)
+        huerfanas = [f"Lectura {fila['linea']}: el usuario no existe" for fila in cur.fetchall()]
+        cur.execute(BLOQUEO_SQL)
+        cur.execute(MESES_SQL)
+        verificadas = asegurar_particiones(cur, [fila['mes'] for fila in cur.fetchall()])
+        cur.execute(MERGE_SQL)
+        escritas = {fila['usuario_id']: fila['escritas'] for fila in cur.fetchall()}
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    # Solo después del commit: una partición creada en un lote revertido no existe
+    _particiones.update(verificadas)
+    return escritas, sorted(huerfanas)
+
+
+def importar(conn, registros, usuario_forzado=None, zona=None, lote=None):
+    """Guarda las lecturas por lotes de ``lote`` líneas, cada uno en su transacción.
+
+    A diferencia de la importación de consumos no es todo o nada: los
+    medidores reenvían, así que se guarda lo válido y se informan las líneas
+    rechazadas. Devuelve (lecturas escritas, {usuario_id: escritas}, errores);
+    una lectura idéntica a la guardada no cuenta como escrita.
+    """
+    zona = zona or ZoneInfo(current_app.config['LECTURAS_ZONA'])
+    lote = lote or current_app.config['LECTURAS_LOTE']
+    errores = []
+    lineas = _validar(registros, usuario_forzado, zona, errores)
+    por_usuario = {}
+    while True:
+        bloque = list(itertools.islice(lineas, lote))
+        if not bloque:
+            break
+        escritas, huerfanas = _importar_lote(conn, bloque)
+        errores.extend(huerfanas)
+        for usuario_id, n in escritas.items():
+            por_usuario[usuario_id] = por_usuario.get(usuario_id, 0) + n
+    return sum(por_usuario.values()), por_usuario, errores
+
+
+# --- Consulta -------------------------------------------------------------------
+
+def granularidad(desde, hasta):
+    if desde is None:
+        return 'mes'
+    dias = (hasta - desde).total_seconds() / 86400
+    for maximo, nombre in GRANULARIDADES:
+        if maximo is None or dias <= maximo:
+            return nombre
+
+
+def serie(conn, usuario_id, desde=None, hasta=None):
+    """Serie de consumo del medidor para [desde, hasta) con la granularidad adecuada.
+
+    Sin ``desde`` devuelve toda la historia mensual.
+    """
+    hasta = hasta or datetime.now()
+    nivel = granularidad(desde, hasta)
+    cur = conn.cursor()
+    cur.execute(SERIE_SQL[nivel], {'usuario_id': usuario_id, 'desde': desde or MIN_FECHA, 'hasta': hasta})
+    filas = cur.fetchall()
+    cur.close()
+    return {
+        'granularidad': nivel,
+        'labels': [fila['t'].strftime(FORMATOS[nivel]) for fila in filas],
+        'kwh': [round(float(fila['kwh']), 3) for fila in filas],
+    }
+
+
+def rango_de_parametros(args, zona=None):
+    """(desde, hasta) a partir de ?desde=...&hasta=... (fechas u horas ISO, en
+    hora local o con zona horaria)"""
+    zona = zona or ZoneInfo(current_app.config['LECTURAS_ZONA'])
+
+    def leer(nombre):
+        valor = args.get(nombre)
+        if not valor:
+            return None
+        instante = datetime.fromisoformat(valor)
+        if instante.tzinfo is not None:
+            instante = instante.astimezone(zona).replace(tzinfo=None)
+        return instante
+
+    hasta = leer('hasta') or datetime.now()
+    desde = leer('desde')
+    if desde is not None and desde >= hasta:
+        raise ValueError("desde debe ser anterior a hasta")
+    return desde, hasta
+
+
+# --- CLI --------------------------------------------------------------------------
+
+lecturas_cli = AppGroup('lecturas', help="Lecturas de medidores inteligentes.")
+
+
+@lecturas_cli.command('particiones')
+@click.option('--meses', type=int, default=3, help="Meses hacia adelante, contando el actual.")
+def particiones_command(meses):
+    """Crea por adelantado las particiones mensuales de lecturas."""
+    conn = get_conn()
+    cur = conn.cursor()
+    mes = date.today().replace(day=1)
+    lista = []
+    for _ in range(meses):
+        lista.append(mes)
+        mes = _siguiente_mes(mes)
+    verificadas = asegurar_particiones(cur, lista)
+    conn.commit()
+    cur.close()
+    _particiones.update(verificadas)
+    click.echo(f"Particiones listas: {', '.join(nombre_particion(m) for m in lista)}")
+
+
+def init_app(app):
+    app.cli.add_command(lecturas_cli)
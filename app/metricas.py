@@ -0,0 +1,240 @@
+import re
+import threading
+import time
+from functools import wraps
+
+from flask import Response, current_app, g, has_app_context, request
+from flask import before_render_template, template_rendered
+from psycopg2.extras import RealDictCursor
+
+# Límites de los buckets en segundos (estilo Prometheus)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NOMBRE_SQL = re.compile(
+    r'^\s*(?:\(\s*)?(?P<op>select|insert|update|delete|with|create|copy|listen|notify)\b'
+    r'(?:\s+(?P<copia>[a-z_][a-z0-9_]*)(?=\s*(?:\([^)]*\)\s*)?from\b)'
+    r'|.*?\b(?:from|into|update|table)\s+(?P<tabla>[a-z_][a-z0-9_]*))?',
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def nombre_consulta(sql):
+    """Etiqueta corta y de baja cardinalidad para una sentencia: "select consumos" """
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    m = _NOMBRE_SQL.match(str(sql))
+    if not m:
+        return 'otra'
+    op = m.group('op').lower()
+    tabla = m.group('copia') or m.group('tabla')
+    return f"{op} {tabla.lower()}" if tabla else op
+
+
+class Histograma:
+    def __init__(self, nombre, ayuda, etiquetas, buckets=BUCKETS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.buckets = buckets
+        self._series = {}   # valores de etiquetas -> [conteos por bucket..., suma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *etiquetas):
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [0] * len(self.buckets) + [0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[i] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for valores, serie in sorted(series.items()):
+            base = ','.join(f'{e}="{_escapar(v)}"' for e, v in zip(self.etiquetas, valores))
+            sep = ',' if base else ''
+            for limite, conteo in zip(self.buckets, serie):
+                lineas.append(f'{self.nombre}_bucket{{{base}{sep}le="{limite}"}} {conteo}')
+            lineas.append(f'{self.nombre}_bucket{{{base}{sep}le="+Inf"}} {serie[-1]}')
+            lineas.append(f'{self.nombre}_sum{{{base}}} {serie[-2]:.6f}')
+            lineas.append(f'{self.nombre}_count{{{base}}} {serie[-1]}')
+        return lineas
+
+
+class Contador:
+    def __init__(self, nombre, ayuda, etiquetas):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def sumar(self, cantidad, *etiquetas):
+        with self._lock:
+            self._valores[etiquetas] = self._valores.get(etiquetas, 0) + cantidad
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            valores = dict(self._valores)
+        for etiquetas, valor in sorted(valores.items()):
+            base = ','.join(f'{e}="{_escapar(v)}"' for e, v in zip(self.etiquetas, etiquetas))
+            lineas.append(f'{self.nombre}{{{base}}} {valor}')
+        return lineas
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+PETICIONES = Histograma('enertech_request_seconds', 'Latencia de las peticiones por endpoint',
+                        ('endpoint', 'metodo', 'estado'))
+CONSULTAS = Histograma('enertech_sql_seconds', 'Tiempo de las sentencias SQL', ('consulta',))
+FILAS = Contador('enertech_sql_rows_total', 'Filas devueltas o afectadas por las sentencias SQL', ('consulta',))
+PLANTILLAS = Histograma('enertech_template_seconds', 'Tiempo de render de las plantillas', ('plantilla',))
+
+
+def _registrar_consulta(sql, duracion, filas):
+    nombre = nombre_consulta(sql)
+    CONSULTAS.observar(duracion, nombre)
+    if filas and filas > 0:
+        FILAS.sumar(filas, nombre)
+    if has_app_context():
+        detalle = g.get('consultas')
+        if detalle is not None:
+            detalle.append((nombre, duracion, filas))
+
+
+class CursorInstrumentado(RealDictCursor):
+    """RealDictCursor que mide el tiempo y las filas de cada sentencia"""
+
+    def execute(self, query, vars=None):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _registrar_consulta(query, time.perf_counter() - inicio, self.rowcount)
+
+    def executemany(self, query, vars_list):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _registrar_consulta(query, time.perf_counter() - inicio, self.rowcount)
+
+    def copy_expert(self, sql, file, size=8192):
+        inicio = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            _registrar_consulta(sql, time.perf_counter() - inicio, self.rowcount)
+
+
+# --- Ganchos de Flask ------------------------------------------------------
+
+def _inicio_peticion():
+    g.inicio_peticion = time.perf_counter()
+    g.consultas = []
+    g.plantillas = []
+
+
+def _fin_peticion(respuesta):
+    inicio = g.pop('inicio_peticion', None)
+    if inicio is None:
+        return respuesta
+    duracion = time.perf_counter() - inicio
+    endpoint = request.endpoint or 'sin_ruta'
+    PETICIONES.observar(duracion, endpoint, request.method, str(respuesta.status_code))
+
+    umbral = current_app.config.get('SLOW_REQUEST_MS')
+    if umbral and duracion * 1000 >= umbral:
+        _log_lenta(endpoint, duracion, g.get('consultas', []), g.get('plantillas', []))
+    return respuesta
+
+
+def _log_lenta(endpoint, duracion, consultas, plantillas):
+    total_sql = sum(d for _, d, _ in consultas)
+    partes = [f"{request.method} {request.path} ({endpoint}) {duracion * 1000:.1f} ms;"
+              f" {len(consultas)} consultas = {total_sql * 1000:.1f} ms"]
+    for nombre, d, filas in consultas:
+        partes.append(f"  sql  {d * 1000:8.1f} ms  {filas if filas is not None else '-':>6} filas  {nombre}")
+    for nombre, d in plantillas:
+        partes.append(f"  tpl  {d * 1000:8.1f} ms  {nombre}")
+    current_app.logger.warning("Petición lenta: %s", "\n".join(partes))
+
+
+def _antes_de_plantilla(sender, template, context, **extra):
+    if has_app_context():
+        g.setdefault('inicio_plantillas', []).append(time.perf_counter())
+
+
+def _plantilla_renderizada(sender, template, context, **extra):
+    if not has_app_context():
+        return
+    pila = g.get('inicio_plantillas')
+    if not pila:
+        return
+    duracion = time.perf_counter() - pila.pop()
+    nombre = template.name or 'desconocida'
+    PLANTILLAS.observar(duracion, nombre)
+    detalle = g.get('plantillas')
+    if detalle is not None:
+        detalle.append((nombre, duracion))
+
+
+# --- Exposición ------------------------------------------------------------
+
+def _gauges(nombre, ayuda, valores, etiqueta=None):
+    lineas = [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} gauge"]
+    for clave, valor in valores.items():
+        if isinstance(valor, bool):
+            valor = int(valor)
+        if isinstance(valor, (int, float)):
+            lineas.append(f'{nombre}{{{etiqueta or "campo"}="{clave}"}} {valor}')
+    return lineas
+
+
+def exponer():
+    lineas = []
+    for metrica in (PETICIONES, CONSULTAS, FILAS, PLANTILLAS):
+        lineas.extend(metrica.exponer())
+
+    ext = current_app.extensions
+    lineas.extend(_gauges('enertech_db_pool', 'Estado y contadores del pool de conexiones', ext['db_pool'].stats()))
+    lineas.extend(_gauges('enertech_resumen_cache', 'Aciertos y fallos de la caché de resúmenes',
+                          ext['resumen_cache'].stats()))
+    lineas.extend(_gauges('enertech_eventos', 'Clientes SSE y eventos publicados', ext['eventos'].stats()))
+    lineas.extend(_gauges('enertech_tareas', 'Tareas en segundo plano', ext['tareas'].stats()))
+    lineas.extend(_gauges('enertech_hashing', 'Hashes y verificaciones de contraseñas', ext['hashing'].stats()))
+    lineas.extend(_gauges('enertech_facturas', 'Trabajos de lectura de facturas', ext['facturas'].stats()))
+    lineas.extend(_gauges('enertech_salud', 'Comprobaciones de la base de /salud/lista', ext['salud'].stats()))
+    lineas.extend(_gauges('enertech_moderacion', 'Mensajes revisados por el moderador', ext['moderacion'].stats()))
+    return "\n".join(lineas) + "\n"
+
+
+def requiere_token(view):
+    """Con METRICS_TOKEN configurado exige ``Authorization: Bearer <token>``"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        token = current_app.config.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f"Bearer {token}":
+            return Response("No autorizado\n", status=401, mimetype='text/plain')
+        return view(*args, **kwargs)
+    return wrapped
+
+
+@requiere_token
+def vista_metricas():
+    return Response(exponer(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    app.before_request(_inicio_peticion)
+    app.after_request(_fin_peticion)
+    before_render_template.connect(_antes_de_plantilla, app)
+    template_rendered.connect(_plantilla_renderizada, app)
+    app.add_url_rule('/metrics', 'metrics', vista_metricas)
@@ -0,0 +1,262 @@
+# Moderación de los mensajes de la comunidad.
+#
+# publicar_mensaje guarda el mensaje como 'pendiente' y solo encola una
+# revisión: la petición no espera a las reglas. Un hilo por proceso toma los
+# pendientes con FOR UPDATE SKIP LOCKED (varios workers no revisan el mismo
+# mensaje), les aplica la lista de términos y las reglas locales y los deja
+# 'aprobado', 'marcado' (visible, para revisar a mano) u 'oculto'. Los que
+# quedan visibles se anuncian por NOTIFY (solo el id) a los clientes SSE en la
+# misma transacción y reciben el siguiente número de la secuencia de
+# publicación, por la que pagina el sondeo del feed. Cada fila va en su propio
+# SAVEPOINT: si una falla se deja oculta con el error como motivo, sin tumbar
+# el lote ni volver a la cola.
+#
+#   flask --app run comunidad moderar           # revisa los pendientes (p. ej. tras un reinicio)
+#   flask --app run comunidad moderar --todos   # vuelve a revisar toda la historia
+import re
+import threading
+import unicodedata
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app.comunidad import _COLUMNAS
+from app.db import get_conn
+from app.eventos import notificar
+from app.tareas import ColaTareas
+
+APROBADO, MARCADO, OCULTO = 'aprobado', 'marcado', 'oculto'
+LOTE = 100
+
+# Términos por defecto; MODERACION_LISTA agrega los de un archivo con líneas
+# "ocultar: termino" o "marcar: termino" (sin acción se marca)
+LISTA_POR_DEFECTO = {
+    OCULTO: ('hijueputa', 'hijo de puta', 'malparido', 'gonorrea', 'marica', 'puta', 'mierda',
+             'pendejo', 'culero', 'cabron', 'te voy a matar'),
+    MARCADO: ('idiota', 'estupido', 'imbecil', 'tonto', 'maldito', 'basura', 'casino', 'apuestas',
+              'viagra', 'criptomonedas', 'gana dinero', 'dinero facil', 'prestamo inmediato'),
+}
+
+ENLACE = re.compile(r'(?:https?://|www\.)\S+|\b[\w-]+\.(?:com|net|org|co|info|biz|xyz|ru|ly)\b', re.I)
+CORREO = re.compile(r'[\w.+-]+@[\w-]+\.[\w.]+')
+TELEFONO = re.compile(r'(?<!\d)\+?\d(?:[\s.-]?\d){9,12}(?!\d)')
+REPETIDO = re.compile(r'(.)\1{5,}|\b(\w+)(?:\W+\2\b){4,}', re.I)
+MAX_ENLACES = 2
+MIN_LETRAS_GRITO = 20
+
+# Sustituciones típicas para esquivar la lista (p3nd3j0, $tupido)
+_LEET = str.maketrans({'0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '@': 'a', '$': 's'})
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes, sin leet y sin letras repetidas ("tooonto" -> "tonto")"""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).translate(_LEET)
+    texto = re.sub(r'(\w)\1+', r'\1', texto)
+    return ' '.join(re.findall(r'\w+', texto))
+
+
+def cargar_lista(ruta=None):
+    """Devuelve {accion: [términos normalizados]} con los de por defecto y los del archivo"""
+    lista = {accion: [normalizar(t) for t in terminos] for accion, terminos in LISTA_POR_DEFECTO.items()}
+    if not ruta:
+        return lista
+    acciones = {'ocultar': OCULTO, 'marcar': MARCADO}
+    with open(ruta, encoding='utf-8') as f:
+        for linea in f:
+            linea = linea.split('#', 1)[0].strip()
+            if not linea:
+                continue
+            accion, _, termino = linea.rpartition(':')
+            accion = acciones.get(accion.strip().lower(), MARCADO)
+            termino = normalizar(termino)
+            if termino:
+                lista[accion].append(termino)
+    return lista
+
+
+class Reglas:
+    """Lista de términos (una expresión por acción) más reglas de spam y datos personales"""
+
+    def __init__(self, lista):
+        self._patrones = {
+            accion: re.compile(r'\b(?:' + '|'.join(map(re.escape, sorted(set(terminos), key=len, reverse=True)))
+                               + r')\b')
+            for accion, terminos in lista.items() if terminos
+        }
+
+    def evaluar(self, texto):
+        """Devuelve (estado, motivos) para un mensaje"""
+        ocultar, marcar = [], []
+        normal = normalizar(texto)
+        for accion, patron in self._patrones.items():
+            encontrados = sorted(set(patron.findall(normal)))
+            if encontrados:
+                (ocultar if accion == OCULTO else marcar).append(f"lista: {', '.join(encontrados)}")
+
+        enlaces = len(ENLACE.findall(texto))
+        if enlaces > MAX_ENLACES:
+            ocultar.append(f"spam: {enlaces} enlaces")
+        elif enlaces:
+            marcar.append("enlace")
+        if CORREO.search(texto) or TELEFONO.search(texto):
+            marcar.append("datos de contacto")
+        letras = [c for c in texto if c.isalpha()]
+        if len(letras) >= MIN_LETRAS_GRITO and sum(c.isupper() for c in letras) > 0.7 * len(letras):
+            marcar.append("mayúsculas")
+        if REPETIDO.search(texto):
+            marcar.append("texto repetido")
+
+        if ocultar:
+            return OCULTO, ocultar + marcar
+        if marcar:
+            return MARCADO, marcar
+        return APROBADO, []
+
+
+TOMAR_SQL = f"""
+    SELECT {_COLUMNAS} FROM mensajes_comunidad
+     WHERE moderacion = 'pendiente'
+     ORDER BY id
+     LIMIT %s
+     FOR UPDATE SKIP LOCKED
+"""
+
+# Un mensaje que ya fue visible conserva su número al volver a revisarse
+ACTUALIZAR_SQL = """
+    UPDATE mensajes_comunidad
+       SET moderacion = %(estado)s, motivo_moderacion = %(motivo)s,
+           secuencia = CASE WHEN %(estado)s IN ('aprobado', 'marcado')
+                            THEN coalesce(secuencia, nextval('mensajes_comunidad_secuencia_seq'))
+                            ELSE secuencia END
+     WHERE id = %(id)s
+"""
+
+CONTEOS_SQL = """
+    SELECT moderacion, count(*) AS total FROM mensajes_comunidad
+     WHERE moderacion <> 'aprobado'
+     GROUP BY moderacion
+"""
+
+
+class Moderador:
+    """Revisa los mensajes pendientes en un hilo de fondo (ColaTareas propia,
+    para no esperar detrás de los PDF o los agregados)"""
+
+    def __init__(self, app, lista=None, lote=LOTE):
+        self.reglas = Reglas(cargar_lista(lista))
+        self.lote = lote
+        self.cola = ColaTareas(app, nombre='moderacion')
+        self._lock = threading.Lock()
+        self.revisados = 0
+        self.aprobados = 0
+        self.marcados = 0
+        self.ocultos = 0
+        self.errores = 0
+
+    def programar(self):
+        """Encola una pasada; varias publicaciones seguidas se fusionan en una"""
+        self.cola.encolar('pendientes', self.moderar_pendientes)
+
+    def _moderar_fila(self, cur, fila, anunciar):
+        estado, motivos = self.reglas.evaluar(fila['mensaje'])
+        cur.execute(ACTUALIZAR_SQL, {'estado': estado, 'motivo': '; '.join(motivos) or None, 'id': fila['id']})
+        if anunciar and estado != OCULTO:
+            notificar(cur, {'id': fila['id']})
+        return estado
+
+    def moderar_lote(self, conn, anunciar=True):
+        """Revisa hasta ``lote`` pendientes en una transacción; devuelve cuántos"""
+        cur = conn.cursor()
+        cur.execute(TOMAR_SQL, (self.lote,))
+        filas = cur.fetchall()
+        if filas:
+            # Los números se reparten en el orden de los commits: un cliente que
+            # ya vio el N no puede encontrarse después con un N-1 recién confirmado
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('mensajes_comunidad_secuencia'))")
+        estados = []
+        for fila in filas:
+            cur.execute("SAVEPOINT moderar_fila")
+            try:
+                estados.append(self._moderar_fila(cur, fila, anunciar))
+                cur.execute("RELEASE SAVEPOINT moderar_fila")
+            except Exception as e:
+                # Sin esto la fila volvería a tomarse primero en cada pasada
+                print(f"Error al moderar el mensaje {fila['id']}: {e}")
+                cur.execute("ROLLBACK TO SAVEPOINT moderar_fila")
+                cur.execute(ACTUALIZAR_SQL, {'estado': OCULTO, 'motivo': f"error al moderar: {e}"[:500],
+                                             'id': fila['id']})
+                estados.append(None)
+        conn.commit()
+        cur.close()
+
+        with self._lock:
+            self.revisados += len(estados)
+            for estado in estados:
+                if estado == APROBADO:
+                    self.aprobados += 1
+                elif estado == MARCADO:
+                    self.marcados += 1
+                elif estado == OCULTO:
+                    self.ocultos += 1
+                else:
+                    self.errores += 1
+        return len(estados)
+
+    def moderar_pendientes(self, anunciar=True):
+        conn = get_conn()
+        total = 0
+        while True:
+            revisados = self.moderar_lote(conn, anunciar)
+            total += revisados
+            if revisados < self.lote:
+                return total
+
+    def stats(self):
+        cola = self.cola.stats()
+        with self._lock:
+            return {
+                'revisados': self.revisados,
+                'aprobados': self.aprobados,
+                'marcados': self.marcados,
+                'ocultos': self.ocultos,
+                'errores': self.errores,
+                'pasadas_pendientes': cola['pendientes'],
+                'pasadas_fallidas': cola['fallidas'],
+            }
+
+
+def conteos(conn):
+    """Mensajes por estado en la base (índice parcial: no recorre los aprobados)"""
+    cur = conn.cursor()
+    cur.execute(CONTEOS_SQL)
+    totales = {fila['moderacion']: fila['total'] for fila in cur.fetchall()}
+    cur.close()
+    return {estado: totales.get(estado, 0) for estado in ('pendiente', MARCADO, OCULTO)}
+
+
+comunidad_cli = AppGroup('comunidad', help="Moderación de la comunidad.")
+
+
+@comunidad_cli.command('moderar')
+@click.option('--todos', is_flag=True,
+              help="Vuelve a revisar también los mensajes ya moderados (no se ven mientras tanto).")
+def moderar_command(todos):
+    """Revisa los mensajes pendientes con las reglas actuales."""
+    conn = get_conn()
+    if todos:
+        cur = conn.cursor()
+        cur.execute("UPDATE mensajes_comunidad SET moderacion = 'pendiente' WHERE moderacion <> 'pendiente'")
+        conn.commit()
+        cur.close()
+    moderador = current_app.extensions['moderacion']
+    # Una revisión de la historia no se anuncia: no son mensajes nuevos
+    revisados = moderador.moderar_pendientes(anunciar=not todos)
+    stats = moderador.stats()
+    click.echo(f"Revisados: {revisados} (marcados {stats['marcados']}, ocultos {stats['ocultos']})")
+
+
+def init_app(app):
+    app.extensions['moderacion'] = Moderador(app, lista=app.config.get('MODERACION_LISTA'))
+    app.cli.add_command(comunidad_cli)
@@ -0,0 +1,264 @@
+import hashlib
+
+from flask import current_app
+
+from app import analitica
+from app.benchmarks import MAX_PERSONAS
+
+# Tarifa usada si el estrato del usuario no está en la tabla tarifas
+TARIFA_POR_DEFECTO = 868.0
+
+# Una sola consulta con toda la historia del usuario (en orden cronológico) y la
+# tarifa de su estrato. Los 7 primeros registros alimentan el gráfico, el último
+# el reporte y la historia completa la analítica. Un usuario sin consumos
+# devuelve una fila con las columnas de consumos en NULL.
+RESUMEN_SQL = """
+    SELECT c.mes, c.consumo, c.promedio, c.fecha, u.estrato, u.num_personas, t.valor_kwh
+      FROM usuarios u
+      LEFT JOIN consumos c ON c.usuario_id = u.id
+      LEFT JOIN tarifas t ON t.estrato = u.estrato
+     WHERE u.id = %(usuario_id)s
+     ORDER BY c.fecha ASC, c.id ASC
+"""
+
+# Huella barata de todo lo que muestran /grafico y /reportes: si no cambia, el
+# navegador puede reutilizar su copia (304). count y las sumas detectan
+# cambios que no mueven max(fecha), como importar meses con fechas antiguas.
+VERSION_SQL = """
+    SELECT count(c.id) AS registros, max(c.fecha) AS ultima,
+           sum(c.consumo) AS total, sum(c.promedio) AS total_promedio,
+           max(t.actualizado) AS tarifa, max(b.actualizado) AS benchmark,
+           (SELECT max(actualizado) FROM lecturas_mensuales WHERE usuario_id = %(usuario_id)s) AS medidor
+      FROM usuarios u
+      LEFT JOIN consumos c ON c.usuario_id = u.id
+      LEFT JOIN tarifas t ON t.estrato = u.estrato
+      LEFT JOIN benchmarks_consumo b
+        ON b.estrato = u.estrato AND b.num_personas = LEAST(u.num_personas, %(max_personas)s)
+     WHERE u.id = %(usuario_id)s
+"""
+
+REPORTE_VACIO = {
+    'consumo_actual': 0,
+    'promedio_actual': 0,
+    'mes_actual': "N/A",
+    'diferencia': 0,
+    'porcentaje': 0,
+    'nivel': "Sin datos",
+    'nivel_color': "amarillo",
+    'posicion_indicator': 50,
+    'costo_adicional': 0,
+    'reporte_texto': "Aún no has registrado consumos. Por favor, anexa una factura para ver tus reportes.",
+}
+
+
+def color_barra(consumo, promedio):
+    """Color de la barra del gráfico según la relación con el promedio"""
+    if consumo < promedio:
+        return '#22c55e'   # verde
+    elif consumo <= promedio + 1:
+        return '#eab308'   # amarillo
+    return '#ef4444'       # rojo
+
+
+def datos_grafico(filas):
+    # Convertir datos a tipos compatibles con JSON/JS
+    labels = [str(d['mes']) for d in filas]
+    consumos = [float(d['consumo']) for d in filas]
+    promedios = [float(d['promedio']) for d in filas]
+    colores = [color_barra(c, p) for c, p in zip(consumos, promedios)]
+    return {'labels': labels, 'consumos': consumos, 'promedios': promedios, 'colores': colores}
+
+
+def nivel_consumo(consumo, promedio):
+    """(nivel, color, posición del indicador) de un mes frente a su promedio"""
+    if consumo < promedio:
+        return "Bajo (Verde)", "verde", 16.7        # centro de la franja verde
+    elif consumo <= promedio + (promedio * 0.1):
+        return "Moderado (Amarillo)", "amarillo", 50  # centro de la franja amarilla
+    return "Alto (Rojo)", "rojo", 83.3               # centro de la franja roja
+
+
+def datos_reporte(ultimo_consumo, tarifa=TARIFA_POR_DEFECTO):
+    if not ultimo_consumo:
+        return dict(REPORTE_VACIO)
+
+    consumo_actual = float(ultimo_consumo['consumo'])
+    promedio_actual = float(ultimo_consumo['promedio'])
+    mes_actual = str(ultimo_consumo['mes'])
+
+    # Calcular diferencia y porcentaje
+    diferencia = consumo_actual - promedio_actual
+    porcentaje = (consumo_actual / promedio_actual) * 100 if promedio_actual > 0 else 0
+
+    # Determinar nivel de consumo
+    nivel, nivel_color, posicion_indicator = nivel_consumo(consumo_actual, promedio_actual)
+
+    # Calcular costo aproximado con la tarifa por kWh del estrato del usuario
+    costo_adicional = float(abs(diferencia) * tarifa)
+
+    # Generar reporte dinámico
+    if nivel_color == "verde":
+        reporte_texto = f"En {mes_actual}, tu nivel de consumo se ubicó en la zona verde, lo que indica un consumo eficiente y por debajo de tu promedio histórico. ¡Excelente trabajo!"
+    elif nivel_color == "amarillo":
+        reporte_texto = f"En {mes_actual}, tu nivel de consumo se ubicó en la zona amarilla, lo que indica un comportamiento moderado y estable respecto a tus registros anteriores."
+    else:
+        reporte_texto = f"En {mes_actual}, tu nivel de consumo se ubicó en la zona roja, lo que indica un consumo elevado respecto a tu promedio histórico. Te recomendamos revisar tus hábitos energéticos."
+
+    return {
+        'consumo_actual': consumo_actual,
+        'promedio_actual': promedio_actual,
+        'mes_actual': mes_actual,
+        'diferencia': diferencia,
+        'porcentaje': porcentaje,
+        'nivel': nivel,
+        'nivel_color': nivel_color,
+        'posicion_indicator': posicion_indicator,
+        'costo_adicional': costo_adicional,
+        'reporte_texto': reporte_texto,
+    }
+
+
+def resumen_desde_filas(filas):
+    tarifa = float(filas[0]['valor_kwh']) if filas and filas[0]['valor_kwh'] is not None else TARIFA_POR_DEFECTO
+    estrato = filas[0]['estrato'] if filas else None
+    num_personas = filas[0]['num_personas'] if filas else None
+    historia = [f for f in filas if f['consumo'] is not None]
+    return {
+        'grafico': datos_grafico(historia[:7]),
+        'reporte': datos_reporte(historia[-1] if historia else None, tarifa),
+        'analitica': analitica.analizar(historia),
+        'tarifa': tarifa,
+        'estrato': estrato,
+        'num_personas': num_personas,
+    }
+
+
+def aplicar_facturas_nuevas(resumen, nuevas):
+    """Actualiza un resumen en caché con meses recién agregados, sin consultar.
+
+    ``nuevas`` son tuplas (mes, consumo, promedio) en el orden en que se
+    guardaron. Solo es válido si todas fueron inserciones (no reemplazos de un
+    mes existente); en ese caso la analítica avanza por el camino incremental.
+    """
+    grafico = {k: list(v) for k, v in resumen['grafico'].items()}
+    datos = dict(resumen['analitica'])
+    estado = datos['estado']
+    media_movil = list(datos['media_movil'])
+    anomalias = list(datos['anomalias'])
+
+    for mes, consumo, promedio in nuevas:
+        if len(grafico['labels']) < 7:
+            grafico['labels'].append(str(mes))
+            grafico['consumos'].append(float(consumo))
+            grafico['promedios'].append(float(promedio))
+            grafico['colores'].append(color_barra(float(consumo), float(promedio)))
+
+        estado = analitica.actualizar_estado(estado, float(consumo), analitica.numero_mes(mes))
+        ventana = estado['ventana']
+        media_movil.append(round(sum(ventana) / len(ventana), 2)
+                           if len(ventana) == estado['tam_ventana'] else None)
+        if abs(estado['z_ultimo']) > analitica.UMBRAL_Z:
+            anomalias.append(estado['n'] - 1)
+
+    mes, consumo, promedio = nuevas[-1]
+    return dict(
+        resumen,
+        grafico=grafico,
+        reporte=datos_reporte({'mes': mes, 'consumo': consumo, 'promedio': promedio}, resumen['tarifa']),
+        analitica={'estado': estado, 'metricas': analitica.metricas(estado),
+                   'media_movil': media_movil, 'anomalias': anomalias},
+    )
+
+
+def calcular_resumen(conn, usuario_id):
+    cur = conn.cursor()
+    cur.execute(RESUMEN_SQL, {'usuario_id': usuario_id})
+    filas = cur.fetchall()
+    cur.close()
+    return resumen_desde_filas(filas)
+
+
+def version_datos(conn, usuario_id):
+    """(etag, última modificación) de los datos del usuario, o None si no existe"""
+    cur = conn.cursor()
+    cur.execute(VERSION_SQL, {'usuario_id': usuario_id, 'max_personas': MAX_PERSONAS})
+    fila = cur.fetchone()
+    cur.close()
+    if fila is None:
+        return None
+    huella = '|'.join(str(fila[k]) for k in ('registros', 'ultima', 'total', 'total_promedio', 'tarifa', 'benchmark',
+                                              'medidor'))
+    etag = hashlib.sha1(f"{usuario_id}|{huella}".encode()).hexdigest()[:20]
+    fechas = [f for f in (fila['ultima'], fila['tarifa'], fila['benchmark'], fila['medidor']) if f is not None]
+    return etag, max(fechas) if fechas else None
+
+
+def version_actual(conn, usuario_id):
+    datos = version_datos(conn, usuario_id)
+    return datos[0] if datos else None
+
+
+def _vigente(entrada, version):
+    """El resumen de la entrada si se calculó con ``version`` de los datos"""
+    if isinstance(entrada, dict) and version is not None and entrada.get('version') == version:
+        return entrada['resumen']
+    return None
+
+
+def obtener_resumen(conn, usuario_id, version=None):
+    """Resumen del usuario para /grafico y /reportes, leído de la caché si existe.
+
+    Cada entrada guarda la versión de los datos (version_datos) con la que se
+    calculó. Si ya no coincide, alguien escribió desde otro worker, la cola de
+    facturas o una importación, y se recalcula: no hace falta que la
+    invalidación llegue a todos los procesos.
+    """
+    if version is None:
+        version = version_actual(conn, usuario_id)
+    cache = current_app.extensions['resumen_cache']
+    resumen = _vigente(cache.get(usuario_id), version)
+    if resumen is None:
+        resumen = calcular_resumen(conn, usuario_id)
+        cache.set(usuario_id, {'version': version, 'resumen': resumen})
+    return resumen
+
+
+def invalidar_resumen(usuario_id):
+    """Libera la entrada de este proceso; los demás la descartan por versión"""
+    current_app.extensions['resumen_cache'].delete(usuario_id)
+
+
+def iniciar_escritura(conn):
+    """Abre una transacción REPEATABLE READ para una escritura con write-through.
+
+    Así version_actual ve la misma foto antes y después de escribir (más las
+    escrituras propias): la versión nueva corresponde exactamente al resumen
+    avanzado con esos meses, aunque otro proceso escriba a la vez.
+    """
+    conn.commit()
+    cur = conn.cursor()
+    cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+    cur.close()
+
+
+def actualizar_resumen(conn, usuario_id, nuevas, solo_inserciones, version_previa):
+    """Write-through dentro de la transacción que guardó ``nuevas``.
+
+    Si la caché tenía el resumen de ``version_previa`` (la versión leída antes
+    de escribir) lo avanza y lo guarda con la versión nueva; si no, lo invalida
+    para recalcularlo en la próxima visita. Si la transacción no llega a
+    confirmarse, esa versión nunca existe en la base y la entrada se descarta.
+    """
+    cache = current_app.extensions['resumen_cache']
+    resumen = None
+    if solo_inserciones and nuevas:
+        resumen = _vigente(cache.get(usuario_id), version_previa)
+    if resumen is None:
+        cache.delete(usuario_id)
+        return
+    try:
+        cache.set(usuario_id, {'version': version_actual(conn, usuario_id),
+                               'resumen': aplicar_facturas_nuevas(resumen, nuevas)})
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"No se pudo actualizar el resumen en caché: {e}")
+        cache.delete(usuario_id)
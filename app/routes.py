@@ -1,53 +1,36 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
-from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
-import random
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from flask import (Blueprint, Response, render_template, request, redirect, url_for, flash, session, current_app,
+                   jsonify, g, send_file, stream_with_context)
 import os
-import pytz
+import random
+from datetime import datetime, timedelta
+from app.db import get_conn, get_pool
+from app.auth import login_required, start_session, end_session, login_bloqueado, registrar_intento, programar_rehash
+from app.hashing import ServicioSaturado, hashear, verificar
+from app.resumen import (obtener_resumen, actualizar_resumen, iniciar_escritura, version_actual, version_datos,
+                         REPORTE_VACIO)
+from app.ingesta import IngestaError, parse_formulario, upsert_consumos
+from app.comunidad import TIPS_DEL_MES, listar_mensajes, publicar_mensaje, validar_texto
+from app.cache_http import condicional, pagina_publica
+from app.benchmarks import comparar, programar_refresco
+from app.facturas import FacturaInvalida, recibir_factura
+from app.lecturas import serie as serie_medidor
+from app.metricas import requiere_token
+from app.moderacion import conteos as conteos_moderacion
+from app import exportar
+from werkzeug.exceptions import RequestEntityTooLarge
 
 main = Blueprint('main', __name__)
 
-def get_conn():
-    database_url = os.environ.get('DATABASE_URL')
-    if not database_url:
-        raise ValueError("No se encontró DATABASE_URL en la configuración")
-    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
-
-def init_mensajes_table():
-    """Crea la tabla de mensajes de la comunidad si no existe"""
-    try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS mensajes_comunidad (
-                id SERIAL PRIMARY KEY,
-                usuario_id INTEGER REFERENCES usuarios(id),
-                nombre_usuario VARCHAR(255) NOT NULL,
-                mensaje TEXT NOT NULL,
-                color_avatar VARCHAR(7) NOT NULL,
-                icono VARCHAR(50) DEFAULT 'person',
-                fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        conn.commit()
-        cur.close()
-        conn.close()
-    except Exception as e:
-        print(f"Error al crear tabla de mensajes: {e}")
-
 # PÁGINA PRINCIPAL
 @main.route('/')
+@pagina_publica
 def home():
     return render_template('index.html')
 
 # DASHBOARD (requiere autenticación)
 @main.route('/dashboard')
+@login_required(mensaje='Por favor inicia sesión para acceder al dashboard.')
 def dashboard():
-    if not session.get('logged_in'):
-        flash('Por favor inicia sesión para acceder al dashboard.', 'error')
-        return redirect(url_for('main.login'))
     return render_template('dashboard.html')
 
 # LOGIN
@@ -57,19 +40,24 @@ def login():
         correo = request.form.get('correo')
         contrasena = request.form.get('contraseña')
 
+        if login_bloqueado(request.remote_addr, correo):
+            flash('Demasiados intentos de inicio de sesión. Intenta de nuevo en unos minutos.', 'error')
+            return render_template('login.html'), 429
+
         try:
             conn = get_conn()
             cur = conn.cursor()
             cur.execute("SELECT * FROM usuarios WHERE correo = %s", (correo,))
             usuario = cur.fetchone()
             cur.close()
-            conn.close()
 
-            if usuario and check_password_hash(usuario['contrasena'], contrasena):
+            # El hash se verifica en el pool de procesos, no en este hilo
+            exitoso = bool(usuario) and verificar(usuario['contrasena'], contrasena)
+            registrar_intento(request.remote_addr, correo, exitoso)
+            if exitoso:
                 # Guardar info del usuario en session
-                session['logged_in'] = True
-                session['usuario'] = usuario['nombre']
-                session['correo'] = usuario['correo']
+                start_session(usuario)
+                programar_rehash(usuario, contrasena)
                 
                 flash('Inicio de sesión exitoso.', 'success')
                 return redirect(url_for('main.dashboard'))
@@ -77,6 +65,10 @@ def login():
                 flash('Correo o contraseña incorrectos.', 'error')
                 return render_template('login.html')
 
+        except ServicioSaturado:
+            flash("Hay muchos inicios de sesión en este momento. Intenta de nuevo en unos segundos.", "error")
+            return render_template('login.html'), 503
+
         except Exception as e:
             flash(f"Error al iniciar sesión: {str(e)}", "error")
             return render_template('login.html')
@@ -87,12 +79,13 @@ def login():
 # LOGOUT
 @main.route('/logout')
 def logout():
-    session.pop('logged_in', None)
+    end_session()
     flash('Sesión cerrada exitosamente.', 'success')
     return redirect(url_for('main.home'))
 
 # REGISTRO
 @main.route('/registrarse', methods=['GET', 'POST'])
+@pagina_publica
 def registrarse():
     if request.method == 'POST':
         nombre = request.form['nombre']
@@ -105,10 +98,15 @@ def registrarse():
         num_personas = int(request.form['num_personas'])
         estrato = int(request.form['estrato'])
 
-        # Hash de la contraseña
-        contrasena_hash = generate_password_hash(contrasena)
+        if login_bloqueado(request.remote_addr, None):
+            flash('Demasiados intentos desde esta conexión. Intenta de nuevo en unos minutos.', 'error')
+            return redirect(url_for('main.registrarse'))
+        registrar_intento(request.remote_addr)
 
         try:
+            # Hash de la contraseña (en el pool de procesos)
+            contrasena_hash = hashear(contrasena)
+
             conn = get_conn()
             cur = conn.cursor()
             cur.execute("""
@@ -117,9 +115,11 @@ def registrarse():
             """, (nombre, apellido, telefono, direccion, correo, contrasena_hash, ocupacion, num_personas, estrato))
             conn.commit()
             cur.close()
-            conn.close()
             flash("Usuario registrado exitosamente", "success")
             return redirect(url_for('main.login'))  # Corregido: main.login
+        except ServicioSaturado:
+            flash("El servidor está ocupado. Intenta registrarte de nuevo en unos segundos.", "error")
+            return redirect(url_for('main.registrarse'))
         except Exception as e:
             flash(f"Error al registrar usuario: {str(e)}", "error")
             return redirect(url_for('main.registrarse'))
@@ -128,347 +128,225 @@ def registrarse():
 
 # ANEXAR FACTURA
 @main.route('/anexar_factura')
+@login_required
 def anexar_factura():
-    if not session.get('logged_in'):
-        flash('Por favor inicia sesión para acceder a esta página.', 'error')
-        return redirect(url_for('main.login'))
-    return render_template('anexar_factura.html')
+    return render_template('anexar_factura.html', trabajo=request.args.get('trabajo', type=int))
+
+# SUBIR FACTURA (PDF o foto): se lee en segundo plano y la página consulta el estado
+@main.route('/anexar_factura/subir', methods=['POST'])
+@login_required(mensaje='Por favor inicia sesión para subir tu factura.')
+def subir_factura():
+    try:
+        trabajo = recibir_factura(g.usuario.id)
+    except FacturaInvalida as e:
+        flash(str(e), "error")
+        return redirect(url_for('main.anexar_factura'))
+    except RequestEntityTooLarge:
+        flash(f"El archivo supera {current_app.config['FACTURAS_MAX_MB']} MB.", "error")
+        return redirect(url_for('main.anexar_factura'))
+    except Exception as e:
+        flash(f"Error al subir la factura: {str(e)}", "error")
+        return redirect(url_for('main.anexar_factura'))
+
+    flash("Recibimos tu factura; en unos segundos sus consumos aparecerán en el Gráfico.", "success")
+    return redirect(url_for('main.anexar_factura', trabajo=trabajo['id']))
 
 # GUARDAR CONSUMO (para manejar el formulario de anexar_factura)
 @main.route('/guardar_consumo', methods=['POST'])
+@login_required(mensaje='Por favor inicia sesión para guardar información.')
 def guardar_consumo():
-    if not session.get('logged_in'):
-        flash('Por favor inicia sesión para guardar información.', 'error')
-        return redirect(url_for('main.login'))
-
     try:
         conn = get_conn()
-        cur = conn.cursor()
-
-        # 1️⃣ Obtener el id del usuario logueado
-        cur.execute("SELECT id FROM usuarios WHERE correo = %s", (session['correo'],))
-        usuario = cur.fetchone()
-        usuario_id = usuario['id']
 
-        # 2️⃣ Guardar los 3 meses
-        for i in range(1, 4):
-            mes = request.form.get(f'mes_{i}', '').strip()
-            consumo_val = request.form.get(f'consumo_{i}', '').strip()
-            promedio_val = request.form.get(f'promedio_{i}', '').strip()
+        # 1️⃣ Id del usuario logueado (cargado desde la sesión)
+        usuario_id = g.usuario.id
 
-            if mes and consumo_val and promedio_val:
-                consumo_val = float(consumo_val)
-                promedio_val = float(promedio_val)
+        # 2️⃣ Validar los 3 meses antes de escribir (todo o nada)
+        filas = parse_formulario(request.form)
+        if not filas:
+            flash("Ingresa al menos un mes con su consumo y promedio.", "error")
+            return redirect(url_for('main.anexar_factura'))
 
-                cur.execute("""
-                    INSERT INTO consumos (usuario_id, mes, consumo, promedio, fecha)
-                    VALUES (%s, %s, %s, %s, NOW())
-                """, (usuario_id, mes, consumo_val, promedio_val))
+        # 3️⃣ Guardar los meses en un solo INSERT (si el mes ya existe se actualiza)
+        iniciar_escritura(conn)
+        cur = conn.cursor()
+        version_previa = version_actual(conn, usuario_id)
+        solo_inserciones = upsert_consumos(cur, usuario_id, filas)
+        actualizar_resumen(conn, usuario_id, filas, solo_inserciones, version_previa)
 
         conn.commit()
         cur.close()
-        conn.close()
+        programar_refresco(usuario_id)
 
         flash("Factura anexada con éxito. Por favor revise la sección Gráfico.", "success")
         return redirect(url_for('main.anexar_factura'))
 
+    except IngestaError as e:
+        flash(f"No se guardó la factura: {e}", "error")
+        return redirect(url_for('main.anexar_factura'))
+
     except Exception as e:
         flash(f"Error al guardar la información: {str(e)}", "error")
         return redirect(url_for('main.anexar_factura'))
 
 @main.route('/grafico')
+@login_required
+@condicional(version_datos, por_dia=True)
 def grafico():
-    if not session.get('logged_in'):
-        flash('Por favor inicia sesión para acceder a esta página.', 'error')
-        return redirect(url_for('main.login'))
-    
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        
-        # Obtener id del usuario
-        cur.execute("SELECT id FROM usuarios WHERE correo = %s", (session['correo'],))
-        usuario = cur.fetchone()
-        usuario_id = usuario['id']
-        
-        # Tomar consumos del usuario
-        cur.execute(
-            "SELECT mes, consumo, promedio, fecha FROM consumos "
-            "WHERE usuario_id = %s ORDER BY fecha ASC LIMIT 7;", 
-            (usuario_id,)
-        )
-        datos = cur.fetchall()
-        cur.close()
-        conn.close()
-        
-        # Convertir datos a tipos compatibles con JSON/JS
-        labels = [str(d['mes']) for d in datos]        # meses como string
-        consumos = [float(d['consumo']) for d in datos]  # consumo como float
-        promedios = [float(d['promedio']) for d in datos] # promedio como float
-
-        # Colores según relación con promedio
-        colores = []
-        for c, p in zip(consumos, promedios):
-            if c < p:
-                colores.append('#22c55e')   # verde
-            elif c <= p + 1:
-                colores.append('#eab308')   # amarillo
-            else:
-                colores.append('#ef4444')   # rojo
-
+        resumen = obtener_resumen(get_conn(), g.usuario.id, g.get('version_datos'))
+        datos = resumen['grafico']
     except Exception as e:
         flash(f"Error al cargar datos: {str(e)}", "error")
-        labels, consumos, promedios, colores = [], [], [], []
-
-    return render_template(
-        'grafico.html',
-        labels=labels,
-        consumos=consumos,
-        promedios=promedios,
-        colores=colores
-    )
+        datos = {'labels': [], 'consumos': [], 'promedios': [], 'colores': []}
+
+    # Medidor inteligente: último mes por día (agregado), o la historia mensual si no hay lecturas recientes
+    try:
+        conn = get_conn()
+        medidor = serie_medidor(conn, g.usuario.id, datetime.now() - timedelta(days=30))
+        if not medidor['labels']:
+            medidor = serie_medidor(conn, g.usuario.id)
+    except Exception as e:
+        print(f"Error al cargar las lecturas del medidor: {e}")
+        medidor = None
+
+    return render_template('grafico.html', medidor=medidor if medidor and medidor['labels'] else None, **datos)
 
 
 # REPORTES (requiere autenticación)
 @main.route('/reportes')
+@login_required
+@condicional(version_datos)
 def reportes():
-    if not session.get('logged_in'):
-        flash('Por favor inicia sesión para acceder a esta página.', 'error')
-        return redirect(url_for('main.login'))
-    
     try:
         conn = get_conn()
-        cur = conn.cursor()
-        
-        # Obtener id del usuario
-        cur.execute("SELECT id FROM usuarios WHERE correo = %s", (session['correo'],))
-        usuario = cur.fetchone()
-        usuario_id = usuario['id']
-        
-        # Obtener el último consumo registrado
-        cur.execute(
-            "SELECT mes, consumo, promedio, fecha FROM consumos "
-            "WHERE usuario_id = %s ORDER BY fecha DESC LIMIT 1;", 
-            (usuario_id,)
-        )
-        ultimo_consumo = cur.fetchone()
-        
-        # Obtener todos los consumos para calcular estadísticas
-        cur.execute(
-            "SELECT consumo, promedio FROM consumos "
-            "WHERE usuario_id = %s ORDER BY fecha DESC LIMIT 7;", 
-            (usuario_id,)
-        )
-        todos_consumos = cur.fetchall()
-        
-        cur.close()
-        conn.close()
-        
-        # Procesar datos
-        if ultimo_consumo:
-            consumo_actual = float(ultimo_consumo['consumo'])
-            promedio_actual = float(ultimo_consumo['promedio'])
-            mes_actual = str(ultimo_consumo['mes'])
-            
-            # Calcular diferencia y porcentaje
-            diferencia = consumo_actual - promedio_actual
-            porcentaje = (consumo_actual / promedio_actual) * 100 if promedio_actual > 0 else 0
-            
-            # Determinar nivel de consumo
-            if consumo_actual < promedio_actual:
-                nivel = "Bajo (Verde)"
-                nivel_color = "verde"
-                posicion_indicator = 16.7  # centro de la franja verde
-            elif consumo_actual <= promedio_actual + (promedio_actual * 0.1):
-                nivel = "Moderado (Amarillo)"
-                nivel_color = "amarillo"
-                posicion_indicator = 50  # centro de la franja amarilla
-            else:
-                nivel = "Alto (Rojo)"
-                nivel_color = "rojo"
-                posicion_indicator = 83.3  # centro de la franja roja
-            
-            # Calcular costo aproximado (aproximadamente $868 COP por kWh)
-            costo_adicional = float(abs(diferencia) * 868)
-            
-            # Generar reporte dinámico
-            if nivel_color == "verde":
-                reporte_texto = f"En {mes_actual}, tu nivel de consumo se ubicó en la zona verde, lo que indica un consumo eficiente y por debajo de tu promedio histórico. ¡Excelente trabajo!"
-            elif nivel_color == "amarillo":
-                reporte_texto = f"En {mes_actual}, tu nivel de consumo se ubicó en la zona amarilla, lo que indica un comportamiento moderado y estable respecto a tus registros anteriores."
-            else:
-                reporte_texto = f"En {mes_actual}, tu nivel de consumo se ubicó en la zona roja, lo que indica un consumo elevado respecto a tu promedio histórico. Te recomendamos revisar tus hábitos energéticos."
-            
-        else:
-            # Sin datos
-            consumo_actual = 0
-            promedio_actual = 0
-            mes_actual = "N/A"
-            diferencia = 0
-            porcentaje = 0
-            nivel = "Sin datos"
-            nivel_color = "amarillo"
-            posicion_indicator = 50
-            costo_adicional = 0
-            reporte_texto = "Aún no has registrado consumos. Por favor, anexa una factura para ver tus reportes."
-        
+        resumen = obtener_resumen(conn, g.usuario.id, g.get('version_datos'))
+        datos = resumen['reporte']
+        metricas = resumen['analitica']['metricas']
+        # Comparación con hogares similares (agregado precalculado)
+        comparacion = comparar(conn, resumen.get('estrato'), resumen.get('num_personas'), datos['consumo_actual'])
     except Exception as e:
         flash(f"Error al cargar datos: {str(e)}", "error")
-        consumo_actual = 0
-        promedio_actual = 0
-        mes_actual = "N/A"
-        diferencia = 0
-        porcentaje = 0
-        nivel = "Error"
-        nivel_color = "amarillo"
-        posicion_indicator = 50
-        costo_adicional = 0
-        reporte_texto = "Error al cargar los datos del reporte."
-    
-    return render_template(
-        'reportes.html',
-        consumo_actual=consumo_actual,
-        promedio_actual=promedio_actual,
-        mes_actual=mes_actual,
-        diferencia=diferencia,
-        porcentaje=porcentaje,
-        nivel=nivel,
-        nivel_color=nivel_color,
-        posicion_indicator=posicion_indicator,
-        costo_adicional=costo_adicional,
-        reporte_texto=reporte_texto
+        datos = dict(REPORTE_VACIO, nivel="Error", reporte_texto="Error al cargar los datos del reporte.")
+        metricas = comparacion = None
+
+    return render_template('reportes.html', analitica=metricas, comparacion=comparacion, **datos)
+
+# EXPORTAR LA HISTORIA COMPLETA (CSV en streaming)
+@main.route('/reportes/consumos.csv')
+@login_required
+def exportar_csv():
+    respuesta = Response(
+        stream_with_context(exportar.csv_consumos(get_conn(), g.usuario.id)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename="consumos-enertech.csv"'},
     )
+    respuesta.cache_control.private = True
+    respuesta.cache_control.no_store = True
+    return respuesta
+
+# EXPORTAR EN PDF: se genera en segundo plano y se sirve desde disco hasta la próxima escritura
+@main.route('/reportes/reporte.pdf')
+@login_required
+def exportar_pdf():
+    if not exportar.pdf_disponible():
+        flash("La exportación en PDF no está disponible en este servidor; descarga el CSV.", "error")
+        return redirect(url_for('main.reportes'))
+
+    usuario_id = g.usuario.id
+    version = exportar.version_historia(get_conn(), usuario_id)
+    ruta = exportar.ruta_pdf(usuario_id, version)
+    if os.path.isfile(ruta):
+        respuesta = send_file(ruta, mimetype='application/pdf', as_attachment=True,
+                              download_name='reporte-enertech.pdf', etag=version, conditional=True, max_age=0)
+        respuesta.cache_control.private = True
+        return respuesta
+
+    # Si la generación de esta versión falló, avisar en lugar de reintentar sin fin
+    error = exportar.error_pdf(usuario_id, version)
+    if error is not None:
+        print(f"Error al generar el PDF del usuario {usuario_id}: {error}")
+        flash("No se pudo generar el reporte en PDF. Intenta de nuevo o descarga el CSV.", "error")
+        return redirect(url_for('main.reportes'))
+
+    exportar.programar_pdf(usuario_id, version)
+    return render_template('generando_pdf.html'), 202, {'Retry-After': '2'}
+
+# MÉTRICAS DEL POOL DE CONEXIONES
+@main.route('/metricas/pool')
+@requiere_token
+def metricas_pool():
+    return jsonify(get_pool().stats())
+
+# MÉTRICAS DE LA CACHÉ DE RESÚMENES
+@main.route('/metricas/cache')
+@requiere_token
+def metricas_cache():
+    return jsonify(current_app.extensions['resumen_cache'].stats())
+
+# MÉTRICAS DE LOS EVENTOS EN VIVO
+@main.route('/metricas/eventos')
+@requiere_token
+def metricas_eventos():
+    return jsonify(current_app.extensions['eventos'].stats())
+
+# MÉTRICAS DE LAS TAREAS EN SEGUNDO PLANO
+@main.route('/metricas/tareas')
+@requiere_token
+def metricas_tareas():
+    return jsonify(current_app.extensions['tareas'].stats())
+
+@main.route('/metricas/hashing')
+@requiere_token
+def metricas_hashing():
+    return jsonify(current_app.extensions['hashing'].stats())
+
+@main.route('/metricas/facturas')
+@requiere_token
+def metricas_facturas():
+    return jsonify(current_app.extensions['facturas'].stats())
+
+# Contadores de este proceso y totales de la base (pendientes, marcados y ocultos)
+@main.route('/metricas/moderacion')
+@requiere_token
+def metricas_moderacion():
+    stats = current_app.extensions['moderacion'].stats()
+    try:
+        stats['base'] = conteos_moderacion(get_conn())
+    except Exception as e:
+        print(f"Error al contar los mensajes moderados: {e}")
+    return jsonify(stats)
 
 # QUIÉNES SOMOS (página pública)
 @main.route('/quienes-somos')
+@pagina_publica
 def quienes_somos():
     return render_template('quienes_somos.html')
 
 # COMUNIDAD (requiere autenticación)
 @main.route('/comunidad', methods=['GET', 'POST'])
+@login_required
 def comunidad():
-    # Inicializar tabla si no existe
-    init_mensajes_table()
-    
-    if not session.get('logged_in'):
-        flash('Por favor inicia sesión para acceder a esta página.', 'error')
-        return redirect(url_for('main.login'))
-    
+    if request.method == 'POST':
+        try:
+            texto = validar_texto(request.form.get('mensaje'))
+            publicar_mensaje(get_conn(), g.usuario, texto)
+            flash('Mensaje publicado exitosamente.', 'success')
+        except ValueError as e:
+            flash(str(e), 'error')
+        except Exception as e:
+            flash(f"Error al publicar el mensaje: {str(e)}", "error")
+        # Post/Redirect/Get: recargar la página no vuelve a publicar
+        return redirect(url_for('main.comunidad'))
+
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        
-        if request.method == 'POST':
-            mensaje_texto = request.form.get('mensaje', '').strip()
-            
-            if mensaje_texto:
-                # Obtener id y nombre del usuario de la sesión
-                correo_usuario = session.get('correo')
-                nombre_usuario = session.get('usuario', 'Usuario')
-                
-                # Obtener usuario_id
-                cur.execute("SELECT id FROM usuarios WHERE correo = %s", (correo_usuario,))
-                usuario = cur.fetchone()
-                usuario_id = usuario['id'] if usuario else None
-                
-                # Colores aleatorios para el avatar
-                colores = ['#22c55e', '#3b82f6', '#f97316', '#8b5cf6', '#ec4899', '#06b6d4']
-                color_avatar = random.choice(colores)
-                
-                # Guardar mensaje en la base de datos
-                cur.execute("""
-                    INSERT INTO mensajes_comunidad (usuario_id, nombre_usuario, mensaje, color_avatar, icono)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (usuario_id, nombre_usuario, mensaje_texto, color_avatar, 'person'))
-                conn.commit()
-                
-                flash('Mensaje publicado exitosamente.', 'success')
-                # No cerrar conexión aquí, se cerrará después de obtener mensajes
-        
-        # Obtener mensajes de la base de datos (últimos 50)
-        cur.execute("""
-            SELECT id, nombre_usuario, mensaje, color_avatar, icono, fecha
-            FROM mensajes_comunidad
-            ORDER BY fecha DESC
-            LIMIT 50
-        """)
-        mensajes_db = cur.fetchall()
-        
-        cur.close()
-        conn.close()
-        
-        # Formatear fecha y hora para los mensajes (zona horaria de Colombia)
-        zona_colombia = pytz.timezone('America/Bogota')
-        mensajes_con_tiempo = []
-        for msg in mensajes_db:
-            fecha_msg = msg['fecha']
-            
-            # Convertir la fecha a datetime si es string
-            if isinstance(fecha_msg, str):
-                try:
-                    fecha_msg = datetime.fromisoformat(fecha_msg.replace('Z', '+00:00'))
-                except:
-                    fecha_msg = datetime.strptime(fecha_msg, '%Y-%m-%d %H:%M:%S')
-            
-            # Si la fecha no tiene zona horaria, asumir que está en UTC
-            if fecha_msg.tzinfo is None:
-                fecha_msg = pytz.UTC.localize(fecha_msg)
-            
-            # Convertir a zona horaria de Colombia
-            fecha_colombia = fecha_msg.astimezone(zona_colombia)
-            
-            # Formatear fecha y hora en formato legible
-            # Formato: "DD/MM/YYYY HH:MM"
-            fecha_hora_str = fecha_colombia.strftime('%d/%m/%Y %H:%M')
-            
-            mensajes_con_tiempo.append({
-                'usuario': msg['nombre_usuario'],
-                'texto': msg['mensaje'],
-                'tiempo': fecha_hora_str,
-                'fecha': fecha_msg,
-                'color_avatar': msg['color_avatar'],
-                'icono': msg['icono']
-            })
-        
+        # Primera página; el resto se carga desde /api/comunidad/mensajes
+        mensajes_con_tiempo = listar_mensajes(get_conn())
     except Exception as e:
         flash(f"Error al cargar mensajes: {str(e)}", "error")
         mensajes_con_tiempo = []
     
-    # Lista completa de tips del mes
-    todos_los_tips = [
-        "Plancha tu ropa una sola vez a la semana para ahorrar energía",
-        "Desconecta los cargadores cuando no los uses, siguen consumiendo energía",
-        "Usa la luz natural durante el día y ahorra en iluminación artificial",
-        "Lava la ropa con agua fría cuando sea posible para reducir el consumo",
-        "Aprovecha el calor residual: apaga la estufa unos minutos antes de terminar",
-        "Sella bien las ventanas y puertas para evitar pérdidas de temperatura",
-        "Usa ventiladores en lugar de aire acondicionado cuando sea posible",
-        "Descongela regularmente el refrigerador para mejorar su eficiencia",
-        "Agrupa las comidas que requieren cocción para aprovechar el calor del horno",
-        "Instala bombillas LED, consumen hasta 80% menos que las incandescentes",
-        "Usa cortinas gruesas en invierno para mantener el calor dentro",
-        "Limpia regularmente los filtros del aire acondicionado",
-        "Aprovecha el sol para secar la ropa en lugar de usar secadora",
-        "Desconecta los electrodomésticos en standby al final del día",
-        "Usa el microondas en lugar del horno para calentar comidas pequeñas",
-        "Configura tu termostato 2-3 grados más alto en verano",
-        "Cocina con las ollas tapadas para usar menos energía",
-        "Llena completamente la lavadora antes de usarla",
-        "Instala sensores de movimiento para luces en áreas poco usadas",
-        "Usa el modo eco en tus electrodomésticos cuando esté disponible",
-        "Mantén el refrigerador a 3-5°C y el congelador a -18°C",
-        "Revisa y reemplaza los sellos de puertas y ventanas si están dañados",
-        "Usa timers para apagar automáticamente luces y aparatos",
-        "Aprovecha el calor del sol para calentar agua en verano",
-        "Cierra las cortinas en verano para mantener el calor fuera",
-        "Limpia las bobinas del refrigerador para mejorar su eficiencia",
-        "Usa ollas del tamaño adecuado para la estufa que estás usando",
-        "Evita abrir el horno mientras cocinas, pierde mucho calor",
-        "Usa la lavavajillas solo cuando esté llena",
-        "Configura el modo de ahorro de energía en tus dispositivos"
-    ]
-    
     # Seleccionar 3 tips aleatorios
-    tips_seleccionados = random.sample(todos_los_tips, min(3, len(todos_los_tips)))
+    tips_seleccionados = random.sample(TIPS_DEL_MES, min(3, len(TIPS_DEL_MES)))
     
     return render_template('comunidad.html', mensajes=mensajes_con_tiempo, tips=tips_seleccionados)
\ No newline at end of file
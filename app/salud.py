@@ -0,0 +1,102 @@
+# Comprobaciones de salud para el balanceador o la plataforma serverless.
+#
+#   GET /salud         vivo: responde sin tocar la base (el proceso atiende)
+#   GET /salud/lista   listo: 200 si PostgreSQL respondió, 503 si no
+#
+# La consulta a la base corre en un hilo aparte: la petición espera como mucho
+# SALUD_ESPERA segundos y, si la base tarda (Neon despertando, por ejemplo),
+# responde 503 "verificando" mientras el hilo sigue. El resultado se reutiliza
+# SALUD_INTERVALO segundos, así que un sondeo frecuente no carga el pool, y la
+# primera comprobación deja una conexión abierta para la primera petición real.
+# La respuesta es pública: el detalle de un error (host, puerto, usuario de la
+# base) solo va al log.
+import threading
+import time
+
+from flask import current_app, jsonify
+
+from app.db import get_conn
+
+
+class VerificadorBD:
+    def __init__(self, app, intervalo=10.0, espera=2.0):
+        self.app = app
+        self.intervalo = intervalo
+        self.espera = espera
+        self._lock = threading.Lock()
+        self._hilo = None
+        self.ok = None
+        self.error = None
+        self.latencia = None
+        self.comprobado = None     # time.monotonic() de la última comprobación
+        self.comprobaciones = 0
+        self.fallos = 0
+
+    def _comprobar(self):
+        inicio = time.monotonic()
+        try:
+            with self.app.app_context():
+                cur = get_conn().cursor()
+                cur.execute("SELECT 1")
+                cur.close()
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e).strip()
+        if error and error != self.error:
+            print(f"/salud/lista: la base no respondió: {error}")
+        with self._lock:
+            self.ok, self.error = ok, error
+            self.latencia = time.monotonic() - inicio
+            self.comprobado = time.monotonic()
+            self.comprobaciones += 1
+            self.fallos += not ok
+            self._hilo = None
+
+    def iniciar(self):
+        """Lanza una comprobación si el resultado caducó y no hay otra en curso"""
+        with self._lock:
+            vigente = self.comprobado is not None and time.monotonic() - self.comprobado < self.intervalo
+            if not vigente and self._hilo is None:
+                self._hilo = threading.Thread(target=self._comprobar, name='salud-bd', daemon=True)
+                self._hilo.start()
+            return self._hilo
+
+    def estado(self):
+        hilo = self.iniciar()
+        if hilo is not None:
+            hilo.join(self.espera)
+        with self._lock:
+            # Una comprobación que no terminó a tiempo cuenta como no lista
+            if self.ok is None or self._hilo is not None:
+                base = 'verificando'
+            else:
+                base = 'ok' if self.ok else 'error'
+            return {
+                'base': base,
+                'hace_s': round(time.monotonic() - self.comprobado, 1) if self.comprobado else None,
+            }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ok': bool(self.ok),
+                'comprobaciones': self.comprobaciones,
+                'fallos': self.fallos,
+                'latencia_ms': round(self.latencia * 1000, 1) if self.latencia is not None else 0,
+            }
+
+
+def vivo():
+    return jsonify(estado='ok')
+
+
+def listo():
+    estado = current_app.extensions['salud'].estado()
+    return jsonify(estado), 200 if estado['base'] == 'ok' else 503
+
+
+def init_app(app):
+    app.extensions['salud'] = VerificadorBD(
+        app, intervalo=app.config['SALUD_INTERVALO'], espera=app.config['SALUD_ESPERA'])
+    app.add_url_rule('/salud', 'salud', vivo)
+    app.add_url_rule('/salud/lista', 'salud_lista', listo)
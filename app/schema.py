@@ -0,0 +1,261 @@
+import click
+from flask.cli import AppGroup
+
+from app.db import get_conn
+
+# Migraciones versionadas: (version, descripcion, sql). Nunca editar una
+# migración ya aplicada; agregar una nueva al final de la lista.
+MIGRATIONS = [
+    (1, "Tablas base: usuarios, consumos y mensajes_comunidad", """
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id SERIAL PRIMARY KEY,
+            nombre VARCHAR(255) NOT NULL,
+            apellido VARCHAR(255),
+            telefono VARCHAR(50),
+            direccion VARCHAR(255),
+            correo VARCHAR(255) NOT NULL,
+            contrasena VARCHAR(255) NOT NULL,
+            ocupacion VARCHAR(255),
+            num_personas INTEGER,
+            estrato INTEGER
+        );
+
+        CREATE TABLE IF NOT EXISTS consumos (
+            id SERIAL PRIMARY KEY,
+            usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+            mes VARCHAR(50) NOT NULL,
+            consumo NUMERIC NOT NULL,
+            promedio NUMERIC NOT NULL,
+            fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS mensajes_comunidad (
+            id SERIAL PRIMARY KEY,
+            usuario_id INTEGER REFERENCES usuarios(id),
+            nombre_usuario VARCHAR(255) NOT NULL,
+            mensaje TEXT NOT NULL,
+            color_avatar VARCHAR(7) NOT NULL,
+            icono VARCHAR(50) DEFAULT 'person',
+            fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """),
+    (2, "Índices para las consultas frecuentes", """
+        CREATE UNIQUE INDEX IF NOT EXISTS usuarios_correo_idx ON usuarios (correo);
+        CREATE INDEX IF NOT EXISTS consumos_usuario_fecha_idx ON consumos (usuario_id, fecha);
+        CREATE INDEX IF NOT EXISTS mensajes_comunidad_fecha_idx ON mensajes_comunidad (fecha DESC);
+    """),
+    (3, "Un solo registro por usuario y mes en consumos (upsert)", """
+        -- Conservar el registro más reciente de cada (usuario_id, mes) repetido
+        DELETE FROM consumos c
+         USING consumos d
+         WHERE c.usuario_id = d.usuario_id AND c.mes = d.mes AND c.id < d.id;
+        CREATE UNIQUE INDEX IF NOT EXISTS consumos_usuario_mes_key ON consumos (usuario_id, mes);
+    """),
+    (4, "Índice (fecha, id) para la paginación por cursor de la comunidad", """
+        CREATE INDEX IF NOT EXISTS mensajes_comunidad_fecha_id_idx ON mensajes_comunidad (fecha DESC, id DESC);
+        DROP INDEX IF EXISTS mensajes_comunidad_fecha_idx;
+    """),
+    (5, "Tarifas de energía por estrato (COP por kWh)", """
+        CREATE TABLE IF NOT EXISTS tarifas (
+            estrato INTEGER PRIMARY KEY,
+            valor_kwh NUMERIC NOT NULL,
+            actualizado TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        -- Estratos 1-3 subsidiados, 4 tarifa plena, 5-6 con contribución del 20%
+        INSERT INTO tarifas (estrato, valor_kwh) VALUES
+            (1, 347.2), (2, 434.0), (3, 737.8), (4, 868.0), (5, 1041.6), (6, 1041.6)
+        ON CONFLICT (estrato) DO NOTHING;
+    """),
+    (6, "Percentiles de consumo precalculados por estrato y tamaño del hogar", """
+        CREATE TABLE IF NOT EXISTS benchmarks_consumo (
+            estrato INTEGER NOT NULL,
+            num_personas INTEGER NOT NULL,
+            hogares INTEGER NOT NULL,
+            lecturas INTEGER NOT NULL,
+            percentiles DOUBLE PRECISION[],
+            actualizado TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (estrato, num_personas)
+        );
+        CREATE INDEX IF NOT EXISTS usuarios_estrato_personas_idx ON usuarios (estrato, num_personas);
+    """),
+    (7, "Trabajos de lectura de facturas subidas (cola durable)", """
+        CREATE TABLE IF NOT EXISTS trabajos_factura (
+            id BIGSERIAL PRIMARY KEY,
+            usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+            archivo TEXT NOT NULL,
+            nombre_original VARCHAR(255),
+            tipo VARCHAR(10) NOT NULL,
+            tamano BIGINT NOT NULL,
+            -- pendiente -> procesando -> listo | error
+            estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+            intentos INTEGER NOT NULL DEFAULT 0,
+            disponible_en TIMESTAMP NOT NULL DEFAULT NOW(),
+            bloqueado_hasta TIMESTAMP,
+            filas JSONB,
+            error TEXT,
+            creado TIMESTAMP NOT NULL DEFAULT NOW(),
+            actualizado TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+        -- Solo los trabajos vivos: la cola no crece con el historial
+        CREATE INDEX IF NOT EXISTS trabajos_factura_cola_idx ON trabajos_factura (disponible_en)
+            WHERE estado IN ('pendiente', 'procesando');
+        CREATE INDEX IF NOT EXISTS trabajos_factura_usuario_idx ON trabajos_factura (usuario_id, creado DESC);
+    """),
+    (8, "Lecturas de medidores inteligentes particionadas por mes y sus agregados", """
+        -- Hora local del medidor. Las particiones mensuales (lecturas_AAAA_MM)
+        -- se crean al importar o con `flask --app run lecturas particiones`
+        CREATE TABLE IF NOT EXISTS lecturas (
+            usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+            medido_en TIMESTAMP NOT NULL,
+            kwh NUMERIC(12, 4) NOT NULL,
+            PRIMARY KEY (usuario_id, medido_en)
+        ) PARTITION BY RANGE (medido_en);
+
+        -- Se mantienen al importar: /grafico nunca suma lecturas crudas de meses
+        CREATE TABLE IF NOT EXISTS lecturas_diarias (
+            usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+            dia DATE NOT NULL,
+            kwh NUMERIC NOT NULL,
+            lecturas INTEGER NOT NULL,
+            PRIMARY KEY (usuario_id, dia)
+        );
+        CREATE TABLE IF NOT EXISTS lecturas_mensuales (
+            usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+            mes DATE NOT NULL,
+            kwh NUMERIC NOT NULL,
+            lecturas INTEGER NOT NULL,
+            actualizado TIMESTAMP NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (usuario_id, mes)
+        );
+    """),
+    (9, "Búsqueda de texto y moderación de los mensajes de la comunidad", """
+        -- Los mensajes existentes quedan aprobados; los nuevos entran pendientes
+        -- hasta que los revisa el moderador en segundo plano
+        ALTER TABLE mensajes_comunidad
+            ADD COLUMN IF NOT EXISTS busqueda tsvector
+                GENERATED ALWAYS AS (to_tsvector('spanish', coalesce(mensaje, ''))) STORED,
+            ADD COLUMN IF NOT EXISTS moderacion VARCHAR(20) NOT NULL DEFAULT 'aprobado'
+                CHECK (moderacion IN ('pendiente', 'aprobado', 'marcado', 'oculto')),
+            ADD COLUMN IF NOT EXISTS motivo_moderacion TEXT;
+        ALTER TABLE mensajes_comunidad ALTER COLUMN moderacion SET DEFAULT 'pendiente';
+        CREATE INDEX IF NOT EXISTS mensajes_comunidad_busqueda_idx ON mensajes_comunidad USING GIN (busqueda);
+        -- Pocas filas: la cola del moderador y los conteos de marcados y ocultos
+        CREATE INDEX IF NOT EXISTS mensajes_comunidad_moderacion_idx ON mensajes_comunidad (moderacion, id)
+            WHERE moderacion <> 'aprobado';
+    """),
+    (10, "Un solo registro por usuario, mes y año en consumos", """
+        -- El mes es solo un nombre ("Enero"): el año sale de la fecha del
+        -- registro, así cada año conserva su propio mes. La clave de la versión 3,
+        -- (usuario_id, mes), impedía guardar el mismo mes de otro año
+        ALTER TABLE consumos ADD COLUMN IF NOT EXISTS anio INTEGER
+            GENERATED ALWAYS AS (EXTRACT(YEAR FROM fecha)::integer) STORED;
+        -- Por si quedaron repetidos del mismo mes y año: el más reciente se queda
+        -- en consumos y los demás pasan a consumos_duplicados para revisarlos
+        CREATE TABLE IF NOT EXISTS consumos_duplicados (LIKE consumos);
+        INSERT INTO consumos_duplicados
+        SELECT c.* FROM consumos c
+         WHERE EXISTS (SELECT 1 FROM consumos d
+                        WHERE d.usuario_id = c.usuario_id AND d.mes = c.mes AND d.anio = c.anio AND d.id > c.id);
+        DELETE FROM consumos c
+         USING consumos_duplicados x
+         WHERE c.id = x.id;
+        CREATE UNIQUE INDEX IF NOT EXISTS consumos_usuario_mes_anio_key ON consumos (usuario_id, mes, anio);
+        DROP INDEX IF EXISTS consumos_usuario_mes_key;
+    """),
+    (11, "Secuencia de publicación de los mensajes visibles (sondeo del feed)", """
+        -- El moderador numera cada mensaje al dejarlo visible; el sondeo pide
+        -- secuencia > la última vista, así no se pierde un mensaje aprobado
+        -- después de que el cliente ya pasó por su fecha
+        CREATE SEQUENCE IF NOT EXISTS mensajes_comunidad_secuencia_seq;
+        ALTER TABLE mensajes_comunidad ADD COLUMN IF NOT EXISTS secuencia BIGINT;
+        UPDATE mensajes_comunidad m
+           SET secuencia = o.n
+          FROM (SELECT id, row_number() OVER (ORDER BY fecha, id) AS n
+                  FROM mensajes_comunidad
+                 WHERE moderacion IN ('aprobado', 'marcado')) o
+         WHERE m.id = o.id;
+        SELECT setval('mensajes_comunidad_secuencia_seq',
+                      (SELECT coalesce(max(secuencia), 0) + 1 FROM mensajes_comunidad), false);
+        CREATE UNIQUE INDEX IF NOT EXISTS mensajes_comunidad_secuencia_idx ON mensajes_comunidad (secuencia)
+            WHERE secuencia IS NOT NULL;
+    """),
+]
+
+
+def _ensure_migrations_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            descripcion TEXT NOT NULL,
+            aplicada_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cur):
+    cur.execute("SELECT version FROM schema_migrations ORDER BY version")
+    return {row['version'] for row in cur.fetchall()}
+
+
+def upgrade(conn, target=None):
+    """Aplica las migraciones pendientes en orden y devuelve las versiones aplicadas"""
+    cur = conn.cursor()
+    # Evita que dos procesos migren a la vez (se libera al terminar la transacción)
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext('enertech_schema'))")
+    _ensure_migrations_table(cur)
+    done = applied_versions(cur)
+
+    aplicadas = []
+    for version, descripcion, sql in MIGRATIONS:
+        if version in done or (target is not None and version > target):
+            continue
+        cur.execute(sql)
+        cur.execute(
+            "INSERT INTO schema_migrations (version, descripcion) VALUES (%s, %s)",
+            (version, descripcion),
+        )
+        aplicadas.append(version)
+
+    conn.commit()
+    cur.close()
+    return aplicadas
+
+
+db_cli = AppGroup('db', help="Administración del esquema de la base de datos.")
+
+
+@db_cli.command('upgrade')
+@click.option('--target', type=int, default=None, help="Versión máxima a aplicar.")
+def upgrade_command(target):
+    """Aplica las migraciones pendientes."""
+    aplicadas = upgrade(get_conn(), target)
+    if aplicadas:
+        click.echo(f"Migraciones aplicadas: {', '.join(map(str, aplicadas))}")
+    else:
+        click.echo("El esquema ya está actualizado.")
+
+
+@db_cli.command('status')
+def status_command():
+    """Muestra qué migraciones están aplicadas y cuáles pendientes."""
+    conn = get_conn()
+    cur = conn.cursor()
+    _ensure_migrations_table(cur)
+    done = applied_versions(cur)
+    conn.commit()
+    cur.close()
+    for version, descripcion, _ in MIGRATIONS:
+        estado = "aplicada" if version in done else "pendiente"
+        click.echo(f"{version:>3}  {estado:<9}  {descripcion}")
+
+
+@db_cli.command('benchmarks')
+def benchmarks_command():
+    """Recalcula todos los percentiles de comparación entre hogares."""
+    from app.benchmarks import refrescar_todos
+    grupos = refrescar_todos(get_conn())
+    click.echo(f"Grupos recalculados: {grupos}")
+
+
+def init_app(app):
+    app.cli.add_command(db_cli)
@@ -0,0 +1,70 @@
+import threading
+import time
+
+
+class ColaTareas:
+    """Hilo de fondo que ejecuta tareas diferidas dentro del contexto de la app.
+
+    Las tareas con la misma clave se fusionan: si una ya está pendiente, volver
+    a encolarla no la duplica. ``demora`` agrupa ráfagas de escrituras en una
+    sola ejecución.
+    """
+
+    def __init__(self, app, nombre='tareas'):
+        self.app = app
+        self.nombre = nombre
+        self._pendientes = {}          # clave -> (ejecutar_en, funcion, args)
+        self._cond = threading.Condition()
+        self._hilo = None
+        self.ejecutadas = 0
+        self.fusionadas = 0
+        self.fallidas = 0
+
+    def encolar(self, clave, funcion, *args, demora=0.0):
+        with self._cond:
+            if clave in self._pendientes:
+                self.fusionadas += 1
+                return
+            self._pendientes[clave] = (time.monotonic() + demora, funcion, args)
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name=self.nombre, daemon=True)
+                self._hilo.start()
+            self._cond.notify()
+
+    def _siguiente(self):
+        with self._cond:
+            while True:
+                if self._pendientes:
+                    clave, (cuando, funcion, args) = min(self._pendientes.items(), key=lambda kv: kv[1][0])
+                    espera = cuando - time.monotonic()
+                    if espera <= 0:
+                        del self._pendientes[clave]
+                        return clave, funcion, args
+                    self._cond.wait(espera)
+                else:
+                    self._cond.wait()
+
+    def _bucle(self):
+        while True:
+            clave, funcion, args = self._siguiente()
+            try:
+                with self.app.app_context():
+                    funcion(*args)
+                self.ejecutadas += 1
+            except Exception as e:
+                self.fallidas += 1
+                print(f"Error en la tarea {clave!r} ({self.nombre}): {e}")
+
+    def stats(self):
+        with self._cond:
+            pendientes = len(self._pendientes)
+        return {
+            'pendientes': pendientes,
+            'ejecutadas': self.ejecutadas,
+            'fusionadas': self.fusionadas,
+            'fallidas': self.fallidas,
+        }
+
+
+def init_app(app):
+    app.extensions['tareas'] = ColaTareas(app)
@@ -0,0 +1,8 @@
+# Punto de entrada ASGI (uvicorn, hypercorn):
+#   uvicorn asgi:app --workers 4
+# La aplicación Flask sigue siendo WSGI; asgiref la ejecuta en un pool de hilos.
+from asgiref.wsgi import WsgiToAsgi
+
+from wsgi import app as wsgi_app
+
+app = WsgiToAsgi(wsgi_app)
@@ -0,0 +1,118 @@
+# Arranque en frío: lo que tarda un proceso nuevo (worker o instancia
+# serverless) en importar la app, crearla y atender su primera petición.
+#
+#   python -m bench.arranque                            # 10 procesos, /salud y /
+#   python -m bench.arranque --ruta /salud/lista --repeticiones 20
+#   python -m bench.arranque --sin-cache-plantillas     # compara sin bytecode de Jinja
+#   python -m bench.arranque --detalle                  # módulos que más tardan en importarse
+#
+# Cada repetición es un intérprete nuevo, así que no hay nada en memoria; la
+# caché de plantillas en disco (JINJA_CACHE_DIR) sí se conserva entre
+# repeticiones, como entre workers de una misma máquina. No requiere
+# PostgreSQL salvo para las rutas que consultan la base.
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from bench.carga import percentil
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUTAS = ['/salud', '/']
+
+# Se ejecuta en el proceso hijo; imprime los tiempos en JSON
+MEDICION = """
+import json, sys, time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app()
+t2 = time.perf_counter()
+cliente = app.test_client()
+tiempos = {'importar': t1 - t0, 'crear_app': t2 - t1}
+for ruta in sys.argv[1:]:
+    inicio = time.perf_counter()
+    estado = cliente.get(ruta).status_code
+    tiempos[f'primera {ruta}'] = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    cliente.get(ruta)
+    tiempos[f'segunda {ruta}'] = time.perf_counter() - inicio
+    tiempos[f'estado {ruta}'] = estado
+tiempos['total'] = time.perf_counter() - t0
+print(json.dumps(tiempos))
+"""
+
+
+def medir_una(rutas, entorno):
+    salida = subprocess.run([sys.executable, '-c', MEDICION, *rutas], cwd=RAIZ, env=entorno,
+                            capture_output=True, text=True, check=True)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def importaciones_lentas(entorno, cuantas=15):
+    """Módulos con mayor tiempo acumulado según ``python -X importtime``"""
+    salida = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import wsgi'], cwd=RAIZ, env=entorno,
+                            capture_output=True, text=True, check=True)
+    filas = []
+    for linea in salida.stderr.splitlines():
+        partes = linea.split('|')
+        if len(partes) == 3 and partes[1].strip().isdigit():
+            filas.append((int(partes[1]), partes[2].rstrip()))
+    return sorted(filas, reverse=True)[:cuantas]
+
+
+def medir(rutas, repeticiones, entorno):
+    muestras = [medir_una(rutas, entorno) for _ in range(repeticiones)]
+    resultado = {}
+    for clave in muestras[0]:
+        if clave.startswith('estado '):
+            resultado[clave] = sorted({m[clave] for m in muestras})
+            continue
+        valores = [m[clave] for m in muestras]
+        resultado[clave] = {
+            'p50_ms': round(percentil(valores, 50) * 1000, 1),
+            'p95_ms': round(percentil(valores, 95) * 1000, 1),
+            'min_ms': round(min(valores) * 1000, 1),
+        }
+    return resultado
+
+
+def imprimir(resultado):
+    print(f"{'fase':<28}{'p50 ms':>9}{'p95 ms':>9}{'mín ms':>9}")
+    for clave, valor in resultado.items():
+        if clave.startswith('estado '):
+            continue
+        print(f"{clave:<28}{valor['p50_ms']:>9.1f}{valor['p95_ms']:>9.1f}{valor['min_ms']:>9.1f}")
+    estados = {k[len('estado '):]: v for k, v in resultado.items() if k.startswith('estado ')}
+    print("Estados HTTP: " + ', '.join(f"{ruta} {v}" for ruta, v in estados.items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tiempo de arranque en frío de la aplicación")
+    parser.add_argument('--ruta', action='append', dest='rutas', help="Ruta de la primera petición (repetible)")
+    parser.add_argument('--repeticiones', type=int, default=10, help="Procesos nuevos a medir")
+    parser.add_argument('--sin-cache-plantillas', action='store_true', help="JINJA_CACHE_DIR vacío")
+    parser.add_argument('--detalle', action='store_true', help="Mostrar las importaciones más lentas")
+    parser.add_argument('--guardar', help="Escribir el resultado en JSON")
+    args = parser.parse_args(argv)
+
+    entorno = dict(os.environ)
+    if args.sin_cache_plantillas:
+        entorno['JINJA_CACHE_DIR'] = ''
+    # La primera ejecución llena la caché de plantillas y los .pyc: no se cuenta
+    medir_una(args.rutas or RUTAS, entorno)
+
+    resultado = medir(args.rutas or RUTAS, args.repeticiones, entorno)
+    imprimir(resultado)
+    if args.detalle:
+        print(f"\n{'acumulado ms':>13}  módulo")
+        for microsegundos, modulo in importaciones_lentas(entorno):
+            print(f"{microsegundos / 1000:>13.1f}  {modulo}")
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
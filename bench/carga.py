@@ -0,0 +1,145 @@
+# Generador de carga HTTP concurrente (sin dependencias externas).
+#
+# Ejemplo, comparando el servidor de desarrollo con gunicorn sobre un
+# PostgreSQL local con datos de prueba:
+#
+#   python run.py                                   # servidor de desarrollo :5000
+#   python -m bench.carga --url http://127.0.0.1:5000 --correo a@b.co --contrasena x
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app           # producción :8000
+#   python -m bench.carga --url http://127.0.0.1:8000 --correo a@b.co --contrasena x
+import argparse
+import http.cookiejar
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+RUTAS_POR_DEFECTO = ['/grafico', '/reportes', '/comunidad', '/api/comunidad/mensajes']
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    k = (len(ordenados) - 1) * p / 100
+    f = int(k)
+    c = min(f + 1, len(ordenados) - 1)
+    return ordenados[f] + (ordenados[c] - ordenados[f]) * (k - f)
+
+
+def resumen_latencias(latencias, errores, duracion):
+    total = len(latencias) + errores
+    return {
+        'peticiones': total,
+        'errores': errores,
+        'rps': round(total / duracion, 2) if duracion else 0.0,
+        'p50_ms': round(percentil(latencias, 50) * 1000, 2),
+        'p95_ms': round(percentil(latencias, 95) * 1000, 2),
+        'p99_ms': round(percentil(latencias, 99) * 1000, 2),
+        'media_ms': round(statistics.fmean(latencias) * 1000, 2) if latencias else 0.0,
+    }
+
+
+def cliente_autenticado(base, correo, contrasena):
+    """Abre un cliente HTTP con cookies y, si hay credenciales, inicia sesión"""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    if correo:
+        datos = urllib.parse.urlencode({'correo': correo, 'contraseña': contrasena}).encode()
+        opener.open(f"{base}/login", data=datos, timeout=30).read()
+        if not any(c.name == 'session' for c in jar):
+            raise RuntimeError("No se pudo iniciar sesión con las credenciales dadas")
+    return opener
+
+
+def ejecutar(base, rutas, concurrencia, duracion, correo=None, contrasena=None, calentamiento=2.0,
+             formularios=None):
+    """Lanza ``concurrencia`` hilos pidiendo las rutas en ronda durante ``duracion`` segundos.
+
+    ``correo`` puede llevar ``{n}`` para que cada hilo use un usuario distinto
+    (bench1@..., bench2@...). ``formularios`` asocia rutas con una función
+    ``(hilo, i) -> dict`` cuyo resultado se envía por POST.
+    """
+    formularios = formularios or {}
+    por_ruta = {ruta: [] for ruta in rutas}
+    errores = {ruta: 0 for ruta in rutas}
+    lock = threading.Lock()
+    inicio_medicion = time.monotonic() + calentamiento
+    fin = inicio_medicion + duracion
+
+    def trabajador(n):
+        opener = cliente_autenticado(base, correo.format(n=n + 1) if correo else None, contrasena)
+        i = n
+        while time.monotonic() < fin:
+            ruta = rutas[i % len(rutas)]
+            i += 1
+            t0 = time.monotonic()
+            datos = None
+            if ruta in formularios:
+                datos = urllib.parse.urlencode(formularios[ruta](n, i)).encode()
+            try:
+                with opener.open(f"{base}{ruta}", data=datos, timeout=30) as resp:
+                    resp.read()
+                    ok = resp.status < 400
+            except (urllib.error.URLError, OSError):
+                ok = False
+            t1 = time.monotonic()
+            if t0 < inicio_medicion:
+                continue
+            with lock:
+                if ok:
+                    por_ruta[ruta].append(t1 - t0)
+                else:
+                    errores[ruta] += 1
+
+    hilos = [threading.Thread(target=trabajador, args=(n,), daemon=True) for n in range(concurrencia)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    todas = [lat for lats in por_ruta.values() for lat in lats]
+    return {
+        'url': base,
+        'concurrencia': concurrencia,
+        'duracion_s': duracion,
+        'total': resumen_latencias(todas, sum(errores.values()), duracion),
+        'rutas': {r: resumen_latencias(por_ruta[r], errores[r], duracion) for r in rutas},
+    }
+
+
+def imprimir(resultado, salida=sys.stdout):
+    t = resultado['total']
+    print(f"{resultado['url']}  concurrencia={resultado['concurrencia']}  duración={resultado['duracion_s']}s", file=salida)
+    print(f"{'ruta':<32}{'pet.':>8}{'err.':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}", file=salida)
+    for ruta, r in list(resultado['rutas'].items()) + [('TOTAL', t)]:
+        print(f"{ruta:<32}{r['peticiones']:>8}{r['errores']:>6}{r['rps']:>9.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}", file=salida)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga HTTP para EnerTech")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--ruta', action='append', dest='rutas', help="Ruta a pedir (repetible)")
+    parser.add_argument('--concurrencia', type=int, default=16)
+    parser.add_argument('--duracion', type=float, default=20.0)
+    parser.add_argument('--correo')
+    parser.add_argument('--contrasena', default='')
+    parser.add_argument('--json', help="Guardar el resultado en este archivo")
+    args = parser.parse_args(argv)
+
+    resultado = ejecutar(args.url.rstrip('/'), args.rutas or RUTAS_POR_DEFECTO,
+                         args.concurrencia, args.duracion, args.correo, args.contrasena)
+    imprimir(resultado)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# Rendimiento del hashing de contraseñas: logins (verificaciones) por segundo.
+#
+#   python -m bench.hashing                          # método por defecto, 1..CPU procesos
+#   python -m bench.hashing --metodo scrypt:65536:8:1 --procesos 1 --procesos 4
+#
+# Sirve para elegir HASH_METODO y HASH_PROCESOS: el costo por verificación fija
+# cuántos logins por segundo aguanta cada núcleo.
+import argparse
+import os
+import threading
+import time
+
+from app.hashing import ServicioHash
+from bench.carga import percentil
+
+
+def medir(metodo, procesos, verificaciones, hilos=None):
+    """Verifica la misma contraseña ``verificaciones`` veces desde varios hilos"""
+    servicio = ServicioHash(metodo, procesos=procesos, max_pendientes=max(procesos, 1) * 4, timeout=60)
+    hash_ = servicio.hashear('contraseña de prueba')
+    servicio.verificar(hash_, 'contraseña de prueba')   # arranque del pool fuera de la medición
+
+    hilos = hilos or max(procesos, 1) * 2
+    latencias = []
+    lock = threading.Lock()
+    restantes = [verificaciones]
+
+    def trabajador():
+        while True:
+            with lock:
+                if restantes[0] <= 0:
+                    return
+                restantes[0] -= 1
+            t0 = time.perf_counter()
+            assert servicio.verificar(hash_, 'contraseña de prueba')
+            with lock:
+                latencias.append(time.perf_counter() - t0)
+
+    inicio = time.perf_counter()
+    grupo = [threading.Thread(target=trabajador) for _ in range(hilos)]
+    for h in grupo:
+        h.start()
+    for h in grupo:
+        h.join()
+    duracion = time.perf_counter() - inicio
+    servicio.cerrar()
+
+    por_segundo = verificaciones / duracion
+    return {
+        'metodo': servicio.metodo,
+        'procesos': procesos,
+        'logins_s': round(por_segundo, 1),
+        'logins_s_por_nucleo': round(por_segundo / max(procesos, 1), 1),
+        'p50_ms': round(percentil(latencias, 50) * 1000, 1),
+        'p95_ms': round(percentil(latencias, 95) * 1000, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Logins por segundo y por núcleo según el costo del hash")
+    parser.add_argument('--metodo', action='append', dest='metodos', help="Método de werkzeug (repetible)")
+    parser.add_argument('--procesos', action='append', type=int, help="Tamaño del pool (repetible; 0 = en el hilo)")
+    parser.add_argument('--verificaciones', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    cpus = os.cpu_count() or 1
+    metodos = args.metodos or [os.getenv("HASH_METODO", "scrypt:32768:8:1")]
+    procesos = args.procesos or sorted({1, max(cpus // 2, 1), cpus})
+
+    print(f"{'método':<24}{'procesos':>9}{'logins/s':>10}{'por núcleo':>12}{'p50 ms':>9}{'p95 ms':>9}")
+    for metodo in metodos:
+        for n in procesos:
+            r = medir(metodo, n, args.verificaciones)
+            print(f"{r['metodo']:<24}{r['procesos']:>9}{r['logins_s']:>10.1f}"
+                  f"{r['logins_s_por_nucleo']:>12.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
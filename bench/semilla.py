@@ -0,0 +1,187 @@
+# Datos sintéticos para las pruebas de rendimiento.
+#
+# Genera usuarios, consumos y mensajes con generate_series directamente en
+# PostgreSQL (sin pasar filas por Python), por lotes de usuarios para que
+# cada transacción quede acotada:
+#
+#   python -m bench.semilla --usuarios 100000 --consumos 5000000 --mensajes 1000000
+#
+# Los usuarios de prueba son bench<n>@enertech.test y todos comparten la
+# contraseña de --contrasena. --limpiar borra solo esos datos.
+import argparse
+import time
+
+DOMINIO = 'enertech.test'
+CORREO = 'bench{n}@' + DOMINIO
+CONTRASENA = 'bench123'
+LOTE_USUARIOS = 5000
+
+USUARIOS_SQL = """
+    INSERT INTO usuarios (nombre, apellido, telefono, direccion, correo, contrasena,
+                          ocupacion, num_personas, estrato)
+    SELECT 'Bench ' || n, 'Prueba', '300' || lpad(n::text, 7, '0'), 'Calle ' || n,
+           'bench' || n || '@' || %(dominio)s, %(hash)s, 'Pruebas',
+           1 + (n * 7) %% 6, 1 + (n * 13) %% 6
+      FROM generate_series(%(desde)s, %(hasta)s) AS n
+    ON CONFLICT (correo) DO NOTHING
+"""
+
+# Un registro por mes y usuario, con estacionalidad y ruido. El mes se
+# guarda como 'YYYY-MM' (la clave única es usuario_id, mes y año de la fecha).
+CONSUMOS_SQL = """
+    INSERT INTO consumos (usuario_id, mes, consumo, promedio, fecha)
+    SELECT u.id,
+           to_char(d.mes, 'YYYY-MM'),
+           round((60 + 25 * u.estrato + 15 * u.num_personas
+                  + 20 * sin(extract(month FROM d.mes) * pi() / 6)
+                  + 30 * random())::numeric, 1),
+           round((60 + 25 * u.estrato + 15 * u.num_personas)::numeric, 1),
+           d.mes + interval '5 days'
+      FROM usuarios u
+     CROSS JOIN LATERAL (
+           SELECT date_trunc('month', NOW()) - make_interval(months => k) AS mes
+             FROM generate_series(1, %(meses)s) AS k
+           ) d
+     WHERE u.correo LIKE %(patron)s AND u.id BETWEEN %(desde)s AND %(hasta)s
+    ON CONFLICT (usuario_id, mes, anio) DO NOTHING
+"""
+
+# Ya aprobados (si no, el feed no los muestra) y numerados en orden de fecha,
+# del más antiguo al más nuevo, como los dejaría el moderador
+MENSAJES_SQL = """
+    INSERT INTO mensajes_comunidad (usuario_id, nombre_usuario, mensaje, color_avatar, icono, fecha,
+                                    moderacion, secuencia)
+    SELECT u.id, u.nombre,
+           'Mensaje de prueba ' || n || ': apagar los equipos en standby ahorra energía.',
+           (ARRAY['#22c55e', '#3b82f6', '#f97316', '#8b5cf6', '#ec4899', '#06b6d4'])[1 + n %% 6],
+           'person',
+           NOW() - make_interval(secs => (%(total)s - n) * 30),
+           'aprobado',
+           nextval('mensajes_comunidad_secuencia_seq')
+      FROM generate_series(%(desde)s, %(hasta)s) AS n
+      JOIN usuarios u ON u.id = %(primer_id)s + (n %% %(total_usuarios)s)
+     ORDER BY n
+"""
+
+
+def patron_correos():
+    return 'bench%@' + DOMINIO
+
+
+def _rango_ids(cur):
+    cur.execute("SELECT min(id) AS desde, max(id) AS hasta, count(*) AS total FROM usuarios WHERE correo LIKE %s",
+                (patron_correos(),))
+    return cur.fetchone()
+
+
+def _lotes(desde, hasta, tam):
+    inicio = desde
+    while inicio <= hasta:
+        fin = min(inicio + tam - 1, hasta)
+        yield inicio, fin
+        inicio = fin + 1
+
+
+def sembrar(conn, usuarios, consumos, mensajes, hash_, lote=LOTE_USUARIOS, salida=print):
+    """Crea los datos de prueba y devuelve el número de filas de cada tabla.
+
+    ``hash_`` es el hash de la contraseña común: se calcula una sola vez
+    porque el hashing es lento a propósito.
+    """
+    cur = conn.cursor()
+
+    t0 = time.monotonic()
+    for desde, hasta in _lotes(1, usuarios, lote):
+        cur.execute(USUARIOS_SQL, {'dominio': DOMINIO, 'hash': hash_, 'desde': desde, 'hasta': hasta})
+        conn.commit()
+    rango = _rango_ids(cur)
+    salida(f"usuarios: {rango['total']} ({time.monotonic() - t0:.1f}s)")
+
+    meses = max(1, round(consumos / max(usuarios, 1)))
+    t0 = time.monotonic()
+    for desde, hasta in _lotes(rango['desde'], rango['hasta'], lote):
+        cur.execute(CONSUMOS_SQL, {'meses': meses, 'patron': patron_correos(), 'desde': desde, 'hasta': hasta})
+        conn.commit()
+    salida(f"consumos: {meses} meses por usuario ({time.monotonic() - t0:.1f}s)")
+
+    t0 = time.monotonic()
+    for desde, hasta in _lotes(1, mensajes, lote * 20):
+        cur.execute(MENSAJES_SQL, {'desde': desde, 'hasta': hasta, 'total': mensajes,
+                                   'primer_id': rango['desde'], 'total_usuarios': rango['total']})
+        conn.commit()
+    salida(f"mensajes: {mensajes} ({time.monotonic() - t0:.1f}s)")
+
+    # Estadísticas al día para que el planificador vea el volumen real
+    conn.autocommit = True
+    try:
+        cur.execute("ANALYZE usuarios, consumos, mensajes_comunidad")
+    finally:
+        conn.autocommit = False
+    cur.close()
+    return escala(conn)
+
+
+# Todas las tablas con usuario_id, en orden: usuarios va al final por las claves foráneas
+TABLAS_DE_USUARIO = ('mensajes_comunidad', 'consumos', 'consumos_duplicados', 'trabajos_factura',
+                     'lecturas', 'lecturas_diarias', 'lecturas_mensuales')
+
+
+def limpiar(conn):
+    cur = conn.cursor()
+    patron = patron_correos()
+    for tabla in TABLAS_DE_USUARIO:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL AS existe", (tabla,))
+        if cur.fetchone()['existe']:
+            cur.execute(f"DELETE FROM {tabla} WHERE usuario_id IN (SELECT id FROM usuarios WHERE correo LIKE %s)",
+                        (patron,))
+    cur.execute("DELETE FROM usuarios WHERE correo LIKE %s", (patron,))
+    conn.commit()
+    cur.close()
+
+
+def escala(conn):
+    """Filas aproximadas por tabla (estadísticas del catálogo, sin count(*))"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT relname, GREATEST(reltuples, 0)::bigint AS filas
+          FROM pg_class
+         WHERE relname IN ('usuarios', 'consumos', 'mensajes_comunidad') AND relkind = 'r'
+    """)
+    filas = {fila['relname']: fila['filas'] for fila in cur.fetchall()}
+    cur.close()
+    conn.commit()
+    return filas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Siembra datos sintéticos para las pruebas de rendimiento")
+    parser.add_argument('--usuarios', type=int, default=10000)
+    parser.add_argument('--consumos', type=int, default=240000)
+    parser.add_argument('--mensajes', type=int, default=100000)
+    parser.add_argument('--contrasena', default=CONTRASENA)
+    parser.add_argument('--lote', type=int, default=LOTE_USUARIOS)
+    parser.add_argument('--limpiar', action='store_true', help="Borrar los datos de prueba y salir")
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from app.benchmarks import refrescar_todos
+    from app.db import get_conn
+    from app.hashing import hashear
+    from app.schema import upgrade
+
+    app = create_app()
+    with app.app_context():
+        conn = get_conn()
+        if args.limpiar:
+            limpiar(conn)
+            print("Datos de prueba eliminados.")
+            return
+        upgrade(conn)
+        # Con los parámetros configurados, para no medir rehashes en el primer login
+        filas = sembrar(conn, args.usuarios, args.consumos, args.mensajes, hashear(args.contrasena), args.lote)
+        print(f"Percentiles recalculados para {refrescar_todos(conn)} grupos")
+        print(f"Escala: {filas}")
+
+
+if __name__ == '__main__':
+    main()
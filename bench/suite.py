@@ -0,0 +1,263 @@
+# Suite de rendimiento reproducible sobre las rutas reales.
+#
+# Requiere un PostgreSQL local con datos de bench.semilla. Dos modos:
+#
+#   # En proceso con el cliente de pruebas de Flask (sin red ni servidor)
+#   python -m bench.suite cliente --iteraciones 200 --guardar bench/base.json
+#
+#   # Carga HTTP concurrente contra un servidor en marcha (bench.carga)
+#   python -m bench.suite http --url http://127.0.0.1:8000 --concurrencia 32 --comparar bench/base.json
+#
+# Cada ejecución informa p50/p95/p99, peticiones por segundo y consultas SQL
+# por petición (de app.metricas). --guardar escribe la línea base en JSON y
+# --comparar la contrasta con la ejecución actual; el código de salida es 1
+# si alguna ruta empeoró más allá de --tolerancia.
+import argparse
+import json
+import re
+import sys
+import time
+import urllib.request
+
+from bench.carga import ejecutar, resumen_latencias
+from bench.semilla import CONTRASENA, CORREO
+
+ESCENARIOS = ['/login', '/grafico', '/reportes', '/comunidad', '/guardar_consumo']
+
+# Meses que rotan en /guardar_consumo: tras la primera vuelta cada POST es una
+# actualización (camino write-through) en lugar de crecer la tabla sin fin.
+MESES_PRUEBA = [f"bench-{m:02d}" for m in range(1, 13)]
+
+
+def formulario_login(n, i, contrasena=CONTRASENA):
+    return {'correo': CORREO.format(n=n + 1), 'contraseña': contrasena}
+
+
+def formulario_factura(n, i):
+    return {
+        'mes_1': MESES_PRUEBA[i % len(MESES_PRUEBA)],
+        'consumo_1': str(150 + (n * 31 + i * 7) % 200),
+        'promedio_1': '180',
+    }
+
+
+# --- Modo cliente (Flask test client) ----------------------------------------
+
+def correr_cliente(app, rutas, iteraciones, usuarios=4, contrasena=CONTRASENA, calentamiento=10):
+    """Pide cada ruta ``iteraciones`` veces en ronda con ``usuarios`` sesiones"""
+    from flask import g
+
+    consultas = []
+
+    @app.after_request
+    def contar_consultas(respuesta):
+        consultas.append(len(g.get('consultas') or ()))
+        return respuesta
+
+    clientes = []
+    for n in range(usuarios):
+        cliente = app.test_client()
+        respuesta = cliente.post('/login', data=formulario_login(n, 0, contrasena))
+        if respuesta.status_code != 302:
+            raise RuntimeError(f"No se pudo iniciar sesión como {CORREO.format(n=n + 1)}; ¿se corrió bench.semilla?")
+        clientes.append(cliente)
+
+    por_ruta = {ruta: [] for ruta in rutas}
+    errores = {ruta: 0 for ruta in rutas}
+    consultas_ruta = {ruta: [] for ruta in rutas}
+
+    def pedir(n, i, ruta):
+        cliente = clientes[n]
+        if ruta == '/login':
+            return cliente.post(ruta, data=formulario_login(n, i, contrasena))
+        if ruta == '/guardar_consumo':
+            return cliente.post(ruta, data=formulario_factura(n, i))
+        return cliente.get(ruta)
+
+    for i in range(calentamiento):
+        for ruta in rutas:
+            pedir(i % usuarios, i, ruta)
+
+    inicio = time.perf_counter()
+    for i in range(iteraciones):
+        for ruta in rutas:
+            n = i % usuarios
+            del consultas[:]
+            t0 = time.perf_counter()
+            respuesta = pedir(n, i, ruta)
+            duracion = time.perf_counter() - t0
+            if respuesta.status_code >= 400:
+                errores[ruta] += 1
+                continue
+            por_ruta[ruta].append(duracion)
+            consultas_ruta[ruta].append(sum(consultas))
+    total_s = time.perf_counter() - inicio
+
+    resultado_rutas = {}
+    for ruta in rutas:
+        r = resumen_latencias(por_ruta[ruta], errores[ruta], total_s)
+        r['consultas_por_peticion'] = _media(consultas_ruta[ruta])
+        resultado_rutas[ruta] = r
+    todas = [lat for lats in por_ruta.values() for lat in lats]
+    total = resumen_latencias(todas, sum(errores.values()), total_s)
+    total['consultas_por_peticion'] = _media([c for cs in consultas_ruta.values() for c in cs])
+    return {'modo': 'cliente', 'iteraciones': iteraciones, 'duracion_s': round(total_s, 2),
+            'total': total, 'rutas': resultado_rutas}
+
+
+def _media(valores):
+    return round(sum(valores) / len(valores), 2) if valores else 0.0
+
+
+# --- Modo HTTP ---------------------------------------------------------------
+
+_SERIE = re.compile(r'^(?P<nombre>\w+)_count\{(?P<etiquetas>[^}]*)\} (?P<valor>[0-9.e+-]+)$', re.MULTILINE)
+
+
+def leer_metricas(base, token=None):
+    """Totales de peticiones y sentencias SQL publicados en /metrics"""
+    peticion = urllib.request.Request(f"{base}/metrics")
+    if token:
+        peticion.add_header('Authorization', f"Bearer {token}")
+    with urllib.request.urlopen(peticion, timeout=10) as resp:
+        texto = resp.read().decode('utf-8')
+    totales = {'peticiones': 0.0, 'consultas': 0.0}
+    for m in _SERIE.finditer(texto):
+        if m.group('nombre') == 'enertech_request_seconds' and 'endpoint="metrics"' not in m.group('etiquetas'):
+            totales['peticiones'] += float(m.group('valor'))
+        elif m.group('nombre') == 'enertech_sql_seconds':
+            totales['consultas'] += float(m.group('valor'))
+    return totales
+
+
+def correr_http(base, rutas, concurrencia, duracion, contrasena=CONTRASENA, token=None):
+    formularios = {
+        '/login': lambda n, i: formulario_login(n, i, contrasena),
+        '/guardar_consumo': formulario_factura,
+    }
+    antes = leer_metricas(base, token)
+    resultado = ejecutar(base, rutas, concurrencia, duracion, CORREO, contrasena,
+                         formularios=formularios)
+    despues = leer_metricas(base, token)
+    # /metrics es por proceso: con varios workers de gunicorn la cifra es la
+    # del worker que respondió, que sigue siendo representativa en proporción.
+    peticiones = despues['peticiones'] - antes['peticiones']
+    consultas = despues['consultas'] - antes['consultas']
+    resultado['modo'] = 'http'
+    resultado['total']['consultas_por_peticion'] = round(consultas / peticiones, 2) if peticiones else None
+    return resultado
+
+
+# --- Línea base ----------------------------------------------------------------
+
+def comparar(base, actual, tolerancia=0.10):
+    """Diferencias por ruta contra la línea base; devuelve (filas, regresiones)"""
+    filas, regresiones = [], []
+    for ruta, ahora in list(actual['rutas'].items()) + [('TOTAL', actual['total'])]:
+        antes = base['total'] if ruta == 'TOTAL' else base['rutas'].get(ruta)
+        if not antes:
+            continue
+        fila = {'ruta': ruta}
+        for campo, mas_es_peor in (('p50_ms', True), ('p95_ms', True), ('p99_ms', True),
+                                   ('rps', False), ('consultas_por_peticion', True)):
+            a, b = antes.get(campo), ahora.get(campo)
+            if not a or b is None:
+                fila[campo] = None
+                continue
+            cambio = (b - a) / a
+            fila[campo] = round(cambio * 100, 1)
+            empeora = cambio > tolerancia if mas_es_peor else cambio < -tolerancia
+            # Las consultas por petición son deterministas: cualquier aumento cuenta
+            if campo == 'consultas_por_peticion':
+                empeora = b > a
+            if empeora and campo != 'p99_ms':
+                regresiones.append(f"{ruta} {campo}: {a} -> {b}")
+        filas.append(fila)
+    return filas, regresiones
+
+
+def misma_escala(antes, ahora, margen=0.05):
+    """Las filas vienen de reltuples (estimadas): se admite un pequeño margen"""
+    if not antes or set(antes) != set(ahora):
+        return False
+    return all(abs(ahora[t] - antes[t]) <= margen * max(antes[t], 1) for t in antes)
+
+
+def imprimir(resultado, salida=sys.stdout):
+    t = resultado['total']
+    print(f"modo={resultado['modo']}  duración={resultado['duracion_s']}s  escala={resultado.get('escala')}", file=salida)
+    print(f"{'ruta':<20}{'pet.':>8}{'err.':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'sql/pet':>9}", file=salida)
+    for ruta, r in list(resultado['rutas'].items()) + [('TOTAL', t)]:
+        consultas = r.get('consultas_por_peticion')
+        print(f"{ruta:<20}{r['peticiones']:>8}{r['errores']:>6}{r['rps']:>9.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}"
+              f"{consultas if consultas is not None else '-':>9}", file=salida)
+
+
+def imprimir_comparacion(filas, regresiones, salida=sys.stdout):
+    print(f"\n{'Δ % vs base':<20}{'p50':>9}{'p95':>9}{'p99':>9}{'rps':>9}{'sql/pet':>9}", file=salida)
+    for f in filas:
+        valores = [f[c] for c in ('p50_ms', 'p95_ms', 'p99_ms', 'rps', 'consultas_por_peticion')]
+        print(f"{f['ruta']:<20}" + ''.join(f"{v:>+9.1f}" if v is not None else f"{'-':>9}" for v in valores),
+              file=salida)
+    if regresiones:
+        print("\nRegresiones:", file=salida)
+        for r in regresiones:
+            print(f"  {r}", file=salida)
+    else:
+        print("\nSin regresiones respecto de la línea base.", file=salida)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Suite de rendimiento de EnerTech")
+    parser.add_argument('modo', choices=['cliente', 'http'])
+    parser.add_argument('--ruta', action='append', dest='rutas', help="Ruta a medir (repetible)")
+    parser.add_argument('--iteraciones', type=int, default=100, help="Modo cliente: vueltas por ruta")
+    parser.add_argument('--usuarios', type=int, default=4, help="Modo cliente: sesiones distintas")
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help="Modo http")
+    parser.add_argument('--concurrencia', type=int, default=16, help="Modo http")
+    parser.add_argument('--duracion', type=float, default=20.0, help="Modo http: segundos")
+    parser.add_argument('--metrics-token', help="Modo http: METRICS_TOKEN del servidor")
+    parser.add_argument('--contrasena', default=CONTRASENA)
+    parser.add_argument('--guardar', help="Escribir el resultado como línea base")
+    parser.add_argument('--comparar', help="Línea base con la que comparar")
+    parser.add_argument('--tolerancia', type=float, default=0.10, help="Empeoramiento admitido (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+    rutas = args.rutas or ESCENARIOS
+
+    from app import create_app
+    from app.db import get_conn
+    from bench.semilla import escala
+
+    app = create_app()
+    with app.app_context():
+        filas = escala(get_conn())
+
+    if args.modo == 'cliente':
+        # Todos los logins salen de la misma "IP" del cliente de pruebas
+        app.extensions['limite_ip'].maximo = 0
+        app.extensions['limite_cuenta'].maximo = 0
+        resultado = correr_cliente(app, rutas, args.iteraciones, args.usuarios, args.contrasena)
+    else:
+        resultado = correr_http(args.url.rstrip('/'), rutas, args.concurrencia, args.duracion,
+                                args.contrasena, args.metrics_token)
+    resultado['escala'] = filas
+    imprimir(resultado)
+
+    codigo = 0
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)
+        if not misma_escala(base.get('escala'), filas):
+            print(f"\nAviso: la línea base se midió con otra escala ({base.get('escala')})")
+        comparacion, regresiones = comparar(base, resultado, args.tolerancia)
+        imprimir_comparacion(comparacion, regresiones)
+        codigo = 1 if regresiones else 0
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+    sys.exit(codigo)
+
+
+if __name__ == '__main__':
+    main()
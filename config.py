@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,6 +8,87 @@ class Config:
     # Configuración de PostgreSQL
     POSTGRES_URI = os.getenv("POSTGRES_URI") or os.getenv("DATABASE_URL")
     DATABASE_URL = os.getenv("DATABASE_URL") or os.getenv("POSTGRES_URI")
+
+    # Pool de conexiones (tiempos en segundos)
+    DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+    DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+    DB_POOL_HEALTH_CHECK = float(os.getenv("DB_POOL_HEALTH_CHECK", "30"))
+    DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+
+    # Caché de resúmenes por usuario (/grafico y /reportes)
+    RESUMEN_CACHE_MAX = int(os.getenv("RESUMEN_CACHE_MAX", "2048"))
+    RESUMEN_CACHE_TTL = float(os.getenv("RESUMEN_CACHE_TTL", "600"))
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+
+    # Token para la importación masiva de consumos de cualquier usuario
+    IMPORT_TOKEN = os.getenv("IMPORT_TOKEN")
+
+    # Eventos en vivo de la comunidad (SSE)
+    SSE_COLA_MAX = int(os.getenv("SSE_COLA_MAX", "100"))
+    SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))
+    # Cada conexión SSE ocupa un hilo del worker mientras está abierta: por
+    # encima de esto se responde 503 y el navegador pasa a sondear
+    SSE_MAX_CLIENTES = int(os.getenv("SSE_MAX_CLIENTES", "4"))
+
+    # Instrumentación: peticiones más lentas que esto (ms) se registran con el
+    # detalle de sus consultas; 0 lo desactiva. /metrics exige el token si existe
+    SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+    # Hashing de contraseñas en un pool de procesos (0 procesos = en el hilo).
+    # Cambiar HASH_METODO (p. ej. "scrypt:65536:8:1") rehace los hashes al iniciar sesión
+    HASH_METODO = os.getenv("HASH_METODO", "scrypt:32768:8:1")
+    HASH_PROCESOS = int(os.getenv("HASH_PROCESOS", "1"))
+    HASH_MAX_PENDIENTES = int(os.getenv("HASH_MAX_PENDIENTES", "16"))
+    HASH_TIMEOUT = float(os.getenv("HASH_TIMEOUT", "10"))
+
+    # Límite de intentos fallidos de login por IP y por cuenta en LOGIN_VENTANA
+    # segundos (0 lo desactiva, p. ej. para las pruebas de carga)
+    LOGIN_MAX_POR_IP = int(os.getenv("LOGIN_MAX_POR_IP", "30"))
+    LOGIN_MAX_POR_CUENTA = int(os.getenv("LOGIN_MAX_POR_CUENTA", "5"))
+    LOGIN_VENTANA = float(os.getenv("LOGIN_VENTANA", "300"))
+    # Proxies de confianza delante de la app (balanceador, nginx): con N > 0 la
+    # IP del cliente sale de X-Forwarded-For y no de la conexión del proxy
+    PROXY_SALTOS = int(os.getenv("PROXY_SALTOS", "0"))
+
+    # Segundos que navegadores y proxies pueden reutilizar las páginas públicas
+    PAGINAS_PUBLICAS_MAX_AGE = int(os.getenv("PAGINAS_PUBLICAS_MAX_AGE", "300"))
+
+    # Facturas subidas: carpeta (por defecto instance/facturas), tamaño máximo y
+    # lectura en segundo plano (procesos por worker, reintentos con espera
+    # exponencial desde FACTURAS_REINTENTO s, plazo antes de retomar un trabajo
+    # abandonado y sondeo de la cola). La cola la atiende `flask --app run
+    # facturas worker`; FACTURAS_EN_WEB=1 la atiende además en cada worker web
+    # (desarrollo con un solo proceso)
+    FACTURAS_DIR = os.getenv("FACTURAS_DIR")
+    FACTURAS_MAX_MB = int(os.getenv("FACTURAS_MAX_MB", "10"))
+    FACTURAS_PROCESOS = int(os.getenv("FACTURAS_PROCESOS", "1"))
+    FACTURAS_INTENTOS = int(os.getenv("FACTURAS_INTENTOS", "4"))
+    FACTURAS_REINTENTO = float(os.getenv("FACTURAS_REINTENTO", "30"))
+    FACTURAS_PLAZO = float(os.getenv("FACTURAS_PLAZO", "300"))
+    FACTURAS_ESPERA = float(os.getenv("FACTURAS_ESPERA", "5"))
+    FACTURAS_EN_WEB = os.getenv("FACTURAS_EN_WEB", "0").lower() in ("1", "true", "si", "sí")
+
+    # Lecturas de medidores: zona horaria local (las horas con offset se
+    # convierten a ella) y lecturas por transacción al importar
+    LECTURAS_ZONA = os.getenv("LECTURAS_ZONA", "America/Bogota")
+    LECTURAS_LOTE = int(os.getenv("LECTURAS_LOTE", "50000"))
+
+    # PDF exportados (por defecto instance/reportes), uno por usuario y versión de sus datos
+    REPORTES_DIR = os.getenv("REPORTES_DIR")
+
+    # Bytecode de las plantillas compiladas (vacío lo desactiva). En serverless
+    # solo /tmp suele tener escritura
+    JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "enertech-jinja"))
+
+    # Salud: segundos que vale una comprobación de la base y espera máxima de /salud/lista
+    SALUD_INTERVALO = float(os.getenv("SALUD_INTERVALO", "10"))
+    SALUD_ESPERA = float(os.getenv("SALUD_ESPERA", "2"))
+
+    # Archivo opcional con términos para la moderación de la comunidad, uno por
+    # línea: "ocultar: termino" o "marcar: termino" (se suman a los de por defecto)
+    MODERACION_LISTA = os.getenv("MODERACION_LISTA")
     
     # Configuración de seguridad
     SECRET_KEY = os.getenv("SECRET_KEY") or "clave_por_defecto_segura"
@@ -0,0 +1,31 @@
+# Perfil de producción para gunicorn. Todo se puede ajustar por variables de entorno:
+#   WEB_CONCURRENCY   procesos worker (por defecto 2 x CPU + 1)
+#   GUNICORN_THREADS  hilos por worker (por defecto 8)
+#   PORT              puerto de escucha (por defecto 8000)
+#
+# Se usan workers "gthread": las rutas hacen E/S bloqueante contra PostgreSQL,
+# así que una consulta lenta solo ocupa un hilo y no el worker completo.
+# Conviene que DB_POOL_MAX >= GUNICORN_THREADS para no esperar conexiones.
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Las conexiones SSE de /api/comunidad/stream mandan un ping cada SSE_HEARTBEAT
+# segundos, por lo que el timeout del worker no las corta. Cada una ocupa un
+# hilo mientras está abierta: SSE_MAX_CLIENTES (por defecto 4) debe quedar por
+# debajo de GUNICORN_THREADS para que el resto de rutas tenga hilos libres; los
+# clientes que no caben reciben 503 y sondean cada 15 s.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+# Reciclar workers de vez en cuando para acotar fugas de memoria
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = 200
+
+accesslog = "-"
+errorlog = "-"
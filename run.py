@@ -1,6 +1,9 @@
+import os
 from app import create_app
 
 app = create_app()
 
+# Servidor de desarrollo. En producción usar gunicorn (ver gunicorn.conf.py):
+#   gunicorn -c gunicorn.conf.py wsgi:app
 if __name__ == '__main__':
-    app.run(debug=True)
+    app.run(debug=os.getenv("FLASK_DEBUG", "1") == "1", threaded=True)
@@ -0,0 +1,33 @@
+// Configuración única del bundle CSS (antes repetida en cada plantilla con el CDN).
+module.exports = {
+  content: ["./app/templates/**/*.html"],
+  darkMode: "class",
+  theme: {
+    extend: {
+      colors: {
+        primary: "#019863",
+        "background-light": "#f5f8f7",
+        "background-dark": "#0f1117",
+        "surface-light": "#FFFFFF",
+        "surface-dark": "#1a1d25",
+        "text-light": "#212121",
+        "text-dark": "#e8eaed",
+        "text-secondary-light": "#757575",
+        "text-secondary-dark": "#9aa0a6",
+      },
+      fontFamily: { display: "Space Grotesk" },
+      keyframes: {
+        fadeIn: {
+          "0%": { opacity: "0", transform: "translateY(-10px)" },
+          "100%": { opacity: "1", transform: "translateY(0)" },
+        },
+      },
+      animation: { "fade-in": "fadeIn 0.4s ease-out" },
+    },
+  },
+  plugins: [
+    require("@tailwindcss/forms"),
+    require("@tailwindcss/typography"),
+    require("@tailwindcss/container-queries"),
+  ],
+};
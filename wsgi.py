@@ -0,0 +1,5 @@
+# Punto de entrada WSGI para producción:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+from app import create_app
+
+app = create_app()